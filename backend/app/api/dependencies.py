@@ -5,7 +5,8 @@ from app.security import (
     get_current_user,
     get_current_active_user,
     get_admission_user,
-    get_admin_user
+    get_admin_user,
+    get_admin_claims
 )
 
 # Security scheme
@@ -1,119 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, String, text
+from sqlalchemy import func, and_, or_, String
 from typing import List, Optional
+from datetime import date
 import logging
 
 from app.database import get_db
 from app.models.user import User
 from app.models.queue import QueueEntry, QueueStatus
 from app.models.video import VideoSettings
-from app.schemas.queue import QueueResponse
+from app.schemas.queue import QueueResponse, ProgramLoad
 from app.schemas.video import VideoSettingsResponse, VideoSettingsUpdate
-from app.schemas import AdminUserCreate, UserResponse, UserUpdate
-from app.security import get_admin_user
+from app.schemas import AdminUserCreate, UserResponse, UserUpdate, TokenData
+from app.security import get_admin_claims, get_admin_user
 from app.services.user import create_user
-from app.services.queue import get_all_queue_entries
-from app.services.archive import get_archive_statistics, cleanup_old_completed_entries, archive_queue_entry
-from app.models.archive import ArchivedQueueEntry
-from fastapi.responses import StreamingResponse
-import io
-import csv
-from openpyxl import Workbook 
-from openpyxl.styles import Font, PatternFill, Alignment
+from app.services.programs import get_program_codes_by_name, programs_overlap
+from app.services.export import (
+    QUEUE_EXPORT_COLUMNS,
+    XLSX_MEDIA_TYPE,
+    CSV_MEDIA_TYPE,
+    stream_query,
+    csv_chunks,
+    xlsx_chunks
+)
+from app.services.archive import get_archive_statistics, cleanup_old_completed_entries, archive_queue_entry, build_archive_query, delete_archive_entries
+from app.services.queue import delete_queue_entries
+from app.services.archive_cleanup import run_cleanup, estimate_cleanup, preview_cleanup, MAX_CHUNK_SIZE
+from app.models.archive import ArchivedQueueEntry, ArchiveQueueStatus
+from app.schemas.archive import ArchiveStatistics, ArchiveEntriesResponse
+from app.schemas.search import ApplicantSearchResponse
+from app.services.search import search_applicants, name_contains
+from app.schemas.queue_event import QueueEventResponse, QueueEventsResponse
+from app.services.queue_state import read_events, event_cursor
+from app.services.program_counters import read_program_load
+from app.services.queue_retention import run_retention_and_compaction
+from app.services.pagination import keyset_page, estimate_total, page_size, set_page_headers
+from app.schemas.export import ExportFilters, ExportJobResponse
+from app.services.export_jobs import export_jobs
+from fastapi.responses import StreamingResponse, FileResponse
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Полный словарь для маппинга названий программ на коды
-PROGRAM_MAPPING = {
-    # БАКАЛАВРИАТ
-    # Русские названия
-    "бухгалтерский учёт": "accounting",
-    "бухгалтерский учет": "accounting",
-    "прикладная лингвистика": "appliedLinguistics",
-    "экономика и наука о данных": "economicsDataScience",
-    "финансы": "finance",
-    "гостеприимство": "hospitality",
-    "международная журналистика": "internationalJournalism",
-    "международное право": "internationalLaw",
-    "международные отношения": "internationalRelations",
-    "it": "it",
-    "ит": "it",
-    "юриспруденция": "jurisprudence",
-    "менеджмент": "management",
-    "маркетинг": "marketing",
-    "психология": "psychology",
-    "туризм": "tourism",
-    "переводческое дело": "translation",
-    
-    # Казахские названия
-    "бухгалтерлік есеп": "accounting",
-    "қолданбалы лингвистика": "appliedLinguistics",
-    "экономика және деректер ғылымы": "economicsDataScience",
-    "қаржы": "finance",
-    "қонақжайлылық": "hospitality",
-    "халықаралық журналистика": "internationalJournalism",
-    "халықаралық құқық": "internationalLaw",
-    "халықаралық қатынастар": "internationalRelations",
-    "құқықтану": "jurisprudence",
-    "аударма ісі": "translation",
-    
-    # Английские названия
-    "accounting": "accounting",
-    "applied linguistics": "appliedLinguistics",
-    "economics and data science": "economicsDataScience",
-    "finance": "finance",
-    "hospitality": "hospitality",
-    "international journalism": "internationalJournalism",
-    "international law": "internationalLaw",
-    "international relations": "internationalRelations",
-    "law": "jurisprudence",
-    "management": "management",
-    "marketing": "marketing",
-    "psychology": "psychology",
-    "tourism": "tourism",
-    "translation studies": "translation",
-    
-    # МАГИСТРАТУРА
-    # Русские названия
-    "политология и международные отношения": "politicalInternationalRelations",
-    "конкурентное право": "competitionLaw",
-    "консультативная психология": "consultingPsychology",
-    "экономика": "economics",
-    "право интеллектуальной собственности и бизнеса": "intellectualPropertyLaw",
-    "право it": "itLaw",
-    "право ит": "itLaw",
-    
-    # Казахские названия
-    "саясаттану және халықаралық қатынастар": "politicalInternationalRelations",
-    "бәсекелестік құқық": "competitionLaw",
-    "консультативті психология": "consultingPsychology",
-    "зияткерлік меншік және бизнес құқық": "intellectualPropertyLaw",
-    "құқық it": "itLaw",
-    
-    # Английские названия
-    "political science and international relations": "politicalInternationalRelations",
-    "competition law": "competitionLaw",
-    "counselling psychology": "consultingPsychology",
-    "economics": "economics",
-    "intellectual property and business law": "intellectualPropertyLaw",
-    "it law": "itLaw",
-    
-    # ДОКТОРАНТУРА
-    # Русские названия
-    "право": "law",
-    "phd по экономике": "phdEconomics",
-    
-    # Казахские названия
-    "құқық": "law",
-    "экономика саласындағы phd": "phdEconomics",
-    
-    # Английские названия
-    "phd in law": "law",
-    "phd in economics": "phdEconomics"
-}
-
 @router.post("/sync/google-sheets/full")
 def full_sync_to_google_sheets(
     db: Session = Depends(get_db),
@@ -159,7 +87,7 @@ def test_sync_now(db: Session = Depends(get_db)):
 @router.get("/sync/google-sheets/status")
 def get_sync_status(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: TokenData = Depends(get_admin_claims)
 ):
     """Получить статус синхронизации с Google Sheets"""
     try:
@@ -256,101 +184,31 @@ def test_google_sheets_connection(
         logger.error(f"❌ Ошибка тестирования Google Sheets: {e}")
         raise HTTPException(status_code=500, detail=f"Test failed: {str(e)}")
 
-def get_program_codes_by_name(program_name: str) -> List[str]:
-    """
-    Получает возможные коды программ по названию программы
-    """
-    if not program_name:
-        return []
-    
-    program_name_lower = program_name.lower().strip()
-    matching_codes = []
-    
-    # Ищем точные совпадения
-    if program_name_lower in PROGRAM_MAPPING:
-        matching_codes.append(PROGRAM_MAPPING[program_name_lower])
-    
-    # Ищем частичные совпадения в названиях
-    for name, code in PROGRAM_MAPPING.items():
-        if program_name_lower in name or name in program_name_lower:
-            if code not in matching_codes:
-                matching_codes.append(code)
-    
-    # Если ничего не найдено, возможно пользователь ввел код напрямую
-    if not matching_codes:
-        matching_codes.append(program_name_lower)
-    
-    return matching_codes
 
 @router.get("/queue/export")
 def export_queue_to_excel(
+    format: str = "xlsx",
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: TokenData = Depends(get_admin_claims)
 ):
-    """Export all queue entries to Excel (.xlsx)"""
-    # Get all queue entries
-    queue_entries = get_all_queue_entries(db)
-    
-    # Create Excel workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Queue Data"
-    
-    # Headers
-    headers = ["ФИО", "Программы", "Номер", "Сотрудник", "Дата создания", "Статус", "Время обработки (сек)"]
-    
-    # Add headers to worksheet
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        # Style headers
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center")
-    
-    # Add data rows
-    for row, entry in enumerate(queue_entries, 2):
-        programs = ", ".join(entry.programs) if isinstance(entry.programs, list) else entry.programs
-        created_at = entry.created_at.strftime("%Y-%m-%d %H:%M:%S") if entry.created_at else "-"
-        
-        data_row = [
-            entry.full_name,
-            programs,
-            entry.queue_number,
-            entry.assigned_employee_name or "-",
-            created_at,
-            entry.status.value,
-            entry.processing_time or "-"
-        ]
-        
-        for col, value in enumerate(data_row, 1):
-            ws.cell(row=row, column=col, value=value)
-    
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save to BytesIO
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+    """Export all queue entries to Excel (.xlsx) or CSV, streamed in constant memory"""
+    if format not in ("xlsx", "csv"):
+        raise HTTPException(status_code=400, detail="Unsupported export format")
+    
+    # Server-side cursor: rows are fetched in batches while the file is being written
+    entries = stream_query(db.query(QueueEntry).order_by(QueueEntry.created_at))
+    
+    if format == "csv":
+        return StreamingResponse(
+            csv_chunks(QUEUE_EXPORT_COLUMNS, entries),
+            headers={'Content-Disposition': 'attachment; filename="queue_data.csv"'},
+            media_type=CSV_MEDIA_TYPE
+        )
     
-    # Return file as response
-    headers = {
-        'Content-Disposition': 'attachment; filename="queue_data.xlsx"'
-    }
     return StreamingResponse(
-        io.BytesIO(output.getvalue()), 
-        headers=headers, 
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        xlsx_chunks(QUEUE_EXPORT_COLUMNS, entries),
+        headers={'Content-Disposition': 'attachment; filename="queue_data.xlsx"'},
+        media_type=XLSX_MEDIA_TYPE
     )
 
 @router.post("/queue/reset-numbering")
@@ -398,6 +256,20 @@ def reset_queue_numbering(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Reset failed: {str(e)}")
 
+@router.post("/queue/retention/run")
+def run_queue_retention_now(
+    older_than_hours: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_admin_user)
+):
+    """Запустить плановую очистку основной таблицы сейчас (отчет: строки и длительность)"""
+    if older_than_hours is not None and older_than_hours < 0:
+        raise HTTPException(status_code=400, detail="older_than_hours must be non-negative")
+    try:
+        return run_retention_and_compaction(db, older_than_hours)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Retention failed: {str(e)}")
+
 @router.post("/create-admission", response_model=UserResponse)
 def create_admission_staff(
     user_data: AdminUserCreate,
@@ -410,24 +282,42 @@ def create_admission_staff(
 
 @router.get("/employees", response_model=List[UserResponse])
 def get_all_employees(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: TokenData = Depends(get_admin_claims)
 ):
-    """Get all employees (admin only)"""
-    employees = db.query(User).filter(User.role == "admission").all()
+    """Get all employees (admin only); with limit/cursor - page by page"""
+    query = db.query(User).filter(User.role == "admission")
+
+    if limit is None and cursor is None:
+        return query.all()
+
+    employees, next_cursor = keyset_page(query, User.created_at, User.id, page_size(limit), cursor)
+    set_page_headers(response, next_cursor, estimate_total(query))
     return employees
 
 @router.get("/queue", response_model=List[QueueResponse])
 def get_all_queue_entries_api(
+    response: Response,
     status: Optional[QueueStatus] = None,
     date: Optional[str] = None,
     employee: Optional[str] = None,
     full_name: Optional[str] = None,
     program: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: TokenData = Depends(get_admin_claims)
 ):
-    """Get all queue entries with filters (admin only)"""
+    """
+    Get all queue entries with filters (admin only)
+
+    Без limit/cursor возвращает весь список, как раньше. С limit - страницу
+    по ключу (created_at, id) от новых к старым; курсор следующей страницы
+    и оценка количества - в заголовках X-Next-Cursor / X-Total-Count.
+    """
     from datetime import datetime
     
     # Начинаем с базового запроса
@@ -462,31 +352,60 @@ def get_all_queue_entries_api(
         )
     
     if full_name:
-        # Фильтруем по ФИО абитуриента (частичное совпадение, без учета регистра)
-        query = query.filter(
-            QueueEntry.full_name.ilike(f"%{full_name}%")
-        )
+        # Фильтруем по ФИО абитуриента (подстрока в нормализованном ФИО, триграммный индекс)
+        query = query.filter(name_contains(QueueEntry.full_name, full_name))
     
     if program:
-        # Получаем возможные коды программ по введенному названию
+        # Коды программ по введенному названию (предвычисленный справочник)
         program_codes = get_program_codes_by_name(program)
         
         if program_codes:
-            # Создаем условия для поиска по всем возможным кодам
-            program_conditions = []
-            for code in program_codes:
-                # Ищем код в JSON массиве программ
-                program_conditions.append(
-                    text("programs::text ILIKE :code").params(code=f'%"{code}"%')
-                )
-            
-            # Объединяем условия через OR
-            if len(program_conditions) == 1:
-                query = query.filter(program_conditions[0])
-            else:
-                query = query.filter(or_(*program_conditions))
+            # programs ?| array[...] - использует GIN индекс по JSONB
+            query = query.filter(programs_overlap(QueueEntry.programs, program_codes))
+    
+    if limit is None and cursor is None:
+        return query.all()
     
-    return query.all()
+    entries, next_cursor = keyset_page(query, QueueEntry.created_at, QueueEntry.id, page_size(limit), cursor)
+    set_page_headers(response, next_cursor, estimate_total(query))
+    return entries
+
+@router.get("/search", response_model=ApplicantSearchResponse)
+def search_applicants_api(
+    q: str,
+    scope: str = "all",
+    limit: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_claims)
+):
+    """Нечеткий поиск абитуриентов по ФИО или телефону в очереди и архиве (scope: all, queue, archive)"""
+    if scope not in ("all", "queue", "archive"):
+        raise HTTPException(status_code=400, detail="scope must be one of: all, queue, archive")
+
+    return ApplicantSearchResponse(query=q, results=search_applicants(db, q, scope, limit))
+
+@router.get("/queue/programs", response_model=List[ProgramLoad])
+def get_program_load_admin(
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_claims)
+):
+    """Сколько абитуриентов ждут и на приеме по каждой программе (живые счетчики)"""
+    return read_program_load(db)
+
+@router.get("/queue/events", response_model=QueueEventsResponse)
+def get_queue_events(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    entry_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_claims)
+):
+    """Журнал переходов заявок после смещения cursor (для инкрементального чтения)"""
+    events = read_events(db, cursor, page_size(limit), [entry_id] if entry_id else None)
+    return QueueEventsResponse(
+        events=[QueueEventResponse.model_validate(event) for event in events],
+        next_cursor=event_cursor(events[-1]) if events else cursor
+    )
 
 @router.delete("/employees/{user_id}")
 def delete_employee(
@@ -515,9 +434,16 @@ def update_employee(
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
+    previous_name = employee.full_name
     for key, value in user_data.dict(exclude_unset=True).items():
         setattr(employee, key, value)
     
+    # Заявки связаны с сотрудником по id; имя в активных заявках - только для отображения
+    if employee.full_name != previous_name:
+        db.query(QueueEntry).filter(
+            QueueEntry.assigned_employee_id == employee.id
+        ).update({QueueEntry.assigned_employee_name: employee.full_name}, synchronize_session=False)
+    
     db.commit()
     db.refresh(employee)
     return employee
@@ -578,34 +504,21 @@ def bulk_delete_queue_entries(
 ):
     """Массовое удаление заявок с синхронизацией"""
     try:
-        deleted_queue = 0
-        deleted_archive = 0
+        # По одному DELETE ... WHERE id = ANY(:ids) на таблицу вместо запросов на каждый id
+        deleted_queue = delete_queue_entries(db, entry_ids)
         
-        for queue_id in entry_ids:
-            # Удаляем из основной таблицы
-            queue_entry = db.query(QueueEntry).filter(QueueEntry.id == queue_id).first()
-            if queue_entry:
-                db.delete(queue_entry)
-                deleted_queue += 1
-            
-            # Удаляем из архива (автоматически синхронизируется с Google Sheets)
-            archived_entry = db.query(ArchivedQueueEntry).filter(
-                or_(
-                    ArchivedQueueEntry.id == queue_id,
-                    ArchivedQueueEntry.original_id == queue_id
-                )
-            ).first()
-            if archived_entry:
-                db.delete(archived_entry)
-                deleted_archive += 1
+        # Удаления из архива попадают в sync_log и уходят в Google Sheets одним пакетом
+        deleted_archive = delete_archive_entries(db, entry_ids)
         
         db.commit()
         
+        logger.info(f"🗑️ Массовое удаление: {len(deleted_queue)} из очереди, {len(deleted_archive)} из архива")
+        
         return {
             "success": True,
             "message": f"Bulk delete completed",
-            "deleted_from_queue": deleted_queue,
-            "deleted_from_archive": deleted_archive,
+            "deleted_from_queue": len(deleted_queue),
+            "deleted_from_archive": len(deleted_archive),
             "total_processed": len(entry_ids)
         }
         
@@ -618,29 +531,38 @@ def bulk_delete_queue_entries(
 def cleanup_archive(
     days_old: int = 30,
     status_filter: Optional[str] = None,
+    dry_run: bool = False,
+    chunk_size: Optional[int] = Query(None, ge=1, le=MAX_CHUNK_SIZE),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_admin_user)
 ):
-    """Очистка архива (удаление старых записей) с синхронизацией"""
+    """
+    Очистка архива (удаление старых записей) с синхронизацией
+
+    Удаляет пачками с commit после каждой, затем один раз сверяет Google Sheets.
+    dry_run=true ничего не удаляет и возвращает оценку по плану запроса.
+    """
     try:
         from datetime import datetime, timedelta
         
         cutoff_date = datetime.utcnow() - timedelta(days=days_old)
         
-        # Формируем запрос для поиска старых записей
-        query = db.query(ArchivedQueueEntry).filter(
-            ArchivedQueueEntry.archived_at < cutoff_date
-        )
-        
-        # Добавляем фильтр по статусу если указан
-        if status_filter:
-            query = query.filter(ArchivedQueueEntry.status == status_filter)
+        if dry_run:
+            estimate = estimate_cleanup(db, cutoff_date, status_filter, chunk_size)
+            return {
+                "success": True,
+                "dry_run": True,
+                "cutoff_date": cutoff_date.isoformat(),
+                "days_old": days_old,
+                "status_filter": status_filter,
+                **estimate
+            }
         
-        # Получаем записи для подсчета
-        old_entries = query.all()
-        entries_count = len(old_entries)
+        result = run_cleanup(db, cutoff_date, status_filter, chunk_size)
+        # Точное число удаленных строк; строки ушедших партиций - отдельно, оценкой
+        deleted_count = result["deleted_rows"]
         
-        if entries_count == 0:
+        if deleted_count == 0 and not result["removed_partitions"]:
             return {
                 "success": True,
                 "message": "No entries found for cleanup",
@@ -648,22 +570,20 @@ def cleanup_archive(
                 "cutoff_date": cutoff_date.isoformat()
             }
         
-        # Удаляем найденные записи (каждая автоматически удалится из Google Sheets)
-        for entry in old_entries:
-            db.delete(entry)
-            logger.info(f"🗑️ Удаляем старую запись {entry.id} из архива (дата: {entry.archived_at})")
-        
-        db.commit()
-        
-        logger.info(f"✅ Очистка архива завершена: удалено {entries_count} записей старше {days_old} дней")
+        logger.info(
+            f"✅ Очистка архива завершена: удалено {result['deleted_rows']} записей ({result['chunks']} пачек) и "
+            f"{len(result['removed_partitions'])} партиций (~{result['partition_rows_estimated']} записей, {result['retention_mode']}) старше {days_old} дней "
+            f"за {result['elapsed_seconds']} сек ({result['rows_per_second']} записей/сек)"
+        )
         
         return {
             "success": True,
             "message": f"Archive cleanup completed",
-            "deleted_count": entries_count,
+            "deleted_count": deleted_count,
             "cutoff_date": cutoff_date.isoformat(),
             "days_old": days_old,
-            "status_filter": status_filter
+            "status_filter": status_filter,
+            **result
         }
         
     except Exception as e:
@@ -717,33 +637,25 @@ def bulk_delete_archive_entries(
 ):
     """Массовое удаление записей из архива с синхронизацией"""
     try:
-        deleted_count = 0
-        not_found_count = 0
-        
-        for entry_id in entry_ids:
-            # Ищем запись в архиве
-            archived_entry = db.query(ArchivedQueueEntry).filter(
-                or_(
-                    ArchivedQueueEntry.id == entry_id,
-                    ArchivedQueueEntry.original_id == entry_id
-                )
-            ).first()
-            
-            if archived_entry:
-                db.delete(archived_entry)
-                deleted_count += 1
-                logger.info(f"🗑️ Удалена запись {entry_id} из архива")
-            else:
-                not_found_count += 1
-                logger.warning(f"⚠️ Запись {entry_id} не найдена в архиве")
-        
+        # Один DELETE ... RETURNING; синхронизация с таблицей - одним пакетом через sync_log
+        deleted = delete_archive_entries(db, entry_ids)
         db.commit()
         
+        matched_ids = set()
+        for entry_id, original_id in deleted:
+            matched_ids.add(entry_id)
+            matched_ids.add(original_id)
+        not_found = [entry_id for entry_id in set(entry_ids) if entry_id not in matched_ids]
+        
+        logger.info(f"🗑️ Удалено {len(deleted)} записей из архива")
+        if not_found:
+            logger.warning(f"⚠️ Не найдены в архиве: {len(not_found)} записей")
+        
         return {
             "success": True,
             "message": f"Bulk archive delete completed",
-            "deleted_count": deleted_count,
-            "not_found_count": not_found_count,
+            "deleted_count": len(deleted),
+            "not_found_count": len(not_found),
             "total_processed": len(entry_ids)
         }
         
@@ -752,12 +664,60 @@ def bulk_delete_archive_entries(
         logger.error(f"❌ Ошибка массового удаления из архива: {e}")
         raise HTTPException(status_code=500, detail=f"Error bulk deleting from archive: {str(e)}")
 
+@router.get("/archive/entries", response_model=ArchiveEntriesResponse)
+def browse_archive(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[ArchiveQueueStatus] = None,
+    employee: Optional[str] = None,
+    full_name: Optional[str] = None,
+    program: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_claims)
+):
+    """Просмотр архива постранично: keyset по (archived_at, id), от новых к старым"""
+    query = build_archive_query(
+        db,
+        date_from=date_from,
+        date_to=date_to,
+        employee=employee,
+        program=program,
+        status=status,
+        full_name=full_name
+    )
+
+    size = page_size(limit)
+    entries, next_cursor = keyset_page(query, ArchivedQueueEntry.archived_at, ArchivedQueueEntry.id, size, cursor)
+    total, exact = estimate_total(query)
+
+    return ArchiveEntriesResponse(
+        entries=entries,
+        total=total,
+        total_exact=exact,
+        limit=size,
+        next_cursor=next_cursor
+    )
+
+@router.get("/archive/statistics", response_model=ArchiveStatistics)
+def get_archive_statistics_api(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_claims)
+):
+    """Статистика архива за период (читается из агрегатов, а не из самого архива)"""
+    return get_archive_statistics(db, date_from, date_to)
+
 @router.get("/archive/cleanup/preview")
 def preview_archive_cleanup(
     days_old: int = 30,
     status_filter: Optional[str] = None,
+    limit: Optional[int] = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: TokenData = Depends(get_admin_claims)
 ):
     """Предварительный просмотр записей для очистки архива"""
     try:
@@ -765,50 +725,78 @@ def preview_archive_cleanup(
         
         cutoff_date = datetime.utcnow() - timedelta(days=days_old)
         
-        # Формируем запрос для поиска старых записей
-        query = db.query(ArchivedQueueEntry).filter(
-            ArchivedQueueEntry.archived_at < cutoff_date
-        )
-        
-        # Добавляем фильтр по статусу если указан
-        if status_filter:
-            query = query.filter(ArchivedQueueEntry.status == status_filter)
-        
-        # Получаем записи
-        old_entries = query.limit(100).all()  # Ограничиваем для предварительного просмотра
-        total_count = query.count()
-        
-        preview_entries = []
-        for entry in old_entries:
-            preview_entries.append({
-                "id": entry.id,
-                "original_id": entry.original_id,
-                "full_name": entry.full_name,
-                "status": entry.status.value if entry.status else None,
-                "archived_at": entry.archived_at.isoformat() if entry.archived_at else None,
-                "archive_reason": entry.archive_reason
-            })
+        # Одним запросом: страница записей и общее количество (COUNT(*) OVER ())
+        preview = preview_cleanup(db, cutoff_date, status_filter, page_size(limit), cursor)
+        preview_entries = preview["entries"]
         
         return {
             "success": True,
-            "total_entries_to_delete": total_count,
+            "total_entries_to_delete": preview["total"],
             "preview_entries": preview_entries,
             "cutoff_date": cutoff_date.isoformat(),
             "days_old": days_old,
             "status_filter": status_filter,
-            "preview_limit": len(preview_entries)
+            "preview_limit": len(preview_entries),
+            "next_cursor": preview["next_cursor"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Ошибка предварительного просмотра очистки: {e}")
         raise HTTPException(status_code=500, detail=f"Error previewing cleanup: {str(e)}")
 
+# === ФОНОВЫЕ ВЫГРУЗКИ АРХИВА ===
+
+@router.post("/archive/export-jobs", response_model=ExportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def create_archive_export_job(
+    filters: ExportFilters,
+    current_user: TokenData = Depends(get_admin_claims)
+):
+    """Запустить выгрузку архива в фоне (повторный запрос с теми же фильтрами вернет ту же задачу)"""
+    if filters.date_from and filters.date_to and filters.date_from > filters.date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be later than date_to")
+
+    export_jobs.prune_expired()
+    job = export_jobs.submit(filters)
+    return job.to_response()
+
+@router.get("/archive/export-jobs/{job_id}", response_model=ExportJobResponse)
+def get_archive_export_job(
+    job_id: str,
+    current_user: TokenData = Depends(get_admin_claims)
+):
+    """Статус и прогресс выгрузки архива"""
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job.to_response()
+
+@router.get("/archive/export-jobs/{job_id}/download")
+def download_archive_export(
+    job_id: str,
+    current_user: TokenData = Depends(get_admin_claims)
+):
+    """Скачать готовый файл выгрузки архива"""
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job.status != "done" or job.is_expired():
+        raise HTTPException(status_code=409, detail=f"Export is not ready (status: {job.status})")
+
+    media_type = CSV_MEDIA_TYPE if job.filters.format == "csv" else XLSX_MEDIA_TYPE
+    return FileResponse(
+        job.path,
+        media_type=media_type,
+        filename=f"archive_export_{job.finished_at.strftime('%Y%m%d_%H%M%S')}.{job.filters.format}"
+    )
+
 # === РОУТЫ ДЛЯ УПРАВЛЕНИЯ ВИДЕО ===
 
 @router.get("/video-settings", response_model=VideoSettingsResponse)
 def get_video_settings(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: TokenData = Depends(get_admin_claims)
 ):
     """Get current video settings (admin only)"""
     settings = db.query(VideoSettings).first()
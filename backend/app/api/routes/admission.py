@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List, Union
+from typing import List, Optional, Union
 import logging
 
 from app.database import get_db
@@ -8,8 +9,11 @@ from app.models.user import User, EmployeeStatus  # Добавляем импо
 from app.models.queue import QueueEntry, QueueStatus
 from app.schemas import QueueResponse, QueueUpdate, UserResponse  # Добавляем импорт UserResponse
 from app.security import get_admission_user
-from app.services.queue import update_queue_entry, get_all_queue_entries, start_processing_time, end_processing_time
+from app.services.queue import update_queue_entry, claim_next_entry, EmployeeNotAvailableError, UnknownEmployeeError
+from app.services.queue_state import complete_current, InvalidTransitionError, invalid_transition
+from app.models.queue_event import QueueEventType
 from app.services.speechkit import generate_speech  # Возвращаем Yandex SpeechKit
+from app.services.pagination import keyset_page, estimate_total, page_size, set_page_headers
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -24,22 +28,12 @@ def finish_work(
     """Завершить рабочий день (перейти в статус offline)"""
     logger.info(f"User {current_user.id} finishing work")
     
-    # Если сотрудник занят с абитуриентом, сначала освободим его
+    # Если сотрудник занят с абитуриентом, сначала освободим его (тем же запросом
+    # завершается активная заявка, если она есть); иначе просто OFFLINE
     if current_user.status in [EmployeeStatus.BUSY.value, EmployeeStatus.PAUSED.value]:
-        # Находим текущую активную заявку для этого сотрудника
-        current_entry = db.query(QueueEntry).filter(
-            QueueEntry.status == QueueStatus.IN_PROGRESS,
-            QueueEntry.assigned_employee_name == current_user.full_name
-        ).first()
-        
-        if current_entry:
-            # Если есть активная заявка, меняем её статус на COMPLETED
-            current_entry.status = QueueStatus.COMPLETED
-            end_processing_time(db, current_entry.id)
-            db.add(current_entry)
-    
-    # Меняем статус сотрудника на OFFLINE
-    current_user.status = EmployeeStatus.OFFLINE.value
+        complete_current(db, current_user, EmployeeStatus.OFFLINE.value)
+    else:
+        current_user.status = EmployeeStatus.OFFLINE.value
     
     db.commit()
     db.refresh(current_user)
@@ -99,29 +93,29 @@ async def call_next_applicant(
     """Вызвать следующего абитуриента из очереди с голосовой озвучкой"""
     logger.info(f"User {current_user.id} calling next applicant")
     
-    # Проверяем, что сотрудник доступен
-    if current_user.status != EmployeeStatus.AVAILABLE.value:
+    desk = current_user.desk or "не указан"
+    employee_name = current_user.full_name
+    
+    # Заявка и статус сотрудника меняются одной транзакцией (с блокировками),
+    # озвучка - уже после commit, чтобы не держать блокировки на время синтеза
+    try:
+        next_entry = await run_in_threadpool(
+            claim_next_entry, db, current_user, QueueEventType.CALLED, {"desk": desk}
+        )
+    except EmployeeNotAvailableError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="You must be available to call next applicant"
         )
     
-    # Ищем следующего абитуриента в очереди, который выбрал этого сотрудника
-    next_entry = db.query(QueueEntry).filter(
-        QueueEntry.status == QueueStatus.WAITING,
-        QueueEntry.assigned_employee_name == current_user.full_name
-    ).order_by(QueueEntry.queue_number).first()
-    
     if not next_entry:
-        logger.warning(f"No applicants assigned to employee {current_user.full_name}")
+        logger.warning(f"No applicants assigned to employee {employee_name}")
         return {
             "message": "Нет абитуриентов в очереди для вас.",
             "status": "empty_queue",
             "success": False
         }
     
-    # СНАЧАЛА ГЕНЕРИРУЕМ АУДИО
-    desk = current_user.desk or "не указан"
     language = next_entry.form_language or 'ru'
     
     logger.info(f"🎤 Генерируем речь для: номер {next_entry.queue_number}, {next_entry.full_name}, стол {desk}, язык {language}")
@@ -135,16 +129,6 @@ async def call_next_applicant(
     
     logger.info(f"✅ Speech generation result: {speech_result['success']}")
     
-    # ПОТОМ обновляем статус заявки и сотрудника
-    next_entry.status = QueueStatus.IN_PROGRESS
-    current_user.status = EmployeeStatus.BUSY.value
-    
-    start_processing_time(db, next_entry.id)
-    
-    db.commit()
-    db.refresh(next_entry)
-    db.refresh(current_user)
-    
     # Возвращаем данные с аудио
     response_data = {
         "id": next_entry.id,
@@ -183,24 +167,6 @@ def complete_current_applicant(
             detail="You must be busy with an applicant or paused to complete"
         )
     
-    # Находим текущую активную заявку для этого сотрудника
-    current_entry = db.query(QueueEntry).filter(
-        QueueEntry.status == QueueStatus.IN_PROGRESS,
-        QueueEntry.assigned_employee_name == current_user.full_name
-    ).first()
-    
-    if not current_entry:
-        logger.warning(f"No active entry found for employee {current_user.full_name}")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No active applicant found to complete"
-        )
-    
-    # Завершаем заявку
-    current_entry.status = QueueStatus.COMPLETED
-    end_processing_time(db, current_entry.id)
-    db.add(current_entry)
-    
     # 🎯 ВАЖНО: Определяем новый статус сотрудника
     # Если сотрудник был на паузе - остается на паузе
     # Если сотрудник был busy - становится available
@@ -211,10 +177,17 @@ def complete_current_applicant(
         new_status = EmployeeStatus.AVAILABLE.value
         logger.info(f"Employee {current_user.id} becomes AVAILABLE after completing applicant")
     
-    current_user.status = new_status
+    # Заявка, архив, журнал и статус сотрудника - одним запросом
+    completed = complete_current(db, current_user, new_status)
+    if not completed:
+        db.rollback()
+        logger.warning(f"No active entry found for employee {current_user.full_name}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No active applicant found to complete"
+        )
     
     db.commit()
-    db.refresh(current_entry)
     db.refresh(current_user)
     
     return current_user
@@ -230,22 +203,33 @@ def get_employee_status(
 # Существующие эндпоинты
 @router.get("/queue", response_model=List[QueueResponse])
 def list_queue(
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_admission_user),
-    status: QueueStatus = None
+    status: QueueStatus = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
 ):
     """Get queue entries assigned to the current user (for admission staff)"""
     logger.info(f"User {current_user.id} retrieving their queue with status {status}")
     
-    # Получаем заявки, фильтруя по имени текущего сотрудника
+    # Получаем заявки текущего сотрудника (по id, индекс по сотруднику и статусу)
     query = db.query(QueueEntry).filter(
-        QueueEntry.assigned_employee_name == current_user.full_name
+        QueueEntry.assigned_employee_id == current_user.id
     )
     
     # Если указан статус, добавляем фильтр по нему
     if status:
         query = query.filter(QueueEntry.status == status)
     
+    # Постранично: keyset по (created_at, id) в порядке поступления
+    if limit is not None or cursor is not None:
+        entries, next_cursor = keyset_page(
+            query, QueueEntry.created_at, QueueEntry.id, page_size(limit), cursor, descending=False
+        )
+        set_page_headers(response, next_cursor, estimate_total(query))
+        return entries
+    
     # Сортируем по номеру в очереди для удобства
     query = query.order_by(QueueEntry.queue_number)
     
@@ -259,11 +243,13 @@ def process_next_in_queue(
     """Move the next waiting applicant to in-progress status"""
     logger.info(f"User {current_user.id} processing next queue entry")
     
-    # Ищем следующего абитуриента в очереди, который выбрал этого сотрудника
-    next_entry = db.query(QueueEntry).filter(
-        QueueEntry.status == QueueStatus.WAITING,
-        QueueEntry.assigned_employee_name == current_user.full_name
-    ).order_by(QueueEntry.queue_number).first()
+    try:
+        next_entry = claim_next_entry(db, current_user, QueueEventType.STARTED)
+    except EmployeeNotAvailableError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You must be available to call next applicant"
+        )
     
     if not next_entry:
         logger.warning(f"No applicants assigned to employee {current_user.full_name}")
@@ -272,13 +258,6 @@ def process_next_in_queue(
             detail="No applicants assigned to you in the queue"
         )
     
-    next_entry.status = QueueStatus.IN_PROGRESS
-    current_user.status = EmployeeStatus.BUSY.value
-    
-    db.commit()
-    db.refresh(next_entry)
-    db.refresh(current_user)
-    
     logger.info(f"Queue entry {next_entry.id} moved to IN_PROGRESS")
     
     return next_entry
@@ -301,7 +280,14 @@ def update_queue_status(
             detail="Queue entry not found"
         )
     
-    return update_queue_entry(db, queue_entry, queue_update)
+    try:
+        return update_queue_entry(db, queue_id, queue_update, actor=current_user.id)
+    except InvalidTransitionError as e:
+        db.rollback()
+        raise invalid_transition(e)
+    except UnknownEmployeeError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown employee: {e}")
 
 @router.delete("/queue/{queue_id}", response_model=QueueResponse)
 def delete_queue_entry(
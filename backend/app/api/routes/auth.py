@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 from sqlalchemy.orm import Session
@@ -6,12 +7,21 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.schemas import UserCreate, UserResponse, Token
 from app.models.user import User
-from app.security import create_access_token, get_password_hash, verify_password
+from app.security import create_access_token, verify_and_update_password, user_token_claims
 from app.config import settings
 from app.services.user import create_user, get_user_by_email
+from app.services.rate_limit import SlidingWindowLimiter, client_ip, too_many_requests
 
 router = APIRouter()
 
+# Неудачные попытки входа: на пару аккаунт + IP и на IP.
+# Жесткий лимит на аккаунт без IP не ставим: иначе любой, кто знает e-mail
+# сотрудника, мог бы закрыть ему вход во время приема. Общий потолок на
+# аккаунт выше и срабатывает только на перебор с многих адресов.
+account_failures = SlidingWindowLimiter(settings.LOGIN_MAX_FAILURES_PER_ACCOUNT, settings.LOGIN_FAILURE_WINDOW_SECONDS, "login_account")
+account_total_failures = SlidingWindowLimiter(settings.LOGIN_MAX_FAILURES_PER_ACCOUNT_TOTAL, settings.LOGIN_FAILURE_WINDOW_SECONDS, "login_account_total")
+ip_failures = SlidingWindowLimiter(settings.LOGIN_MAX_FAILURES_PER_IP, settings.LOGIN_FAILURE_WINDOW_SECONDS, "login_ip")
+
 @router.post("/register", response_model=UserResponse)
 def register_user(user: UserCreate, db: Session = Depends(get_db)):
     """Register a new applicant user"""
@@ -23,31 +33,55 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     # Create new user
     return create_user(db=db, user=user, role="applicant")
 
+def _login_failed(account: str, ip_key: str):
+    account_failures.hit(f"{account}|{ip_key}")
+    account_total_failures.hit(account)
+    ip_failures.hit(ip_key)
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Incorrect email or password",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Login with email and password"""
-    # Get user by email
-    user = get_user_by_email(db, form_data.username)
+    ip_key = client_ip(request)
+    account = form_data.username.strip().lower()
+    account_key = f"{account}|{ip_key}"
+    
+    # Перебор паролей отсекаем до bcrypt
+    retry_after = (
+        account_failures.check(account_key)
+        or account_total_failures.check(account)
+        or ip_failures.check(ip_key)
+    )
+    if retry_after:
+        raise too_many_requests(retry_after, "Too many failed login attempts, try again later")
+    
+    # Get user by email (запросы к базе - в пуле потоков, не в event loop)
+    user = await run_in_threadpool(get_user_by_email, db, form_data.username)
     
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Verify password
-    if not verify_password(form_data.password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _login_failed(account, ip_key)
+    
+    # Verify password (bcrypt - в отдельном ограниченном пуле)
+    valid, new_hash = await verify_and_update_password(form_data.password, user.hashed_password)
+    if not valid:
+        raise _login_failed(account, ip_key)
+    
+    account_failures.reset(account_key)
+    
+    # Параметры bcrypt изменились - пересохраняем хэш прозрачно для пользователя
+    if new_hash:
+        user.hashed_password = new_hash
+        await run_in_threadpool(db.commit)
+        await run_in_threadpool(db.refresh, user)
     
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.id},
+        data=user_token_claims(user),
         expires_delta=access_token_expires
     )
     
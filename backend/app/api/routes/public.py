@@ -1,46 +1,72 @@
 # app/api/routes/public.py
-from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from typing import Optional
 from typing import List
 from datetime import datetime
 from app.database import get_db
 from app.models.queue import QueueEntry, QueueStatus
 from app.models.user import User
-from app.schemas.queue import PublicQueueCreate, QueueResponse, PublicQueueResponse
+from app.schemas.queue import PublicQueueCreate, QueueResponse, PublicQueueResponse, ProgramLoad
 from app.services.captcha import verify_captcha
-from app.services.queue import create_queue_entry, get_queue_count
+from app.services.queue import create_queue_entry, get_queue_count, DuplicateQueueEntryError
+from app.services.queue_state import transition
+from app.services.program_counters import read_program_load
+from app.models.queue_event import QueueEventType
+from app.services.idempotency import (
+    idempotency_cache,
+    find_by_idempotency_key,
+    validate_idempotency_key
+)
+from app.services.search import find_queue_entry_by_name, normalize_name
+from app.services.rate_limit import (
+    SlidingWindowLimiter,
+    client_ip,
+    limited_client_ip,
+    limit_by,
+    normalize_phone_key,
+    path_param,
+    query_param
+)
+from app.config import settings
 from app.models.video import VideoSettings
 from app.schemas.video import VideoSettingsResponse
 
 router = APIRouter(prefix="/public")
 
+# Лимиты публичных эндпоинтов: проверяются до обращения к базе
+submit_per_ip = SlidingWindowLimiter.from_rule(settings.RATE_LIMIT_SUBMIT_PER_IP, "submit_ip")
+submit_per_phone = SlidingWindowLimiter.from_rule(settings.RATE_LIMIT_SUBMIT_PER_PHONE, "submit_phone")
+check_per_ip = SlidingWindowLimiter.from_rule(settings.RATE_LIMIT_CHECK_PER_IP, "check_ip")
+check_per_name = SlidingWindowLimiter.from_rule(settings.RATE_LIMIT_CHECK_PER_NAME, "check_name")
+modify_per_ip = SlidingWindowLimiter.from_rule(settings.RATE_LIMIT_MODIFY_PER_IP, "modify_ip")
+modify_per_entry = SlidingWindowLimiter.from_rule(settings.RATE_LIMIT_MODIFY_PER_ENTRY, "modify_entry")
+
 @router.get("/display-queue", response_model=List[dict])
 def get_display_queue(db: Session = Depends(get_db)):
     """Get queue entries for public display (no auth required)"""
     # Получаем записи очереди со статусом 'in_progress'
-    entries = db.query(QueueEntry).filter(
+    # Стол сотрудника - тем же запросом (join по assigned_employee_id)
+    entries = db.query(QueueEntry, User.desk).outerjoin(
+        User, User.id == QueueEntry.assigned_employee_id
+    ).filter(
         QueueEntry.status == QueueStatus.IN_PROGRESS
     ).all()
     
     # Преобразуем в список словарей и добавляем информацию о столе
     result = []
-    for entry in entries:
+    for entry, desk in entries:
         entry_dict = {
             "id": entry.id,
             "queue_number": entry.queue_number,
             "status": entry.status,
             "assigned_employee_name": entry.assigned_employee_name,
-            "employee_desk": None,
+            "employee_desk": desk,
             "programs": entry.programs 
         }
         
-        # Ищем информацию о столе сотрудника
-        if entry.assigned_employee_name:
-            employee = db.query(User).filter(User.full_name == entry.assigned_employee_name).first()
-            if employee and employee.desk:
-                entry_dict["employee_desk"] = employee.desk
-        
         result.append(entry_dict)
     
     return result
@@ -61,17 +87,28 @@ def get_employees(db: Session = Depends(get_db)):
     # Возвращаем список сотрудников с ролью admission, которые online
     return [{"name": emp.full_name, "status": emp.status, "desk": emp.desk} for emp in online_employees]
 
-@router.post("/queue", response_model=QueueResponse)
+@router.post("/queue", response_model=QueueResponse, dependencies=[Depends(limit_by(submit_per_ip, limited_client_ip))])
 def add_to_queue(
     queue_data: PublicQueueCreate,
     request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db)
 ):
     """Add applicant to the queue (public endpoint) with automatic employee assignment"""
     print(f"🚀 Получены данные: {queue_data}")
     
+    # Повтор той же отправки - отдаем уже созданный талон (лимит по телефону не расходуем)
+    idempotency_key = validate_idempotency_key(idempotency_key)
+    if idempotency_key:
+        existing = find_by_idempotency_key(db, idempotency_key, queue_data.phone)
+        if existing:
+            print(f"♻️ Повтор отправки {idempotency_key}: заявка {existing.id}")
+            return existing
+    
+    submit_per_phone.enforce(normalize_phone_key(queue_data.phone), "Too many submissions for this phone number")
+    
     # Проверяем капчу
-    captcha_valid = verify_captcha(queue_data.captcha_token, request.client.host)
+    captcha_valid = verify_captcha(queue_data.captcha_token, client_ip(request), idempotency_key)
     if not captcha_valid:
         print("❌ Капча не прошла проверку")
         raise HTTPException(status_code=400, detail="Invalid captcha")
@@ -84,6 +121,9 @@ def add_to_queue(
         QueueEntry.status.in_([QueueStatus.WAITING, QueueStatus.IN_PROGRESS])
     ).first()
     
+    if existing_entry and idempotency_key and existing_entry.idempotency_key == idempotency_key:
+        return existing_entry
+    
     if existing_entry:
         print(f"❌ Заявка уже существует: {existing_entry.id}")
         raise HTTPException(status_code=400, detail="Вы уже стоите в очереди")
@@ -93,24 +133,36 @@ def add_to_queue(
     
     # Создаем заявку с автоматическим назначением сотрудника
     try:
-        result = create_queue_entry(db, queue_data)
+        result = create_queue_entry(db, queue_data, idempotency_key)
+        if idempotency_key:
+            idempotency_cache.put(idempotency_key, result.id)
         print(f"✅ Заявка создана: {result.id}, номер: {result.queue_number}, сотрудник: {result.assigned_employee_name}")
         return result
+    except (DuplicateQueueEntryError, IntegrityError) as e:
+        # Параллельный повтор с тем же ключом успел создать заявку первым
+        existing = find_by_idempotency_key(db, idempotency_key, queue_data.phone) if idempotency_key else None
+        if existing:
+            return existing
+        if isinstance(e, DuplicateQueueEntryError):
+            raise HTTPException(status_code=400, detail="Вы уже стоите в очереди")
+        raise HTTPException(status_code=409, detail="Conflicting queue submission")
     except Exception as e:
         print(f"❌ Ошибка создания заявки: {e}")
         raise HTTPException(status_code=500, detail=f"Error creating queue entry: {str(e)}")
 
-@router.get("/queue/check", response_model=PublicQueueResponse)
+@router.get("/queue/check", response_model=PublicQueueResponse, dependencies=[
+    Depends(limit_by(check_per_ip, limited_client_ip)),
+    Depends(limit_by(check_per_name, query_param("full_name", normalize_name)))
+])
 def check_queue_by_name(
     full_name: str = Query(..., description="ФИО для проверки статуса"),
+    phone: Optional[str] = Query(None, description="Телефон заявки (нужен, если ФИО написано неточно)"),
     db: Session = Depends(get_db)
 ):
     """Проверка статуса заявки по ФИО абитуриента"""
     
-    # Поиск заявки
-    queue_entry = db.query(QueueEntry).filter(
-        QueueEntry.full_name == full_name
-    ).order_by(desc(QueueEntry.created_at)).first()
+    # Поиск заявки: нормализованное ФИО, близкое написание - только вместе с телефоном
+    queue_entry = find_queue_entry_by_name(db, full_name, phone)
     
     if not queue_entry:
         raise HTTPException(
@@ -128,7 +180,7 @@ def check_queue_by_name(
         # и с меньшим номером в очереди
         people_ahead = db.query(QueueEntry).filter(
             QueueEntry.status == QueueStatus.WAITING,
-            QueueEntry.assigned_employee_name == queue_entry.assigned_employee_name,  # 🔥 ДОБАВЛЕНО
+            QueueEntry.assigned_employee_id == queue_entry.assigned_employee_id,  # 🔥 ДОБАВЛЕНО
             QueueEntry.queue_number < queue_entry.queue_number
         ).count()
         
@@ -146,7 +198,10 @@ def check_queue_by_name(
     
     return response
 
-@router.delete("/queue/cancel/{queue_id}", response_model=QueueResponse)
+@router.delete("/queue/cancel/{queue_id}", response_model=QueueResponse, dependencies=[
+    Depends(limit_by(modify_per_ip, limited_client_ip)),
+    Depends(limit_by(modify_per_entry, path_param("queue_id")))
+])
 def cancel_queue_by_id(
     queue_id: str,
     db: Session = Depends(get_db)
@@ -164,14 +219,17 @@ def cancel_queue_by_id(
             detail="Заявка не найдена или уже завершена"
         )
     
-    # Меняем статус на COMPLETED (отменено)
-    queue_entry.status = QueueStatus.COMPLETED
+    # В основной таблице - COMPLETED, в архиве и журнале - отмена
+    transition(db, queue_entry, QueueEventType.CANCELLED, actor="applicant")
     db.commit()
     db.refresh(queue_entry)
     
     return queue_entry
 
-@router.put("/queue/move-back/{queue_id}", response_model=PublicQueueResponse)
+@router.put("/queue/move-back/{queue_id}", response_model=PublicQueueResponse, dependencies=[
+    Depends(limit_by(modify_per_ip, limited_client_ip)),
+    Depends(limit_by(modify_per_entry, path_param("queue_id")))
+])
 def move_back_in_queue(
     queue_id: str,
     db: Session = Depends(get_db)
@@ -194,7 +252,12 @@ def move_back_in_queue(
     next_number = last_entry + 1 if last_entry else 1
     
     # Обновляем номер в очереди
+    previous_number = queue_entry.queue_number
     queue_entry.queue_number = next_number
+    transition(db, queue_entry, QueueEventType.MOVED_BACK, actor="applicant", payload={
+        "from_number": previous_number,
+        "queue_number": next_number
+    })
     db.commit()
     db.refresh(queue_entry)
     
@@ -215,6 +278,11 @@ def move_back_in_queue(
     
     return response
 
+@router.get("/queue/programs", response_model=List[ProgramLoad])
+def get_program_load(db: Session = Depends(get_db)):
+    """Нагрузка по программам для табло в зале (из счетчиков, без сканирования очереди)"""
+    return read_program_load(db)
+
 @router.get("/queue/count")
 def get_queue_count_endpoint(db: Session = Depends(get_db)):  # Удалите async
     return {"count": get_queue_count(db)}
@@ -10,6 +10,8 @@ from app.models.queue import QueueEntry, QueueStatus
 from app.schemas import QueueCreate, QueueResponse, QueueStatusResponse, PublicQueueCreate, PublicQueueResponse
 from app.security import get_current_active_user
 from app.services import queue as queue_service
+from app.services.queue_state import transition
+from app.models.queue_event import QueueEventType
 
 router = APIRouter()
 
@@ -83,7 +85,7 @@ def cancel_queue_by_user(
             detail="No active queue entry found"
         )
     
-    queue_entry.status = QueueStatus.COMPLETED
+    transition(db, queue_entry, QueueEventType.CANCELLED, actor=current_user.id)
     db.commit()
     db.refresh(queue_entry)
     
@@ -113,7 +115,7 @@ def cancel_queue_by_id(
             detail="Not allowed to cancel this queue entry"
         )
 
-    queue_entry.status = QueueStatus.COMPLETED
+    transition(db, queue_entry, QueueEventType.CANCELLED, actor=current_user.id)
     db.commit()
     db.refresh(queue_entry)
 
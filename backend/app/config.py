@@ -9,6 +9,15 @@ class Settings(BaseSettings):
     ADMIN_EMAIL: str
     ADMIN_PASSWORD: str
     RECAPTCHA_SECRET_KEY: str = "6Lf_mUQrAAAAALFCOaj5iTDL2XYcVOu1vUmSnHdk"
+    RECAPTCHA_ACTION: str = "submit_queue_form"  # Должно совпадать с action во фронтенде
+    RECAPTCHA_MIN_SCORE: float = 0.5
+    RECAPTCHA_TIMEOUT_SECONDS: float = 3.0
+    RECAPTCHA_CONNECT_TIMEOUT_SECONDS: float = 1.0
+    RECAPTCHA_CACHE_TTL_SECONDS: int = 120  # Токен v3 живет 2 минуты (кэш отказов и одноразовых успехов)
+    RECAPTCHA_CACHE_SIZE: int = 1000
+    RECAPTCHA_BREAKER_THRESHOLD: int = 5
+    RECAPTCHA_BREAKER_RESET_SECONDS: int = 30
+    RECAPTCHA_FAIL_OPEN: bool = False  # Google недоступен: False - отклонять заявки, True - пропускать (капча фактически выключена)
     
     # Google TTS вместо Yandex
     GOOGLE_TTS_API_KEY: Optional[str] = ""
@@ -16,6 +25,75 @@ class Settings(BaseSettings):
     GOOGLE_CREDENTIALS_PATH: str = "focus-strand-462605-u4-591149cd753b.json"
     GOOGLE_SHEETS_SCOPES: list = ["https://www.googleapis.com/auth/spreadsheets"]
 
+    # Синхронизация архива: LISTEN/NOTIFY вместо постоянного опроса sync_log
+    SYNC_NOTIFY_CHANNEL: str = "archive_sync"
+    SYNC_NOTIFY_DEBOUNCE_SECONDS: float = 0.2
+    SYNC_FALLBACK_POLL_SECONDS: int = 10  # Только если LISTEN недоступен
+
+    # Архив разбит на помесячные партиции по archived_at
+    ARCHIVE_PARTITION_MONTHS_AHEAD: int = 2
+    ARCHIVE_RETENTION_MODE: str = "detach"  # detach - отсоединить (холодное хранение), drop - удалить безвозвратно (только явно)
+    ARCHIVE_CLEANUP_CHUNK_SIZE: int = 1000  # Строк на одну транзакцию при очистке архива
+
+    # Фоновые выгрузки архива
+    EXPORT_DIR: str = "/tmp/queue_exports"
+    EXPORT_JOB_WORKERS: int = 2
+    EXPORT_CACHE_TTL_SECONDS: int = 3600
+
+    # Постраничная выдача списков (keyset по created_at, id)
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 500
+    PAGE_COUNT_CAP: int = 10000  # Дальше количество не считаем, отдаем как оценку
+
+    # Поиск абитуриентов (pg_trgm)
+    SEARCH_RESULTS_LIMIT: int = 20
+    SEARCH_PUBLIC_MIN_SIMILARITY: float = 0.8  # Нечеткое совпадение в /public/queue/check
+
+    # Кэш пользователей для get_current_user (0 - выключен)
+    USER_CACHE_TTL_SECONDS: float = 30
+
+    # Пароли: bcrypt в отдельном ограниченном пуле, защита входа от перебора
+    BCRYPT_ROUNDS: int = 12  # При изменении хэши пересчитываются при следующем входе
+    PASSWORD_HASH_WORKERS: int = 2
+    LOGIN_MAX_FAILURES_PER_ACCOUNT: int = 5  # На пару аккаунт + IP: чужой IP не может заблокировать сотрудника
+    LOGIN_MAX_FAILURES_PER_ACCOUNT_TOTAL: int = 50  # Потолок на аккаунт со всех IP (перебор с многих адресов)
+    LOGIN_MAX_FAILURES_PER_IP: int = 20
+    LOGIN_FAILURE_WINDOW_SECONDS: int = 300
+
+    # Идемпотентность POST /public/queue (заголовок Idempotency-Key)
+    IDEMPOTENCY_CACHE_TTL_SECONDS: int = 600
+
+    # Ограничение частоты публичных запросов: "попыток/секунд"
+    RATE_LIMIT_ENABLED: bool = True
+    TRUSTED_PROXY_IPS: list = ["127.0.0.1", "::1"]  # Прокси, чьему X-Real-IP верим (адреса или подсети)
+    RATE_LIMIT_BACKEND: str = "memory"
+    # Киоски и кампусный Wi-Fi выходят через один NAT-адрес: основной лимит подачи - по телефону,
+    # лимит по IP только отсекает явный флуд
+    RATE_LIMIT_SUBMIT_PER_IP: str = "60/60"
+    RATE_LIMIT_SUBMIT_PER_PHONE: str = "5/600"
+    RATE_LIMIT_CHECK_PER_IP: str = "30/60"
+    RATE_LIMIT_CHECK_PER_NAME: str = "10/60"
+    RATE_LIMIT_MODIFY_PER_IP: str = "10/60"
+    RATE_LIMIT_MODIFY_PER_ENTRY: str = "5/60"
+    RATE_LIMIT_TRUSTED_IPS: list = []  # Адреса киосков/NAT без лимитов по IP (лимиты по телефону и заявке остаются)
+
+    # Перехват заявок: свободный сотрудник без своей очереди берет
+    # самую старую заявку со стола с наибольшей очередью
+    QUEUE_WORK_STEALING: bool = False
+    QUEUE_STEAL_MIN_BACKLOG: int = 2  # Не трогаем столы, где ждут меньше
+
+    # Распределение новых заявок: round_robin, least_loaded, shortest_wait, affinity
+    ASSIGNMENT_STRATEGY: str = "round_robin"
+    ASSIGNMENT_DEFAULT_SERVICE_SECONDS: float = 300  # Пока нет данных о темпе стола
+    ASSIGNMENT_SERVICE_TIME_ALPHA: float = 0.2  # Вес последнего приема в скользящем среднем
+
+    # Плановая очистка основной таблицы: завершенные заявки (копия уже в архиве)
+    QUEUE_RETENTION_ENABLED: bool = True
+    QUEUE_RETENTION_HOURS: int = 12  # Завершенные раньше этого уходят из queue_entries
+    QUEUE_RETENTION_CHUNK_SIZE: int = 500
+    QUEUE_RETENTION_CRON_HOUR: int = 2  # Время запуска (вне приема)
+    QUEUE_RETENTION_CRON_MINUTE: int = 30
+
     postgres_user: Optional[str] = None
     postgres_password: Optional[str] = None
     postgres_db: Optional[str] = None
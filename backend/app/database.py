@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -7,6 +7,16 @@ from .config import settings
 # Create SQLAlchemy engine
 engine = create_engine(settings.DATABASE_URL)
 
+# Помечаем соединения приложения: триггер архива пишет origin='app' в sync_log,
+# а изменения из Adminer и других клиентов попадают туда как 'external'
+@event.listens_for(engine, "connect")
+def set_change_origin(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("SET app.change_origin = 'app'")
+    cursor.close()
+    # SET откатывается вместе с транзакцией, поэтому фиксируем сразу
+    dbapi_connection.commit()
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
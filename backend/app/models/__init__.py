@@ -5,4 +5,7 @@ from app.models.user import User
 from app.models.queue import QueueEntry
 from app.models.video import VideoSettings
 from app.models.archive import ArchivedQueueEntry
-from app.models.sync_settings import SyncSettings, SyncLog
\ No newline at end of file
+from app.models.sync_settings import SyncSettings, SyncLog
+from app.models.archive_stats import ArchiveDailyStat
+from app.models.queue_event import QueueEvent
+from app.models.program_counters import QueueProgramCounter
\ No newline at end of file
@@ -1,9 +1,11 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from uuid import uuid4
 import enum
 
 from app.database import Base
+from app.models.types import UUIDString
 
 class ArchiveQueueStatus(str, enum.Enum):
     WAITING = "waiting"
@@ -14,13 +16,21 @@ class ArchiveQueueStatus(str, enum.Enum):
 
 class ArchivedQueueEntry(Base):
     __tablename__ = "archived_queue_entries"
+    # Помесячные партиции по archived_at (см. app/services/archive_partitions.py)
+    __table_args__ = (
+        Index("ix_archived_queue_entries_programs_gin", "programs", postgresql_using="gin"),
+        Index("ix_archived_queue_entries_archived_at_id", "archived_at", "id"),
+        # Поиск копии заявки: каждый переход, завершение одним запросом, очистка очереди
+        Index("ix_archived_queue_entries_original_id", "original_id"),
+        {"postgresql_partition_by": "RANGE (archived_at)"},
+    )
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid4()))
-    original_id = Column(String, nullable=False)  # ID из основной таблицы
+    id = Column(UUIDString, primary_key=True, default=lambda: str(uuid4()))
+    original_id = Column(UUIDString, nullable=False)  # ID из основной таблицы
     queue_number = Column(Integer, nullable=False)
     full_name = Column(String, nullable=False)
     phone = Column(String, nullable=False)
-    programs = Column(JSON, nullable=False)
+    programs = Column(JSONB, nullable=False)
     status = Column(Enum(ArchiveQueueStatus), nullable=False)
     notes = Column(String, nullable=True)
     assigned_employee_name = Column(String, nullable=True)
@@ -29,5 +39,5 @@ class ArchivedQueueEntry(Base):
     completed_at = Column(DateTime(timezone=True), nullable=True) # Время завершения
     processing_time = Column(Integer, nullable=True)
     form_language = Column(String, nullable=True)
-    archived_at = Column(DateTime(timezone=True), server_default=func.now())  # Время архивирования
+    archived_at = Column(DateTime(timezone=True), primary_key=True, nullable=False, server_default=func.now())  # Время архивирования (ключ партиционирования)
     archive_reason = Column(String, nullable=True)  # Причина архивирования (limit_reached, manual, etc.)
\ No newline at end of file
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, String, Date, BigInteger
+
+from app.database import Base
+
+class ArchiveDailyStat(Base):
+    """
+    Агрегаты архива: день x статус x причина x сотрудник x программа x язык
+
+    Поддерживаются триггером на archived_queue_entries. Заявка с несколькими
+    программами попадает в строку каждой программы (program_count), но
+    entry_count учитывает ее только один раз - в строке первой программы.
+    """
+    __tablename__ = "archive_daily_stats"
+
+    day = Column(Date, primary_key=True)  # archived_at в UTC
+    status = Column(String, primary_key=True)
+    archive_reason = Column(String, primary_key=True, default="")
+    employee = Column(String, primary_key=True, default="")
+    program = Column(String, primary_key=True, default="")
+    form_language = Column(String, primary_key=True, default="")
+    entry_count = Column(BigInteger, nullable=False, default=0)
+    program_count = Column(BigInteger, nullable=False, default=0)
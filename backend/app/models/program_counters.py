@@ -0,0 +1,16 @@
+from sqlalchemy import Column, String, BigInteger
+
+from app.database import Base
+
+class QueueProgramCounter(Base):
+    """
+    Живые счетчики очереди: программа x статус
+
+    Поддерживаются триггером на queue_entries. Заявка с несколькими
+    программами учитывается в строке каждой своей программы.
+    """
+    __tablename__ = "queue_program_counters"
+
+    program = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)  # Имя статуса, как в Enum базы (WAITING)
+    entry_count = Column(BigInteger, nullable=False, default=0)
@@ -1,9 +1,11 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Index, ForeignKey
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from uuid import uuid4
 import enum
 
 from app.database import Base
+from app.models.types import UUIDString
 
 class QueueStatus(str, enum.Enum):
     WAITING = "waiting"
@@ -13,16 +15,24 @@ class QueueStatus(str, enum.Enum):
 
 class QueueEntry(Base):
     __tablename__ = "queue_entries"
+    __table_args__ = (
+        Index("ix_queue_entries_programs_gin", "programs", postgresql_using="gin"),
+        Index("ix_queue_entries_created_at_id", "created_at", "id"),
+        Index("ux_queue_entries_idempotency_key", "idempotency_key", unique=True),
+        Index("ix_queue_entries_employee_status_number", "assigned_employee_id", "status", "queue_number"),
+    )
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid4()))
+    id = Column(UUIDString, primary_key=True, default=lambda: str(uuid4()))
     queue_number = Column(Integer, nullable=False)
     full_name = Column(String, nullable=False)
     phone = Column(String, nullable=False)
-    programs = Column(JSON, nullable=False)  # Изменено с ARRAY(String) на JSON
+    programs = Column(JSONB, nullable=False)  # Массив кодов программ, GIN индекс для фильтра
     status = Column(Enum(QueueStatus), nullable=False)
     notes = Column(String, nullable=True)
-    assigned_employee_name = Column(String, nullable=True)
+    assigned_employee_name = Column(String, nullable=True)  # Имя для отображения; связь - assigned_employee_id
+    assigned_employee_id = Column(UUIDString, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     processing_time = Column(Integer, nullable=True)
-    form_language = Column(String, nullable=True)
\ No newline at end of file
+    form_language = Column(String, nullable=True)
+    idempotency_key = Column(String(64), nullable=True)  # Ключ запроса создания (повторы клиента)
\ No newline at end of file
@@ -0,0 +1,44 @@
+from sqlalchemy import Column, BigInteger, String, DateTime, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func, text
+import enum
+
+from app.database import Base
+from app.models.types import UUIDString
+
+class QueueEventType(str, enum.Enum):
+    CREATED = "created"
+    CALLED = "called"
+    STARTED = "started"
+    PAUSED = "paused"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+    MOVED_BACK = "moved_back"
+
+class QueueEvent(Base):
+    """
+    Журнал переходов заявок (только добавление)
+
+    Смещение для потребителей - (txid, id), а не один id: значение id
+    выдается при INSERT, и транзакция с меньшим id может закоммититься
+    после того, как больший id уже прочитан. txid - номер транзакции,
+    записавшей событие; читатели отдают только события транзакций старше
+    самой старой незавершенной (xmin снимка), такой набор уже не меняется.
+    Внешнего ключа на queue_entries нет - заявки удаляются и архивируются,
+    история остается.
+    """
+    __tablename__ = "queue_events"
+    __table_args__ = (
+        Index("ix_queue_events_entry_id_id", "entry_id", "id"),
+        Index("ix_queue_events_txid_id", "txid", "id"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    entry_id = Column(UUIDString, nullable=False)
+    event_type = Column(String(32), nullable=False)  # Значение QueueEventType
+    from_status = Column(String(32), nullable=True)
+    to_status = Column(String(32), nullable=False)
+    actor = Column(String, nullable=True)  # id сотрудника или "applicant"
+    payload = Column(JSONB, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    txid = Column(BigInteger, server_default=text("(pg_current_xact_id()::text::bigint)"), nullable=False)
@@ -0,0 +1,36 @@
+from typing import Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.types import TypeDecorator
+
+def parse_uuid(value) -> Optional[str]:
+    """Каноническая строка UUID или None, если значение не UUID"""
+    if value is None:
+        return None
+    try:
+        return str(value if isinstance(value, UUID) else UUID(str(value)))
+    except ValueError:
+        return None
+
+def uuid_values(values: Iterable) -> List[str]:
+    """Только корректные UUID - для параметров-массивов в сыром SQL (= ANY(...))"""
+    return [parsed for parsed in (parse_uuid(v) for v in values) if parsed]
+
+class UUIDString(TypeDecorator):
+    """
+    Нативный UUID в базе (16 байт вместо 36 символов), строка в Python
+
+    API и схемы по-прежнему работают со строками. Значение, которое не
+    является UUID (например, мусор в пути запроса), передается как NULL:
+    сравнение ничего не находит и маршрут отвечает своим обычным 404
+    вместо ошибки приведения типа в Postgres.
+    """
+    impl = PG_UUID(as_uuid=False)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return parse_uuid(value)
+
+    def process_result_value(self, value, dialect):
+        return str(value) if value is not None else None
@@ -1,9 +1,11 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from uuid import uuid4
 from enum import Enum
 
 from app.database import Base
+from app.models.types import UUIDString
 
 class EmployeeStatus(str, Enum):
     AVAILABLE = "available"  # Доступен для приема
@@ -13,8 +15,11 @@ class EmployeeStatus(str, Enum):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid4())) 
+    id = Column(UUIDString, primary_key=True, default=lambda: str(uuid4()))
     email = Column(String, unique=True, nullable=False)
     full_name = Column(String, nullable=False)
     phone = Column(String, nullable=True)
@@ -23,5 +28,7 @@ class User(Base):
     desk = Column(String, nullable=True)
     status = Column(String, default=EmployeeStatus.OFFLINE.value)
     is_active = Column(Boolean, default=True)
+    languages = Column(JSONB, nullable=True)  # Языки приема (ru, kz, en); NULL - любые
+    programs = Column(JSONB, nullable=True)   # Коды программ, которые ведет сотрудник; NULL - любые
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
@@ -30,6 +30,9 @@ class ArchiveStatistics(BaseModel):
     total_archived: int
     by_reason: dict
     by_status: dict
+    by_employee: dict = {}
+    by_program: dict = {}
+    by_language: dict = {}
     current_queue_size: int
     queue_limit: int
 
@@ -41,5 +44,6 @@ class CleanupResponse(BaseModel):
 class ArchiveEntriesResponse(BaseModel):
     entries: List[ArchivedQueueResponse]
     total: int
+    total_exact: bool = True
     limit: int
-    offset: int
\ No newline at end of file
+    next_cursor: Optional[str] = None
\ No newline at end of file
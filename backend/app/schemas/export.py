@@ -0,0 +1,28 @@
+from typing import Optional, Literal
+from datetime import date, datetime
+from pydantic import BaseModel, ConfigDict
+from app.models.archive import ArchiveQueueStatus
+
+class ExportFilters(BaseModel):
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    employee: Optional[str] = None
+    program: Optional[str] = None
+    status: Optional[ArchiveQueueStatus] = None
+    format: Literal["xlsx", "csv"] = "xlsx"
+
+class ExportJobResponse(BaseModel):
+    job_id: str
+    status: str  # pending, running, done, failed
+    filters: ExportFilters
+    total_rows: Optional[int] = None
+    processed_rows: int = 0
+    progress: float = 0.0
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    download_url: Optional[str] = None
+
+    model_config = ConfigDict(
+        json_encoders={datetime: lambda v: v.isoformat()}
+    )
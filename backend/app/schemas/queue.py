@@ -36,6 +36,7 @@ class QueueResponse(QueueBase):
     updated_at: Optional[datetime] = None
     employee_desk: Optional[str] = None
     processing_time: Optional[int] = None
+    assigned_employee_id: Optional[str] = None
     # ДОБАВЛЯЕМ ПОЛЕ ДЛЯ АУДИО
     speech: Optional[Dict[str, Any]] = None
 
@@ -67,4 +68,9 @@ class PublicQueueResponse(BaseModel):
     model_config = ConfigDict(
         from_attributes=True,
         json_encoders={datetime: lambda v: v.isoformat()}
-    )
\ No newline at end of file
+    )
+
+class ProgramLoad(BaseModel):
+    program: str  # Код программы
+    waiting: int = 0
+    in_progress: int = 0
\ No newline at end of file
@@ -0,0 +1,22 @@
+from typing import Optional, List, Any, Dict
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict
+
+class QueueEventResponse(BaseModel):
+    id: int
+    entry_id: str
+    event_type: str
+    from_status: Optional[str] = None
+    to_status: str
+    actor: Optional[str] = None
+    payload: Optional[Dict[str, Any]] = None
+    created_at: datetime
+
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_encoders={datetime: lambda v: v.isoformat()}
+    )
+
+class QueueEventsResponse(BaseModel):
+    events: List[QueueEventResponse]
+    next_cursor: Optional[str] = None  # Смещение для следующего запроса ("txid.id" последнего события)
@@ -0,0 +1,22 @@
+from typing import Optional, List
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict
+
+class ApplicantSearchResult(BaseModel):
+    source: str  # queue или archive
+    id: str
+    queue_number: int
+    full_name: str
+    phone: str
+    status: str
+    assigned_employee_name: Optional[str] = None
+    created_at: Optional[datetime] = None
+    score: float
+
+    model_config = ConfigDict(
+        json_encoders={datetime: lambda v: v.isoformat()}
+    )
+
+class ApplicantSearchResponse(BaseModel):
+    query: str
+    results: List[ApplicantSearchResult]
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, List
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 
@@ -21,6 +21,8 @@ class UserResponse(UserBase):
     role: str
     status: Optional[str] = None  # Добавляем статус
     desk: Optional[str] = None    # Добавляем стол
+    languages: Optional[List[str]] = None
+    programs: Optional[List[str]] = None
     is_active: bool
     created_at: datetime
 
@@ -35,6 +37,8 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     user_id: Optional[str] = None
+    role: Optional[str] = None       # Клейм role: проверка роли без запроса к базе
+    is_active: Optional[bool] = None
 
 # Admin user creation schema
 class AdminUserCreate(BaseModel):
@@ -43,6 +47,8 @@ class AdminUserCreate(BaseModel):
     phone: str
     password: str
     desk: Optional[str] = None  # Добавляем поле для стола
+    languages: Optional[List[str]] = None  # Ограничения для перехвата заявок (NULL - любые)
+    programs: Optional[List[str]] = None
 
 # Схема для обновления пользователя
 class UserUpdate(BaseModel):
@@ -51,4 +57,6 @@ class UserUpdate(BaseModel):
     phone: Optional[str] = None
     desk: Optional[str] = None
     status: Optional[str] = None  # Добавляем статус
-    is_active: Optional[bool] = None
\ No newline at end of file
+    is_active: Optional[bool] = None
+    languages: Optional[List[str]] = None
+    programs: Optional[List[str]] = None
\ No newline at end of file
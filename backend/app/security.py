@@ -1,5 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -9,21 +11,38 @@ from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.models.user import User
+from app.schemas.user import TokenData
+from app.services.user_cache import user_cache
 from app.config import settings
 
 # Password context for hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# bcrypt выполняется только здесь: пик входов не занимает общий пул потоков запросов
+password_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password")
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 def verify_password(plain_password, hashed_password):
     """Verify password against hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_executor.submit(pwd_context.verify, plain_password, hashed_password).result()
 
 def get_password_hash(password):
     """Generate password hash"""
-    return pwd_context.hash(password)
+    return password_executor.submit(pwd_context.hash, password).result()
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Проверить пароль в пуле bcrypt, не блокируя event loop
+
+    Второе значение - новый хэш, если параметры стоимости изменились
+    (BCRYPT_ROUNDS) и хэш нужно пересохранить, иначе None.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -39,29 +58,37 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get current user from token"""
-    credentials_exception = HTTPException(
+def user_token_claims(user: User) -> dict:
+    """Клеймы токена: id, роль и активность (для проверок без запроса к базе)"""
+    return {"sub": user.id, "role": user.role, "active": bool(user.is_active)}
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def decode_token(token: str) -> TokenData:
+    """Decode JWT and return its claims"""
     try:
-        # Decode token
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        
-        if user_id is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
     
-    # Get user from database
-    user = db.query(User).filter(User.id == user_id).first()
+    user_id: str = payload.get("sub")
+    if user_id is None:
+        raise _credentials_exception()
+    
+    return TokenData(user_id=user_id, role=payload.get("role"), is_active=payload.get("active"))
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Get current user from token (через кэш пользователей)"""
+    claims = decode_token(token)
+    user = user_cache.get(db, claims.user_id)
     
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
     return user
 
@@ -80,9 +107,32 @@ def get_admission_user(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
+def get_admin_claims(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> TokenData:
+    """
+    Check admin role by token claims only (без запроса к базе)
+
+    Только для эндпоинтов на чтение: клеймы живут до истечения токена, и
+    пониженный или отключенный админ до тех пор проходит эту проверку.
+    Изменяющие эндпоинты используют get_admin_user - пользователь из кэша,
+    который сбрасывается при изменении и удалении сотрудника. Токены,
+    выданные до появления клеймов, проверяются по базе, как раньше.
+    """
+    claims = decode_token(token)
+    
+    if claims.role is None:
+        admin = get_admin_user(get_current_user(token, db))
+        return TokenData(user_id=admin.id, role=admin.role, is_active=admin.is_active)
+    
+    if claims.role != "admin" or claims.is_active is False:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized as admin"
+        )
+    return claims
+
 def get_admin_user(current_user: User = Depends(get_current_user)):
-    """Check if user is admin"""
-    if current_user.role != "admin":
+    """Check if user is an active admin (по текущему состоянию пользователя)"""
+    if current_user.role != "admin" or not current_user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized as admin"
@@ -1,11 +1,14 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from datetime import datetime, timedelta
+from sqlalchemy import and_, text
+from datetime import date, datetime, timedelta, time, timezone
 import logging
-from typing import List
+from typing import List, Optional
 
 from app.models.queue import QueueEntry, QueueStatus
 from app.models.archive import ArchivedQueueEntry, ArchiveQueueStatus
+from app.models.types import uuid_values
+from app.services.programs import get_program_codes_by_name, programs_overlap
+from app.services.search import name_contains
 
 logger = logging.getLogger(__name__)
 
@@ -134,30 +137,16 @@ def enforce_queue_limit(db: Session) -> bool:
         logger.error(f"Error in enforce_queue_limit: {e}")
         return True  # Даже при ошибке разрешаем создание
 
-def get_archive_statistics(db: Session) -> dict:
-    """Получить статистику архива"""
+def get_archive_statistics(db: Session, date_from=None, date_to=None) -> dict:
+    """Получить статистику архива (из агрегатов archive_daily_stats)"""
     try:
-        total_archived = db.query(ArchivedQueueEntry).count()
+        from app.services.archive_stats import read_archive_statistics
         
-        # Статистика по причинам архивирования
-        by_reason = db.query(
-            ArchivedQueueEntry.archive_reason,
-            func.count(ArchivedQueueEntry.id)
-        ).group_by(ArchivedQueueEntry.archive_reason).all()
-        
-        # Статистика по статусам
-        by_status = db.query(
-            ArchivedQueueEntry.status,
-            func.count(ArchivedQueueEntry.id)
-        ).group_by(ArchivedQueueEntry.status).all()
-        
-        return {
-            "total_archived": total_archived,
-            "by_reason": dict(by_reason),
-            "by_status": dict(by_status),
-            "current_queue_size": db.query(QueueEntry).count(),
-            "queue_limit": QUEUE_LIMIT
-        }
+        statistics = read_archive_statistics(db, date_from, date_to)
+        # Живая очередь ограничена QUEUE_LIMIT записями - подсчет дешевый
+        statistics["current_queue_size"] = db.query(QueueEntry).count()
+        statistics["queue_limit"] = QUEUE_LIMIT
+        return statistics
         
     except Exception as e:
         logger.error(f"Error getting archive statistics: {e}")
@@ -167,4 +156,50 @@ def get_archive_statistics(db: Session) -> dict:
             "by_status": {},
             "current_queue_size": 0,
             "queue_limit": QUEUE_LIMIT
-        }
\ No newline at end of file
+        }
+
+def build_archive_query(
+    db: Session,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    employee: Optional[str] = None,
+    program: Optional[str] = None,
+    status: Optional[ArchiveQueueStatus] = None,
+    full_name: Optional[str] = None
+):
+    """Запрос к архиву по фильтрам (диапазон по archived_at отсекает лишние партиции)"""
+    query = db.query(ArchivedQueueEntry)
+
+    if date_from:
+        query = query.filter(ArchivedQueueEntry.archived_at >= datetime.combine(date_from, time.min, tzinfo=timezone.utc))
+    if date_to:
+        query = query.filter(ArchivedQueueEntry.archived_at <= datetime.combine(date_to, time.max, tzinfo=timezone.utc))
+    if employee:
+        query = query.filter(ArchivedQueueEntry.assigned_employee_name.ilike(f"%{employee}%"))
+    if full_name:
+        query = query.filter(name_contains(ArchivedQueueEntry.full_name, full_name))
+    if status:
+        query = query.filter(ArchivedQueueEntry.status == status)
+    if program:
+        query = query.filter(programs_overlap(ArchivedQueueEntry.programs, get_program_codes_by_name(program)))
+
+    return query
+
+def delete_archive_entries(db: Session, entry_ids: List[str]) -> List[tuple]:
+    """
+    Удалить записи архива по id или original_id одним запросом (без commit)
+
+    Триггер архива пишет удаления в sync_log, и конвейер синхронизации
+    отправляет их в Google Sheets одним пакетом. Возвращает пары (id, original_id).
+    """
+    if not entry_ids:
+        return []
+    result = db.execute(
+        text("""
+            DELETE FROM archived_queue_entries
+            WHERE id = ANY(CAST(:ids AS uuid[])) OR original_id = ANY(CAST(:ids AS uuid[]))
+            RETURNING id::text AS id, original_id::text AS original_id
+        """),
+        {"ids": uuid_values(entry_ids)}
+    )
+    return [(row.id, row.original_id) for row in result]
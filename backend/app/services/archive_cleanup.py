@@ -0,0 +1,190 @@
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.archive import ArchiveQueueStatus
+from app.services.archive_partitions import drop_partitions_before, is_archive_partitioned, list_month_partitions
+from app.services.archive_stats import forget_archive_period
+from app.services.pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+MAX_CHUNK_SIZE = 10000  # Больше - пачка снова держит долгие блокировки
+
+PREVIEW_SQL = """
+    SELECT id::text AS id, original_id::text AS original_id, full_name, status, archived_at, archive_reason,
+           COUNT(*) OVER () AS total
+    FROM archived_queue_entries
+    WHERE {where}
+    ORDER BY archived_at DESC, id DESC
+    LIMIT :limit
+"""
+
+CHUNK_DELETE_SQL = """
+    WITH doomed AS (
+        SELECT id, archived_at
+        FROM archived_queue_entries
+        WHERE {where}
+        LIMIT :chunk_size
+    )
+    DELETE FROM archived_queue_entries a
+    USING doomed d
+    WHERE a.id = d.id AND a.archived_at = d.archived_at
+"""
+
+def _status_name(status_filter: str) -> str:
+    """Enum в базе хранится по имени (COMPLETED), фильтр приходит значением (completed)"""
+    try:
+        return ArchiveQueueStatus(status_filter).name
+    except ValueError:
+        return status_filter.upper()
+
+def _cleanup_where(cutoff: datetime, status_filter: Optional[str]):
+    conditions = ["archived_at < :cutoff"]
+    params = {"cutoff": cutoff}
+    if status_filter:
+        conditions.append("status::text = :status")
+        params["status"] = _status_name(status_filter)
+    return " AND ".join(conditions), params
+
+def preview_cleanup(db: Session, cutoff: datetime, status_filter: Optional[str] = None,
+                    limit: int = 100, cursor: Optional[str] = None) -> dict:
+    """
+    Предпросмотр очистки одним запросом: страница записей и COUNT(*) OVER ()
+
+    Раньше фильтр выполнялся дважды (limit и count). С курсором total -
+    количество оставшихся после курсора записей.
+    """
+    where, params = _cleanup_where(cutoff, status_filter)
+    if cursor:
+        archived_at, entry_id = decode_cursor(cursor)
+        where += " AND (archived_at, id) < (:cursor_at, CAST(:cursor_id AS uuid))"
+        params.update(cursor_at=archived_at, cursor_id=entry_id)
+
+    rows = db.execute(text(PREVIEW_SQL.format(where=where)), {**params, "limit": limit + 1}).fetchall()
+    total = rows[0].total if rows else 0
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].archived_at, rows[-1].id)
+
+    entries = []
+    for row in rows:
+        status = ArchiveQueueStatus[row.status].value if row.status in ArchiveQueueStatus.__members__ else row.status
+        entries.append({
+            "id": row.id,
+            "original_id": row.original_id,
+            "full_name": row.full_name,
+            "status": status,
+            "archived_at": row.archived_at.isoformat() if row.archived_at else None,
+            "archive_reason": row.archive_reason
+        })
+
+    return {"entries": entries, "total": total, "next_cursor": next_cursor}
+
+def estimate_cleanup(db: Session, cutoff: datetime, status_filter: Optional[str] = None,
+                     chunk_size: Optional[int] = None) -> dict:
+    """
+    Оценка стоимости очистки без выполнения (dry run)
+
+    Строки и стоимость - по плану EXPLAIN, без чтения данных. Отдельно
+    показываем партиции, которые уйдут целиком одной DDL-операцией.
+    """
+    chunk_size = chunk_size or settings.ARCHIVE_CLEANUP_CHUNK_SIZE
+    where, params = _cleanup_where(cutoff, status_filter)
+
+    plan_json = db.execute(
+        text(f"EXPLAIN (FORMAT JSON) SELECT id FROM archived_queue_entries WHERE {where}"),
+        params
+    ).scalar()
+    if isinstance(plan_json, str):
+        plan_json = json.loads(plan_json)
+    plan = plan_json[0]["Plan"]
+
+    partitions = []
+    if not status_filter and is_archive_partitioned(db):
+        aware_cutoff = cutoff if cutoff.tzinfo else cutoff.replace(tzinfo=timezone.utc)
+        partitions = [p for p in list_month_partitions(db) if p["to"] <= aware_cutoff]
+
+    estimated_rows = int(plan.get("Plan Rows", 0))
+    partition_rows_estimated = sum(p["estimated_rows"] for p in partitions)
+    row_deletes = max(estimated_rows - partition_rows_estimated, 0)
+
+    return {
+        "estimated_rows": estimated_rows,
+        "estimated_cost": plan.get("Total Cost"),
+        "scan": plan.get("Node Type"),
+        "partitions_to_remove": [p["name"] for p in partitions],
+        "partition_rows_estimated": partition_rows_estimated,
+        "row_deletes": row_deletes,
+        "estimated_chunks": -(-row_deletes // chunk_size),
+        "chunk_size": chunk_size
+    }
+
+def run_cleanup(db: Session, cutoff: datetime, status_filter: Optional[str] = None,
+                chunk_size: Optional[int] = None) -> dict:
+    """
+    Очистка архива ограниченными пачками
+
+    1. Месяцы целиком старше cutoff (без фильтра статуса) - DETACH/DROP партиций.
+    2. Остаток - DELETE по chunk_size строк, commit после каждой пачки, так что
+       блокировки держатся недолго. Построчная запись в sync_log на время
+       пачки выключена (SET LOCAL app.sync_suppress).
+    3. Одна полная сверка Google Sheets в конце вместо удаления строк по одной.
+    """
+    from app.services.google_sheets import google_sheets_service
+
+    chunk_size = chunk_size or settings.ARCHIVE_CLEANUP_CHUNK_SIZE
+    started = time.monotonic()
+
+    removed_partitions = []
+    if not status_filter:
+        removed_partitions = drop_partitions_before(db, cutoff)
+        for partition in removed_partitions:
+            forget_archive_period(db, partition["from"], partition["to"])
+        db.commit()
+    # Для партиций известна только оценка (pg_class.reltuples), не точное число
+    partition_rows_estimated = sum(p["estimated_rows"] for p in removed_partitions)
+
+    where, params = _cleanup_where(cutoff, status_filter)
+    delete_sql = text(CHUNK_DELETE_SQL.format(where=where))
+
+    deleted_rows = 0
+    chunks = 0
+    while True:
+        db.execute(text("SET LOCAL app.sync_suppress = 'on'"))
+        deleted = db.execute(delete_sql, {**params, "chunk_size": chunk_size}).rowcount
+        db.commit()
+
+        if deleted:
+            chunks += 1
+            deleted_rows += deleted
+            logger.info(f"🗑️ Очистка архива: пачка {chunks}, удалено {deleted} записей")
+        if deleted < chunk_size:
+            break
+
+    reconciled = None
+    if deleted_rows or removed_partitions:
+        result = google_sheets_service.sync_all_data(db)
+        reconciled = bool(result.get("success"))
+
+    elapsed = time.monotonic() - started
+
+    return {
+        "deleted_rows": deleted_rows,
+        "partition_rows_estimated": partition_rows_estimated,
+        "removed_partitions": [p["name"] for p in removed_partitions],
+        "retention_mode": settings.ARCHIVE_RETENTION_MODE if removed_partitions else None,
+        "chunks": chunks,
+        "chunk_size": chunk_size,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(deleted_rows / elapsed, 1) if elapsed > 0 else None,
+        "sheets_reconciled": reconciled
+    }
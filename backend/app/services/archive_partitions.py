@@ -0,0 +1,147 @@
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TABLE = "archived_queue_entries"
+DEFAULT_PARTITION = f"{ARCHIVE_TABLE}_default"
+
+def month_start(moment: datetime) -> datetime:
+    """Начало месяца (UTC) для указанного момента"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    moment = moment.astimezone(timezone.utc)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def add_months(moment: datetime, months: int) -> datetime:
+    """Сдвинуть начало месяца на указанное количество месяцев"""
+    month_index = moment.month - 1 + months
+    return moment.replace(year=moment.year + month_index // 12, month=month_index % 12 + 1)
+
+def partition_name(start: datetime) -> str:
+    """Имя партиции для месяца: archived_queue_entries_y2025m06"""
+    return f"{ARCHIVE_TABLE}_y{start.year}m{start.month:02d}"
+
+def parse_partition_month(name: str) -> Optional[datetime]:
+    """Обратное преобразование имени партиции в начало месяца"""
+    prefix = f"{ARCHIVE_TABLE}_y"
+    if not name.startswith(prefix):
+        return None
+    try:
+        year, month = name[len(prefix):].split("m")
+        return datetime(int(year), int(month), 1, tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+def is_archive_partitioned(db: Session) -> bool:
+    """Проверить, что архив уже переведен на партиционированную таблицу"""
+    return bool(db.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = :table
+    """), {"table": ARCHIVE_TABLE}).scalar())
+
+def create_month_partition(db: Session, start: datetime) -> str:
+    """Создать партицию на месяц, начинающийся в start (если ее еще нет)"""
+    name = partition_name(start)
+    end = add_months(start, 1)
+    db.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {name}
+        PARTITION OF {ARCHIVE_TABLE}
+        FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+    """))
+    return name
+
+def ensure_archive_partitions(db: Session, months_ahead: int = None) -> List[str]:
+    """
+    Подготовить партиции архива: текущий месяц, months_ahead месяцев вперед
+    и DEFAULT-партицию для записей с нестандартной датой архивирования
+    """
+    if months_ahead is None:
+        months_ahead = settings.ARCHIVE_PARTITION_MONTHS_AHEAD
+
+    try:
+        if not is_archive_partitioned(db):
+            logger.warning("⚠️ Архив не партиционирован. Запустите migrate_archive_partitions.py")
+            return []
+
+        current = month_start(datetime.now(timezone.utc))
+        created = [create_month_partition(db, add_months(current, i)) for i in range(months_ahead + 1)]
+
+        db.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION}
+            PARTITION OF {ARCHIVE_TABLE} DEFAULT
+        """))
+        db.commit()
+
+        logger.info(f"✅ Партиции архива готовы: {', '.join(created)}")
+        return created
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка подготовки партиций архива: {e}")
+        db.rollback()
+        return []
+
+def list_month_partitions(db: Session) -> List[dict]:
+    """Список помесячных партиций архива с оценкой количества строк"""
+    rows = db.execute(text("""
+        SELECT child.relname, child.reltuples::bigint
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = :table
+    """), {"table": ARCHIVE_TABLE}).fetchall()
+
+    partitions = []
+    for name, estimated_rows in rows:
+        start = parse_partition_month(name)
+        if start is None:
+            continue
+        partitions.append({
+            "name": name,
+            "from": start,
+            "to": add_months(start, 1),
+            "estimated_rows": max(estimated_rows, 0)
+        })
+    return sorted(partitions, key=lambda p: p["from"])
+
+def drop_partitions_before(db: Session, cutoff: datetime, mode: str = None) -> List[dict]:
+    """
+    Убрать из архива целые партиции, которые полностью старше cutoff
+
+    mode="detach" (по умолчанию) отсоединяет партицию и оставляет отдельной
+    таблицей (холодный слой, доступен для ручных выгрузок); mode="drop"
+    удаляет ее безвозвратно и включается только явно.
+    Строковые триггеры при этом не срабатывают - вызывающий код должен
+    сам согласовать Google Sheets и агрегаты.
+    """
+    if mode is None:
+        mode = settings.ARCHIVE_RETENTION_MODE
+    if mode not in ("detach", "drop"):
+        raise ValueError(f"Unknown archive retention mode: {mode}")
+
+    if cutoff.tzinfo is None:
+        cutoff = cutoff.replace(tzinfo=timezone.utc)
+
+    if not is_archive_partitioned(db):
+        return []
+
+    removed = []
+    for partition in list_month_partitions(db):
+        if partition["to"] > cutoff:
+            continue
+
+        db.execute(text(f"ALTER TABLE {ARCHIVE_TABLE} DETACH PARTITION {partition['name']}"))
+        if mode == "drop":
+            db.execute(text(f"DROP TABLE {partition['name']}"))
+
+        removed.append(partition)
+        logger.info(f"🗄️ Партиция {partition['name']} ({mode}), ~{partition['estimated_rows']} записей")
+
+    return removed
@@ -0,0 +1,179 @@
+import logging
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app.models.archive import ArchiveQueueStatus
+from app.models.archive_stats import ArchiveDailyStat
+
+logger = logging.getLogger(__name__)
+
+# Нормализация списка программ: уникальные значения по алфавиту, пустой список -> [""]
+_PROGRAMS_SQL = """
+    CASE WHEN jsonb_typeof({programs}) = 'array' AND jsonb_array_length({programs}) > 0
+         THEN {programs} ELSE '[""]'::jsonb END
+"""
+
+STATS_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION archive_stats_bump(
+    p_archived_at TIMESTAMPTZ,
+    p_status TEXT,
+    p_reason TEXT,
+    p_employee TEXT,
+    p_programs JSONB,
+    p_language TEXT,
+    p_delta INT
+) RETURNS void AS $$
+DECLARE
+    programs_list TEXT[];
+    program_code TEXT;
+BEGIN
+    programs_list := ARRAY(
+        SELECT DISTINCT value
+        FROM jsonb_array_elements_text({_PROGRAMS_SQL.format(programs='p_programs')}) AS value
+        ORDER BY value
+    );
+
+    FOREACH program_code IN ARRAY programs_list LOOP
+        INSERT INTO archive_daily_stats
+            (day, status, archive_reason, employee, program, form_language, entry_count, program_count)
+        VALUES (
+            (p_archived_at AT TIME ZONE 'UTC')::date,
+            p_status,
+            COALESCE(p_reason, ''),
+            COALESCE(p_employee, ''),
+            program_code,
+            COALESCE(p_language, ''),
+            CASE WHEN program_code = programs_list[1] THEN p_delta ELSE 0 END,
+            p_delta
+        )
+        ON CONFLICT (day, status, archive_reason, employee, program, form_language)
+        DO UPDATE SET
+            entry_count = archive_daily_stats.entry_count + EXCLUDED.entry_count,
+            program_count = archive_daily_stats.program_count + EXCLUDED.program_count;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION archive_stats_maintain()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND NEW.archived_at IS NOT DISTINCT FROM OLD.archived_at
+       AND NEW.status IS NOT DISTINCT FROM OLD.status
+       AND NEW.archive_reason IS NOT DISTINCT FROM OLD.archive_reason
+       AND NEW.assigned_employee_name IS NOT DISTINCT FROM OLD.assigned_employee_name
+       AND to_jsonb(NEW.programs) IS NOT DISTINCT FROM to_jsonb(OLD.programs)
+       AND NEW.form_language IS NOT DISTINCT FROM OLD.form_language THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM archive_stats_bump(OLD.archived_at, OLD.status::text, OLD.archive_reason,
+            OLD.assigned_employee_name, to_jsonb(OLD.programs), OLD.form_language, -1);
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'INSERT') THEN
+        PERFORM archive_stats_bump(NEW.archived_at, NEW.status::text, NEW.archive_reason,
+            NEW.assigned_employee_name, to_jsonb(NEW.programs), NEW.form_language, 1);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS archive_stats_trigger ON archived_queue_entries;
+CREATE TRIGGER archive_stats_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON archived_queue_entries
+    FOR EACH ROW
+    EXECUTE FUNCTION archive_stats_maintain();
+"""
+
+REBUILD_SQL = f"""
+INSERT INTO archive_daily_stats
+    (day, status, archive_reason, employee, program, form_language, entry_count, program_count)
+SELECT
+    (a.archived_at AT TIME ZONE 'UTC')::date,
+    a.status::text,
+    COALESCE(a.archive_reason, ''),
+    COALESCE(a.assigned_employee_name, ''),
+    p.program,
+    COALESCE(a.form_language, ''),
+    SUM(CASE WHEN p.is_first THEN 1 ELSE 0 END),
+    COUNT(*)
+FROM archived_queue_entries a
+CROSS JOIN LATERAL (
+    SELECT value AS program, value = MIN(value) OVER () AS is_first
+    FROM (
+        SELECT DISTINCT value
+        FROM jsonb_array_elements_text({_PROGRAMS_SQL.format(programs='to_jsonb(a.programs)')}) AS value
+    ) AS distinct_programs
+) AS p
+GROUP BY 1, 2, 3, 4, 5, 6
+"""
+
+def rebuild_archive_statistics(db: Session) -> int:
+    """Пересчитать агрегаты архива с нуля (первичное заполнение или сверка)"""
+    db.execute(text("LOCK TABLE archive_daily_stats IN EXCLUSIVE MODE"))
+    db.execute(text("DELETE FROM archive_daily_stats"))
+    rows = db.execute(text(REBUILD_SQL)).rowcount
+    db.commit()
+    logger.info(f"📊 Агрегаты архива пересчитаны: {rows} строк")
+    return rows
+
+def setup_archive_statistics(db: Session):
+    """Создать триггер агрегатов и заполнить их, если архив уже не пуст"""
+    try:
+        db.execute(text(STATS_TRIGGER_SQL))
+        db.commit()
+
+        has_stats = db.execute(text("SELECT 1 FROM archive_daily_stats LIMIT 1")).scalar()
+        has_archive = db.execute(text("SELECT 1 FROM archived_queue_entries LIMIT 1")).scalar()
+        if has_archive and not has_stats:
+            rebuild_archive_statistics(db)
+
+        logger.info("✅ Триггер агрегатов архива настроен")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка настройки агрегатов архива: {e}")
+        db.rollback()
+
+def forget_archive_period(db: Session, start: datetime, end: datetime):
+    """Убрать агрегаты за период (после удаления партиций, минуя строковые триггеры)"""
+    db.query(ArchiveDailyStat).filter(
+        ArchiveDailyStat.day >= start.date(),
+        ArchiveDailyStat.day < end.date()
+    ).delete(synchronize_session=False)
+
+def _status_value(status_name: str) -> str:
+    """В базе Enum хранится по имени (WAITING) - наружу отдаем значение (waiting)"""
+    try:
+        return ArchiveQueueStatus[status_name].value
+    except KeyError:
+        return status_name.lower()
+
+def read_archive_statistics(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None) -> dict:
+    """Сводка по архиву из агрегатов (размер не зависит от объема архива)"""
+    def grouped(column, measure=ArchiveDailyStat.entry_count):
+        query = db.query(column, func.sum(measure))
+        if date_from:
+            query = query.filter(ArchiveDailyStat.day >= date_from)
+        if date_to:
+            query = query.filter(ArchiveDailyStat.day <= date_to)
+        return [(key, int(total)) for key, total in query.group_by(column).all() if total]
+
+    by_status = {_status_value(status): total for status, total in grouped(ArchiveDailyStat.status)}
+
+    return {
+        "total_archived": sum(by_status.values()),
+        "by_reason": {reason or None: total for reason, total in grouped(ArchiveDailyStat.archive_reason)},
+        "by_status": by_status,
+        "by_employee": {employee or None: total for employee, total in grouped(ArchiveDailyStat.employee)},
+        "by_program": {
+            program or None: total
+            for program, total in grouped(ArchiveDailyStat.program, ArchiveDailyStat.program_count)
+        },
+        "by_language": {language or None: total for language, total in grouped(ArchiveDailyStat.form_language)},
+    }
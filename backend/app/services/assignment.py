@@ -0,0 +1,197 @@
+import logging
+import re
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.queue import QueueEntry, QueueStatus
+from app.models.user import User, EmployeeStatus
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class DeskState:
+    """Состояние стола на момент выбора: очередь, занятость, темп работы"""
+    employee_name: str
+    employee_id: Optional[str] = None
+    desk: Optional[str] = None
+    desk_number: int = 9999  # Сотрудники без стола - в конце
+    status: str = EmployeeStatus.AVAILABLE.value
+    waiting: int = 0
+    avg_service_seconds: float = 0.0
+    languages: Optional[List[str]] = None
+    programs: Optional[List[str]] = None
+
+    @property
+    def busy(self) -> bool:
+        return self.status == EmployeeStatus.BUSY.value
+
+    def expected_wait(self) -> float:
+        """Ожидание нового абитуриента: очередь стола плюс текущий прием"""
+        return (self.waiting + (1 if self.busy else 0)) * self.avg_service_seconds
+
+    def accepts(self, applicant: "ApplicantProfile") -> bool:
+        if self.languages and (applicant.form_language or "ru") not in self.languages:
+            return False
+        if self.programs and not set(self.programs) & set(applicant.programs):
+            return False
+        return True
+
+@dataclass
+class ApplicantProfile:
+    programs: List[str] = field(default_factory=list)
+    form_language: Optional[str] = None
+    sequence: int = 0  # Порядковый номер заявки (для ротации по кругу)
+
+def desk_number(desk: Optional[str]) -> int:
+    """Номер стола как число (первое число в строке)"""
+    numbers = re.findall(r'\d+', str(desk or ""))
+    return int(numbers[0]) if numbers else 9999
+
+class ServiceTimeTracker:
+    """
+    Скользящее среднее времени приема по сотрудникам (в памяти процесса, по id)
+
+    Обновляется при завершении приема; пока данных нет - значение по
+    умолчанию ASSIGNMENT_DEFAULT_SERVICE_SECONDS.
+    """
+
+    def __init__(self, alpha: float, default_seconds: float):
+        self.alpha = alpha
+        self.default_seconds = default_seconds
+        self._averages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, employee_id: Optional[str], seconds: Optional[int]):
+        if not employee_id or not seconds or seconds <= 0:
+            return
+        with self._lock:
+            previous = self._averages.get(employee_id)
+            if previous is None:
+                self._averages[employee_id] = float(seconds)
+            else:
+                self._averages[employee_id] = self.alpha * seconds + (1 - self.alpha) * previous
+
+    def get(self, employee_id: str) -> float:
+        with self._lock:
+            return self._averages.get(employee_id, self.default_seconds)
+
+# Глобальная статистика времени приема
+service_times = ServiceTimeTracker(
+    alpha=settings.ASSIGNMENT_SERVICE_TIME_ALPHA,
+    default_seconds=settings.ASSIGNMENT_DEFAULT_SERVICE_SECONDS
+)
+
+class AssignmentStrategy(ABC):
+    """Политика выбора стола для новой заявки"""
+
+    name = "base"
+
+    @abstractmethod
+    def select(self, applicant: ApplicantProfile, desks: List[DeskState]) -> Optional[DeskState]:
+        """Стол для заявки среди desks (None - столов нет)"""
+
+class RoundRobinStrategy(AssignmentStrategy):
+    """По кругу в порядке номеров столов (прежняя логика)"""
+
+    name = "round_robin"
+
+    def select(self, applicant, desks):
+        if not desks:
+            return None
+        ordered = sorted(desks, key=lambda d: d.desk_number)
+        return ordered[applicant.sequence % len(ordered)]
+
+class LeastLoadedStrategy(AssignmentStrategy):
+    """Стол с наименьшей очередью (при равенстве - свободный, затем меньший номер)"""
+
+    name = "least_loaded"
+
+    def select(self, applicant, desks):
+        if not desks:
+            return None
+        return min(desks, key=lambda d: (d.waiting, d.busy, d.desk_number))
+
+class ShortestExpectedWaitStrategy(AssignmentStrategy):
+    """Стол с наименьшим ожидаемым временем ожидания (очередь × темп приема)"""
+
+    name = "shortest_wait"
+
+    def select(self, applicant, desks):
+        if not desks:
+            return None
+        return min(desks, key=lambda d: (d.expected_wait(), d.desk_number))
+
+class AffinityStrategy(AssignmentStrategy):
+    """
+    Сначала столы, подходящие по языку и программам, среди них -
+    выбор базовой стратегией; если подходящих нет - среди всех
+    """
+
+    name = "affinity"
+
+    def __init__(self, fallback: Optional[AssignmentStrategy] = None):
+        self.fallback = fallback or ShortestExpectedWaitStrategy()
+
+    def select(self, applicant, desks):
+        matching = [d for d in desks if d.accepts(applicant)]
+        return self.fallback.select(applicant, matching or desks)
+
+_STRATEGIES: Dict[str, Callable[[], AssignmentStrategy]] = {
+    RoundRobinStrategy.name: RoundRobinStrategy,
+    LeastLoadedStrategy.name: LeastLoadedStrategy,
+    ShortestExpectedWaitStrategy.name: ShortestExpectedWaitStrategy,
+    AffinityStrategy.name: AffinityStrategy,
+}
+
+def register_strategy(name: str, factory: Callable[[], AssignmentStrategy]):
+    """Подключить свою политику распределения"""
+    _STRATEGIES[name] = factory
+
+def available_strategies() -> List[str]:
+    return sorted(_STRATEGIES)
+
+def get_strategy(name: Optional[str] = None) -> AssignmentStrategy:
+    name = name or settings.ASSIGNMENT_STRATEGY
+    if name not in _STRATEGIES:
+        raise ValueError(f"Unknown assignment strategy: {name}")
+    return _STRATEGIES[name]()
+
+def load_desk_states(db: Session) -> List[DeskState]:
+    """
+    Столы, участвующие в распределении (available и busy, без paused/offline),
+    с текущей очередью - двумя запросами на все столы
+    """
+    employees = db.query(User).filter(
+        User.role == "admission",
+        User.status.in_([EmployeeStatus.AVAILABLE.value, EmployeeStatus.BUSY.value])
+    ).all()
+    if not employees:
+        return []
+
+    backlog = dict(db.query(
+        QueueEntry.assigned_employee_id, func.count()
+    ).filter(
+        QueueEntry.status == QueueStatus.WAITING,
+        QueueEntry.assigned_employee_id.in_([e.id for e in employees])
+    ).group_by(QueueEntry.assigned_employee_id).all())
+
+    return [
+        DeskState(
+            employee_name=employee.full_name,
+            employee_id=employee.id,
+            desk=employee.desk,
+            desk_number=desk_number(employee.desk),
+            status=employee.status,
+            waiting=backlog.get(employee.id, 0),
+            avg_service_seconds=service_times.get(employee.id),
+            languages=employee.languages,
+            programs=employee.programs
+        )
+        for employee in employees
+    ]
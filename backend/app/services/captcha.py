@@ -1,48 +1,184 @@
 # app/services/captcha.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
 import httpx
 from app.config import settings
 
-async def verify_captcha_v3(token: str, remote_ip: str, action: str = "submit") -> dict:
-    """Verify reCAPTCHA v3 token and return score"""
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://www.google.com/recaptcha/api/siteverify",
+logger = logging.getLogger(__name__)
+
+RECAPTCHA_VERIFY_URL = "https://www.google.com/recaptcha/api/siteverify"
+
+class CaptchaVerifier:
+    """
+    Проверка reCAPTCHA v3 через общий HTTP-клиент
+
+    - один пул соединений на процесс и жесткие таймауты;
+    - кэш отказов по токену: отклоненный токен повторно в Google не идет;
+      успех одноразовый и кэшируется только под ключ идемпотентности
+      отправки - иначе один решенный токен пропускал бы любое число заявок;
+    - circuit breaker: после серии сбоев Google временно не вызываем, а
+      решение принимаем по политике RECAPTCHA_FAIL_OPEN.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.Client] = None
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+
+    def _get_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    timeout=httpx.Timeout(
+                        settings.RECAPTCHA_TIMEOUT_SECONDS,
+                        connect=settings.RECAPTCHA_CONNECT_TIMEOUT_SECONDS
+                    ),
+                    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+                )
+            return self._client
+
+    def _cached(self, key: tuple) -> Optional[dict]:
+        with self._lock:
+            cached = self._cache.get(key)
+            if not cached:
+                return None
+            expires_at, result = cached
+            if expires_at < time.monotonic():
+                del self._cache[key]
+                return None
+            if result["is_human"]:
+                # Успех одноразовый: забираем при первом же чтении
+                del self._cache[key]
+            else:
+                self._cache.move_to_end(key)
+            return result
+
+    def _remember(self, key: tuple, result: dict):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + settings.RECAPTCHA_CACHE_TTL_SECONDS, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > settings.RECAPTCHA_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _breaker_open(self) -> bool:
+        with self._lock:
+            return self._open_until > time.monotonic()
+
+    def _record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._open_until = 0.0
+
+    def _record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= settings.RECAPTCHA_BREAKER_THRESHOLD:
+                self._open_until = time.monotonic() + settings.RECAPTCHA_BREAKER_RESET_SECONDS
+                logger.warning(
+                    f"⚠️ reCAPTCHA недоступна ({self._failures} сбоев подряд), "
+                    f"проверки приостановлены на {settings.RECAPTCHA_BREAKER_RESET_SECONDS} сек"
+                )
+
+    def _unavailable(self, reason: str) -> dict:
+        """Google не ответил: решение по политике fail-open/fail-closed"""
+        allowed = settings.RECAPTCHA_FAIL_OPEN
+        return {
+            "success": False,
+            "score": 0.0,
+            "action_match": False,
+            "is_human": allowed,
+            "error_codes": [reason],
+            "source": "fail_open" if allowed else "fail_closed"
+        }
+
+    def verify(self, token: Optional[str], remote_ip: str, action: Optional[str] = None,
+               submission_key: Optional[str] = None) -> dict:
+        """
+        Verify reCAPTCHA v3 token and return score
+
+        submission_key - ключ идемпотентности отправки: успешный вердикт
+        запоминается только для повтора той же отправки и только один раз.
+        """
+        action = action or settings.RECAPTCHA_ACTION
+
+        if not token:
+            return {
+                "success": False,
+                "score": 0.0,
+                "action_match": False,
+                "is_human": False,
+                "error_codes": ["missing-input-response"],
+                "source": "local"
+            }
+
+        cached = self._cached((token, None))
+        if cached is None and submission_key:
+            cached = self._cached((token, submission_key))
+        if cached is not None:
+            return {**cached, "source": "cache"}
+
+        if self._breaker_open():
+            return self._unavailable("circuit_open")
+
+        try:
+            response = self._get_client().post(
+                RECAPTCHA_VERIFY_URL,
                 data={
                     "secret": settings.RECAPTCHA_SECRET_KEY,
                     "response": token,
                     "remoteip": remote_ip
                 }
             )
-        
-        result = response.json()
-        
+            response.raise_for_status()
+            result = response.json()
+        except Exception as e:
+            logger.error(f"❌ reCAPTCHA v3 verification error: {e}")
+            self._record_failure()
+            return self._unavailable("network_error")
+
+        self._record_success()
+
         # v3 возвращает score от 0 до 1 (1 = человек, 0 = бот)
         # Также проверяем action для дополнительной безопасности
         success = result.get("success", False)
         score = result.get("score", 0.0)
         action_match = result.get("action", "") == action
-        
-        return {
+
+        verdict = {
             "success": success,
             "score": score,
             "action_match": action_match,
-            "is_human": success and score >= 0.5 and action_match,  # Порог 0.5
-            "error_codes": result.get("error-codes", [])
-        }
-        
-    except Exception as e:
-        print(f"reCAPTCHA v3 verification error: {e}")
-        return {
-            "success": False,
-            "score": 0.0,
-            "action_match": False,
-            "is_human": False,
-            "error_codes": ["network_error"]
+            "is_human": success and score >= settings.RECAPTCHA_MIN_SCORE and action_match,
+            "error_codes": result.get("error-codes", []),
+            "source": "google"
         }
+        if not verdict["is_human"]:
+            self._remember((token, None), verdict)
+        elif submission_key:
+            self._remember((token, submission_key), verdict)
+        return verdict
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+# Глобальный верификатор (общий пул соединений)
+captcha_verifier = CaptchaVerifier()
+
+def verify_captcha_v3(token: str, remote_ip: str, action: Optional[str] = None,
+                     submission_key: Optional[str] = None) -> dict:
+    """Verify reCAPTCHA v3 token and return score"""
+    return captcha_verifier.verify(token, remote_ip, action, submission_key)
 
 # Основная функция для проверки (используется в роутах)
-async def verify_captcha(token: str, remote_ip: str) -> bool:
+def verify_captcha(token: str, remote_ip: str, submission_key: Optional[str] = None) -> bool:
     """Main function for v3 verification - returns boolean"""
-    result = await verify_captcha_v3(token, remote_ip, "submit")
-    return result["is_human"]
\ No newline at end of file
+    return verify_captcha_v3(token, remote_ip, submission_key=submission_key)["is_human"]
@@ -0,0 +1,160 @@
+import csv
+import io
+import itertools
+import logging
+import tempfile
+from typing import Any, Callable, IO, Iterable, Iterator, List, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 1000        # Строк за один fetch серверного курсора
+WIDTH_SAMPLE_SIZE = 200         # По скольким первым строкам оцениваем ширину колонок
+MAX_COLUMN_WIDTH = 50
+STREAM_CHUNK_SIZE = 64 * 1024
+CSV_ROWS_PER_CHUNK = 500
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+
+Column = Tuple[str, Callable[[Any], Any]]
+
+def _format_datetime(value) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else "-"
+
+def _format_programs(programs) -> str:
+    return ", ".join(programs) if isinstance(programs, list) else programs
+
+def _status_value(status) -> str:
+    return status.value if hasattr(status, "value") else status
+
+# Колонки выгрузки живой очереди (как и раньше в /admin/queue/export)
+QUEUE_EXPORT_COLUMNS: List[Column] = [
+    ("ФИО", lambda entry: entry.full_name),
+    ("Программы", lambda entry: _format_programs(entry.programs)),
+    ("Номер", lambda entry: entry.queue_number),
+    ("Сотрудник", lambda entry: entry.assigned_employee_name or "-"),
+    ("Дата создания", lambda entry: _format_datetime(entry.created_at)),
+    ("Статус", lambda entry: _status_value(entry.status)),
+    ("Время обработки (сек)", lambda entry: entry.processing_time or "-"),
+]
+
+# Колонки выгрузки архива (фоновые задачи /admin/archive/export-jobs)
+ARCHIVE_EXPORT_COLUMNS: List[Column] = [
+    ("ФИО", lambda entry: entry.full_name),
+    ("Телефон", lambda entry: entry.phone),
+    ("Программы", lambda entry: _format_programs(entry.programs)),
+    ("Номер", lambda entry: entry.queue_number),
+    ("Сотрудник", lambda entry: entry.assigned_employee_name or "-"),
+    ("Статус", lambda entry: _status_value(entry.status)),
+    ("Язык формы", lambda entry: entry.form_language or "-"),
+    ("Дата создания", lambda entry: _format_datetime(entry.created_at)),
+    ("Дата завершения", lambda entry: _format_datetime(entry.completed_at)),
+    ("Время обработки (сек)", lambda entry: entry.processing_time or "-"),
+    ("Дата архивирования", lambda entry: _format_datetime(entry.archived_at)),
+    ("Причина архивирования", lambda entry: entry.archive_reason or "-"),
+]
+
+def stream_query(query, batch_size: int = EXPORT_BATCH_SIZE) -> Iterable:
+    """Читать результат через серверный курсор пачками, не загружая все строки в память"""
+    return query.yield_per(batch_size)
+
+def _rows(columns: List[Column], entries: Iterable) -> Iterator[list]:
+    for entry in entries:
+        yield [getter(entry) for _, getter in columns]
+
+def _sample_widths(columns: List[Column], rows: Iterator[list]) -> Tuple[List[int], Iterator[list]]:
+    """Оценить ширину колонок по первым строкам и вернуть итератор, который их не потерял"""
+    sample = list(itertools.islice(rows, WIDTH_SAMPLE_SIZE))
+    widths = [len(header) for header, _ in columns]
+    for row in sample:
+        for i, value in enumerate(row):
+            widths[i] = max(widths[i], len(str(value)) if value is not None else 0)
+    widths = [min(width + 2, MAX_COLUMN_WIDTH) for width in widths]
+    return widths, itertools.chain(sample, rows)
+
+def write_xlsx(columns: List[Column], entries: Iterable, target: IO[bytes], sheet_title: str = "Queue Data") -> int:
+    """Записать XLSX в файловый объект в write-only режиме (память не зависит от числа строк)"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title)
+
+    widths, rows = _sample_widths(columns, _rows(columns, entries))
+    for index, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    header_cells = []
+    for header, _ in columns:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        cell.alignment = Alignment(horizontal="center")
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    written = 0
+    for row in rows:
+        ws.append(row)
+        written += 1
+
+    wb.save(target)
+    return written
+
+def write_csv(columns: List[Column], entries: Iterable, target: IO[bytes]) -> int:
+    """Записать CSV (UTF-8 с BOM, чтобы Excel корректно открыл кириллицу)"""
+    written = 0
+
+    def counted():
+        nonlocal written
+        for entry in entries:
+            written += 1
+            yield entry
+
+    for chunk in csv_chunks(columns, counted()):
+        target.write(chunk)
+    return written
+
+def csv_chunks(columns: List[Column], entries: Iterable) -> Iterator[bytes]:
+    """Генератор CSV: первые байты уходят клиенту сразу, строки - пачками"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    buffer.write("\ufeff")
+    writer.writerow([header for header, _ in columns])
+
+    for i, row in enumerate(_rows(columns, entries), 1):
+        writer.writerow(row)
+        if i % CSV_ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode("utf-8")
+
+def file_chunks(file: IO[bytes], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Отдать файл кусками и закрыть его по окончании"""
+    try:
+        file.seek(0)
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+def xlsx_chunks(columns: List[Column], entries: Iterable, sheet_title: str = "Queue Data") -> Iterator[bytes]:
+    """
+    Генератор XLSX для StreamingResponse
+
+    XLSX - это zip, поэтому файл собирается целиком во временный файл
+    (с диска, а не из памяти) и затем отдается кусками. Сборка происходит
+    внутри генератора: заголовки ответа уходят клиенту сразу.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=STREAM_CHUNK_SIZE * 16)
+    written = write_xlsx(columns, entries, spool, sheet_title)
+    logger.info(f"📤 XLSX выгрузка собрана: {written} строк")
+    yield from file_chunks(spool)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.archive import ArchivedQueueEntry
+from app.schemas.export import ExportFilters, ExportJobResponse
+from app.services.archive import build_archive_query
+from app.services.export import (
+    ARCHIVE_EXPORT_COLUMNS,
+    stream_query,
+    write_csv,
+    write_xlsx,
+)
+
+logger = logging.getLogger(__name__)
+
+def filters_hash(filters: ExportFilters) -> str:
+    """Стабильный ключ выгрузки: одинаковые фильтры -> одна и та же задача и файл"""
+    payload = json.dumps(filters.model_dump(mode="json"), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+@dataclass
+class ExportJob:
+    job_id: str
+    filters: ExportFilters
+    path: str
+    status: str = "pending"
+    total_rows: Optional[int] = None
+    processed_rows: int = 0
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+
+    def is_expired(self) -> bool:
+        """Готовые и упавшие задачи живут EXPORT_CACHE_TTL_SECONDS (упавшие - чтобы была видна ошибка)"""
+        if self.status not in ("done", "failed") or self.finished_at is None:
+            return False
+        age = (datetime.now() - self.finished_at).total_seconds()
+        if age > settings.EXPORT_CACHE_TTL_SECONDS:
+            return True
+        return self.status == "done" and not os.path.exists(self.path)
+
+    def to_response(self) -> ExportJobResponse:
+        progress = 0.0
+        if self.status == "done":
+            progress = 1.0
+        elif self.total_rows:
+            progress = min(self.processed_rows / self.total_rows, 1.0)
+
+        return ExportJobResponse(
+            job_id=self.job_id,
+            status=self.status,
+            filters=self.filters,
+            total_rows=self.total_rows,
+            processed_rows=self.processed_rows,
+            progress=round(progress, 3),
+            error=self.error,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+            download_url=f"/api/admin/archive/export-jobs/{self.job_id}/download" if self.status == "done" else None
+        )
+
+class ExportJobManager:
+    """
+    Фоновые выгрузки архива
+
+    Задачи выполняются в отдельном пуле потоков, а не в воркере запроса.
+    Идентификатор задачи - хэш фильтров: повторный запрос с теми же фильтрами
+    возвращает уже идущую задачу или готовый файл, пока он не устарел.
+    """
+
+    def __init__(self, export_dir: str = settings.EXPORT_DIR, max_workers: int = settings.EXPORT_JOB_WORKERS):
+        self.export_dir = export_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export-job")
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+
+    def _artifact_path(self, job_id: str, file_format: str) -> str:
+        return os.path.join(self.export_dir, f"archive_{job_id}.{file_format}")
+
+    def submit(self, filters: ExportFilters) -> ExportJob:
+        """Поставить выгрузку в очередь или вернуть существующую по тем же фильтрам"""
+        job_id = filters_hash(filters)
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job.status in ("pending", "running"):
+                return job
+            if job and job.status == "done" and not job.is_expired():
+                return job
+
+            job = ExportJob(job_id=job_id, filters=filters, path=self._artifact_path(job_id, filters.format))
+            self._jobs[job_id] = job
+
+        self._executor.submit(self._run, job)
+        logger.info(f"📦 Выгрузка архива {job_id} поставлена в очередь")
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: ExportJob):
+        db = SessionLocal()
+        started = time.monotonic()
+        temp_path = f"{job.path}.part"
+        try:
+            job.status = "running"
+            filters = job.filters
+            query = build_archive_query(
+                db,
+                date_from=filters.date_from,
+                date_to=filters.date_to,
+                employee=filters.employee,
+                program=filters.program,
+                status=filters.status
+            )
+            job.total_rows = query.count()
+
+            def progress(entries):
+                for entry in entries:
+                    job.processed_rows += 1
+                    yield entry
+
+            os.makedirs(self.export_dir, exist_ok=True)
+            entries = progress(stream_query(query.order_by(ArchivedQueueEntry.archived_at)))
+
+            with open(temp_path, "wb") as target:
+                if job.filters.format == "csv":
+                    write_csv(ARCHIVE_EXPORT_COLUMNS, entries, target)
+                else:
+                    write_xlsx(ARCHIVE_EXPORT_COLUMNS, entries, target, sheet_title="Archive")
+
+            # Файл появляется под итоговым именем только целиком
+            os.replace(temp_path, job.path)
+
+            job.status = "done"
+            job.finished_at = datetime.now()
+            logger.info(
+                f"✅ Выгрузка архива {job.job_id}: {job.processed_rows} строк "
+                f"за {time.monotonic() - started:.1f} сек"
+            )
+
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            job.finished_at = datetime.now()
+            logger.error(f"❌ Ошибка выгрузки архива {job.job_id}: {e}")
+            # Недописанный файл не оставляем в каталоге выгрузок
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        finally:
+            db.close()
+
+    def prune_expired(self) -> int:
+        """Удалить устаревшие файлы выгрузок и забыть их задачи"""
+        removed = 0
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job.is_expired():
+                    if os.path.exists(job.path):
+                        os.remove(job.path)
+                    del self._jobs[job_id]
+                    removed += 1
+        return removed
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# Глобальный менеджер выгрузок
+export_jobs = ExportJobManager()
@@ -1,7 +1,10 @@
 import json
 import logging
 import os
-from typing import List, Dict, Any
+import re
+import threading
+import time
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
@@ -15,6 +18,7 @@ logger = logging.getLogger(__name__)
 
 GOOGLE_SHEETS_ID = "1kh8mEKZHSo3vZAK7Z6FoH12Y03WJXhnJx5xA4AoMTP8"
 SHEET_NAME = "Queue Data" 
+SHEET_ROW_INDEX_TTL_SECONDS = 600  # Как долго доверяем кэшу "ID -> номер строки"
 
 STATUS_TRANSLATIONS = {
     "waiting": "Ожидание",
@@ -30,11 +34,30 @@ def translate_status(status_value: str) -> str:
         return ""
     return STATUS_TRANSLATIONS.get(status_value.lower(), status_value)
 
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Стоит ли повторять: сеть, квоты, 5xx и доступ (401/403/404 - проблема
+    настройки, а не строки) - да; отказ по содержимому строки (400/413/422)
+    и ошибки данных - нет, повтор той же строки снова упадет
+    """
+    if isinstance(error, HttpError):
+        try:
+            status = int(getattr(error.resp, "status", 0))
+        except (TypeError, ValueError):
+            return True
+        return status not in (400, 413, 422)
+    return not isinstance(error, (ValueError, TypeError, KeyError, AttributeError))
+
 class GoogleSheetsService:
     def __init__(self):
         self.credentials = None
         self.service = None
         self.spreadsheet_id = GOOGLE_SHEETS_ID
+        self.sheet_name = SHEET_NAME
+        # Кэш позиций строк: позволяет обновлять строку без скачивания колонки A
+        self._row_index: Optional[Dict[str, int]] = None
+        self._row_index_loaded_at = 0.0
+        self._lock = threading.RLock()
         self._initialize()
     
     def _initialize(self):
@@ -191,23 +214,114 @@ class GoogleSheetsService:
             entry.archive_reason or ""
         ]
     
-    def _find_row_by_id(self, entry_id: str) -> int:
-        """🆕 Найти строку по ID записи"""
-        try:
-            search_range = f'{SHEET_NAME}!A:A'  # Поиск в колонке A (ID)
+    def _invalidate_row_index(self):
+        """Сбросить кэш позиций строк (после ошибок или внешних правок)"""
+        with self._lock:
+            self._row_index = None
+    
+    def _cached_row_index(self) -> Optional[Dict[str, int]]:
+        """Карта из кэша, если она еще не устарела"""
+        with self._lock:
+            is_fresh = time.monotonic() - self._row_index_loaded_at < SHEET_ROW_INDEX_TTL_SECONDS
+            return self._row_index if is_fresh else None
+    
+    def _get_row_index(self) -> Dict[str, int]:
+        """Карта "ID записи -> номер строки", одна выгрузка колонки A на TTL"""
+        with self._lock:
+            cached = self._cached_row_index()
+            if cached is not None:
+                return cached
+            
             search_result = self.service.spreadsheets().values().get(
                 spreadsheetId=self.spreadsheet_id,
-                range=search_range
+                range=f'{SHEET_NAME}!A:A'  # Колонка A (ID)
             ).execute()
             
-            values = search_result.get('values', [])
-            
-            # Ищем строку с нужным ID
-            for i, row in enumerate(values):
-                if row and len(row) > 0 and row[0] == str(entry_id):
-                    return i + 1  # +1 потому что нумерация начинается с 1
+            row_index = {}
+            for i, row in enumerate(search_result.get('values', [])):
+                if row and len(row) > 0:
+                    row_index[row[0]] = i + 1  # +1 потому что нумерация начинается с 1
             
-            return None
+            self._row_index = row_index
+            self._row_index_loaded_at = time.monotonic()
+            return row_index
+    
+    def _rows_match(self, expected: Dict[int, str]) -> bool:
+        """Проверить одним batchGet, что в колонке A строк по-прежнему ожидаемые ID"""
+        rows = sorted(expected)
+        result = self.service.spreadsheets().values().batchGet(
+            spreadsheetId=self.spreadsheet_id,
+            ranges=[f'{SHEET_NAME}!A{row}' for row in rows]
+        ).execute()
+        value_ranges = result.get('valueRanges', [])
+        if len(value_ranges) != len(rows):
+            return False
+        for row, value_range in zip(rows, value_ranges):
+            values = value_range.get('values') or [[]]
+            cell = values[0][0] if values[0] else ""
+            if str(cell) != expected[row]:
+                return False
+        return True
+    
+    def _verified_row_index(self, entry_ids: List[str]) -> tuple:
+        """
+        Карта строк, которой можно доверить запись по entry_ids
+        
+        Кэш мог разойтись с таблицей (ручная сортировка, вставка или удаление
+        строк), а запись A{row}:P{row} вслепую затерла бы чужую строку. Поэтому
+        целевые строки из кэша сверяются с колонкой A, а при расхождении карта
+        перечитывается. Возвращает (карта, число вызовов API).
+        """
+        with self._lock:
+            api_calls = 0
+            cached = self._cached_row_index()
+            if cached is not None:
+                expected = {cached[str(i)]: str(i) for i in entry_ids if str(i) in cached}
+                if not expected:
+                    return cached, api_calls
+                api_calls += 1
+                if self._rows_match(expected):
+                    return cached, api_calls
+                logger.warning("⚠️ Строки Google Sheets сдвинулись вручную, перечитываем колонку A")
+                self._invalidate_row_index()
+            
+            row_index = self._get_row_index()
+            return row_index, api_calls + 1
+    
+    def _remember_rows(self, entry_ids: List[str], first_row: int):
+        """Запомнить позиции строк, записанных подряд начиная с first_row"""
+        with self._lock:
+            if self._row_index is None:
+                return
+            for offset, entry_id in enumerate(entry_ids):
+                self._row_index[str(entry_id)] = first_row + offset
+    
+    def _forget_rows(self, deleted_rows: List[int]):
+        """Убрать удаленные строки из кэша и сдвинуть номера строк ниже них"""
+        with self._lock:
+            if self._row_index is None or not deleted_rows:
+                return
+            deleted = sorted(deleted_rows)
+            deleted_set = set(deleted)
+            updated_index = {}
+            for entry_id, row in self._row_index.items():
+                if row in deleted_set:
+                    continue
+                shift = sum(1 for deleted_row in deleted if deleted_row < row)
+                updated_index[entry_id] = row - shift
+            self._row_index = updated_index
+    
+    @staticmethod
+    def _first_row_of_range(updated_range: str) -> Optional[int]:
+        """Извлечь номер первой строки из диапазона вида 'Queue Data'!A120:P121"""
+        match = re.search(r'![A-Z]+(\d+)', updated_range or "")
+        return int(match.group(1)) if match else None
+    
+    def _find_row_by_id(self, entry_id: str) -> int:
+        """🆕 Найти строку по ID записи"""
+        try:
+            row_index, _ = self._verified_row_index([entry_id])
+            return row_index.get(str(entry_id))
             
         except Exception as e:
             logger.error(f"❌ Ошибка поиска строки по ID {entry_id}: {e}")
@@ -249,6 +363,11 @@ class GoogleSheetsService:
             
             result = update_request.execute()
             
+            # Строка 1 - заголовки, записи идут со второй строки в порядке выгрузки
+            with self._lock:
+                self._row_index = {str(entry.id): i + 2 for i, entry in enumerate(entries)}
+                self._row_index_loaded_at = time.monotonic()
+            
             logger.info(f"✅ Полная синхронизация: {len(entries)} записей в Google Sheets")
             
             return {
@@ -260,6 +379,7 @@ class GoogleSheetsService:
             }
             
         except HttpError as e:
+            self._invalidate_row_index()
             logger.error(f"❌ HTTP ошибка Google Sheets API: {e}")
             if "Invalid JWT Signature" in str(e):
                 logger.error("💡 Попробуйте пересоздать credentials.json или проверить настройки сервисного аккаунта")
@@ -288,6 +408,12 @@ class GoogleSheetsService:
             
             result = append_request.execute()
             
+            first_row = self._first_row_of_range(result.get('updates', {}).get('updatedRange'))
+            if first_row:
+                self._remember_rows([entry.id], first_row)
+            else:
+                self._invalidate_row_index()
+            
             logger.info(f"✅ Добавлена запись {entry.id} в Google Sheets")
             
             return {
@@ -379,6 +505,7 @@ class GoogleSheetsService:
             )
             
             result = delete_request.execute()
+            self._forget_rows([row_index])
             
             logger.info(f"🗑️ Удалена запись {entry_id} из Google Sheets (строка {row_index})")
             
@@ -395,9 +522,116 @@ class GoogleSheetsService:
                 logger.error("💡 Проблема с аутентификацией. Проверьте credentials.json")
             return {"success": False, "error": str(e)}
 
+    def apply_changes(self, upserts: List[ArchivedQueueEntry], delete_ids: List[str]) -> Dict[str, Any]:
+        """
+        Применить пачку уже схлопнутых изменений минимальным числом вызовов API
+        
+        - обновления известных строк: один values.batchUpdate
+        - новые записи: один values.append
+        - удаления: один batchUpdate с deleteDimension (снизу вверх)
+        
+        Применяется текущее состояние записи, а не дельта, поэтому повторное
+        применение той же пачки безопасно.
+        """
+        if not self._is_available():
+            return {"success": False, "error": "Google Sheets API недоступен"}
+        
+        api_calls = 0
+        
+        try:
+            with self._lock:
+                row_index, api_calls = self._verified_row_index(
+                    [entry.id for entry in upserts] + list(delete_ids)
+                )
+                
+                updates = []
+                appends = []
+                for entry in upserts:
+                    row = row_index.get(str(entry.id))
+                    if row is None:
+                        appends.append(entry)
+                    else:
+                        updates.append({
+                            'range': f'{SHEET_NAME}!A{row}:P{row}',
+                            'values': [self.prepare_row_data(entry)]
+                        })
+                
+                if updates:
+                    self.service.spreadsheets().values().batchUpdate(
+                        spreadsheetId=self.spreadsheet_id,
+                        body={'valueInputOption': 'RAW', 'data': updates}
+                    ).execute()
+                    api_calls += 1
+                
+                if appends:
+                    result = self.service.spreadsheets().values().append(
+                        spreadsheetId=self.spreadsheet_id,
+                        range=SHEET_NAME,
+                        valueInputOption='RAW',
+                        insertDataOption='INSERT_ROWS',
+                        body={'values': [self.prepare_row_data(entry) for entry in appends]}
+                    ).execute()
+                    api_calls += 1
+                    
+                    first_row = self._first_row_of_range(result.get('updates', {}).get('updatedRange'))
+                    if first_row:
+                        self._remember_rows([entry.id for entry in appends], first_row)
+                    else:
+                        self._invalidate_row_index()
+                
+                rows_to_delete = sorted(
+                    {row_index[str(entry_id)] for entry_id in delete_ids if str(entry_id) in row_index},
+                    reverse=True
+                )
+                
+                if rows_to_delete:
+                    self.service.spreadsheets().batchUpdate(
+                        spreadsheetId=self.spreadsheet_id,
+                        body={
+                            "requests": [
+                                {
+                                    "deleteDimension": {
+                                        "range": {
+                                            "sheetId": 0,  # ID первого листа
+                                            "dimension": "ROWS",
+                                            "startIndex": row - 1,  # 0-based index
+                                            "endIndex": row  # exclusive
+                                        }
+                                    }
+                                }
+                                for row in rows_to_delete
+                            ]
+                        }
+                    ).execute()
+                    api_calls += 1
+                    self._forget_rows(rows_to_delete)
+            
+            logger.info(
+                f"✅ Пачка применена: обновлено {len(updates)}, добавлено {len(appends)}, "
+                f"удалено {len(rows_to_delete)} (вызовов API: {api_calls})"
+            )
+            
+            return {
+                "success": True,
+                "updated": len(updates),
+                "appended": len(appends),
+                "deleted": len(rows_to_delete),
+                "api_calls": api_calls,
+                "timestamp": datetime.now().isoformat()
+            }
+            
+        except Exception as e:
+            # Позиции строк могли разъехаться - в следующий раз перечитаем колонку A
+            self._invalidate_row_index()
+            logger.error(f"❌ Ошибка применения пачки изменений: {e}")
+            if "Invalid JWT Signature" in str(e):
+                logger.error("💡 Проблема с аутентификацией. Проверьте credentials.json")
+            return {"success": False, "error": str(e), "api_calls": api_calls, "retryable": is_retryable_error(e)}
+
     def set_spreadsheet_id(self, spreadsheet_id: str):
         """Установить ID таблицы для синхронизации"""
         self.spreadsheet_id = spreadsheet_id
+        self._invalidate_row_index()
         logger.info(f"Google Sheets ID установлен: {spreadsheet_id}")
 
 # Глобальный экземпляр сервиса
@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.queue import QueueEntry
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 64
+
+class IdempotencyCache:
+    """
+    Короткоживущий кэш "ключ запроса -> id созданной заявки"
+
+    Повтор отправки с тем же ключом отвечает одним чтением по первичному
+    ключу. Источник истины - уникальный индекс по queue_entries.idempotency_key,
+    кэш только избавляет от поиска по нему.
+    """
+
+    def __init__(self, ttl_seconds: int, max_size: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if not cached:
+                return None
+            expires_at, entry_id = cached
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return entry_id
+
+    def put(self, key: str, entry_id: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, entry_id)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+# Глобальный кэш ключей идемпотентности
+idempotency_cache = IdempotencyCache(ttl_seconds=settings.IDEMPOTENCY_CACHE_TTL_SECONDS)
+
+def validate_idempotency_key(key: Optional[str]) -> Optional[str]:
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+    return key
+
+def find_by_idempotency_key(db: Session, key: str, phone: str) -> Optional[QueueEntry]:
+    """Заявка, уже созданная по этому ключу (сначала кэш, затем уникальный индекс)"""
+    entry = None
+    entry_id = idempotency_cache.get(key)
+    if entry_id:
+        entry = db.get(QueueEntry, entry_id)
+    if entry is None:
+        entry = db.query(QueueEntry).filter(QueueEntry.idempotency_key == key).first()
+    if entry is None:
+        return None
+
+    # Тот же ключ с другими данными - ошибка клиента, а не повтор
+    if entry.phone != phone:
+        raise HTTPException(status_code=422, detail=f"{IDEMPOTENCY_HEADER} was already used for a different submission")
+
+    idempotency_cache.put(key, entry.id)
+    return entry
@@ -0,0 +1,96 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Query
+
+from app.config import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_EXACT_HEADER = "X-Total-Count-Exact"
+
+def encode_cursor(sort_value: datetime, row_id: str) -> str:
+    """Курсор - позиция последней отданной строки: (время, id) в base64"""
+    payload = json.dumps({"t": sort_value.isoformat(), "id": row_id})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(payload["t"]), str(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def page_size(limit: Optional[int]) -> int:
+    """Размер страницы в пределах настроек"""
+    if not limit:
+        return settings.PAGE_SIZE_DEFAULT
+    return max(1, min(limit, settings.PAGE_SIZE_MAX))
+
+def keyset_page(
+    query: Query,
+    sort_column,
+    id_column,
+    limit: int,
+    cursor: Optional[str] = None,
+    descending: bool = True
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Страница по ключу (sort_column, id_column) без OFFSET
+
+    Следующая страница начинается строго после последней строки предыдущей,
+    поэтому стоимость запроса не растет с номером страницы (индекс по тем же колонкам).
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(or_(
+                sort_column < sort_value,
+                and_(sort_column == sort_value, id_column < row_id)
+            ))
+        else:
+            query = query.filter(or_(
+                sort_column > sort_value,
+                and_(sort_column == sort_value, id_column > row_id)
+            ))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    # Берем на одну строку больше, чтобы понять, есть ли следующая страница
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
+
+def estimate_total(query: Query, cap: Optional[int] = None) -> Tuple[int, bool]:
+    """
+    Количество строк с ограничением сверху
+
+    Считаем не больше cap строк: для небольших выборок число точное,
+    для больших - возвращаем cap и признак того, что это оценка снизу.
+    """
+    cap = cap or settings.PAGE_COUNT_CAP
+    limited = query.order_by(None).limit(cap + 1).subquery()
+    counted = query.session.execute(select(func.count()).select_from(limited)).scalar() or 0
+    if counted > cap:
+        return cap, False
+    return counted, True
+
+def set_page_headers(response: Response, next_cursor: Optional[str], total: Tuple[int, bool]):
+    """Курсор и оценку количества отдаем в заголовках - тело ответа остается массивом"""
+    count, exact = total
+    response.headers[TOTAL_COUNT_HEADER] = str(count)
+    response.headers[TOTAL_EXACT_HEADER] = "true" if exact else "false"
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,105 @@
+import logging
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.program_counters import QueueProgramCounter
+from app.models.queue import QueueStatus
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION queue_program_counters_bump(
+    p_status TEXT,
+    p_programs JSONB,
+    p_delta INT
+) RETURNS void AS $$
+BEGIN
+    IF jsonb_typeof(p_programs) IS DISTINCT FROM 'array' THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO queue_program_counters (program, status, entry_count)
+    SELECT DISTINCT value, p_status, p_delta
+    FROM jsonb_array_elements_text(p_programs) AS value
+    ON CONFLICT (program, status)
+    DO UPDATE SET entry_count = queue_program_counters.entry_count + EXCLUDED.entry_count;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION queue_program_counters_maintain()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND NEW.status IS NOT DISTINCT FROM OLD.status
+       AND NEW.programs IS NOT DISTINCT FROM OLD.programs THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM queue_program_counters_bump(OLD.status::text, OLD.programs, -1);
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'INSERT') THEN
+        PERFORM queue_program_counters_bump(NEW.status::text, NEW.programs, 1);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS queue_program_counters_trigger ON queue_entries;
+CREATE TRIGGER queue_program_counters_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON queue_entries
+    FOR EACH ROW
+    EXECUTE FUNCTION queue_program_counters_maintain();
+"""
+
+REBUILD_SQL = """
+INSERT INTO queue_program_counters (program, status, entry_count)
+SELECT p.program, q.status::text, COUNT(*)
+FROM queue_entries q
+CROSS JOIN LATERAL (
+    SELECT DISTINCT value AS program
+    FROM jsonb_array_elements_text(
+        CASE WHEN jsonb_typeof(q.programs) = 'array' THEN q.programs ELSE '[]'::jsonb END
+    ) AS value
+) AS p
+GROUP BY 1, 2
+"""
+
+def rebuild_program_counters(db: Session) -> int:
+    """Пересчитать счетчики с нуля (основная таблица маленькая, это дешево)"""
+    db.execute(text("LOCK TABLE queue_program_counters IN EXCLUSIVE MODE"))
+    db.execute(text("DELETE FROM queue_program_counters"))
+    rows = db.execute(text(REBUILD_SQL)).rowcount
+    db.commit()
+    logger.info(f"📊 Счетчики программ пересчитаны: {rows} строк")
+    return rows
+
+def setup_program_counters(db: Session):
+    """Создать триггер счетчиков и сверить их с текущей очередью"""
+    try:
+        db.execute(text(COUNTERS_TRIGGER_SQL))
+        db.commit()
+        rebuild_program_counters(db)
+        logger.info("✅ Триггер счетчиков программ настроен")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка настройки счетчиков программ: {e}")
+        db.rollback()
+
+def read_program_load(db: Session) -> List[dict]:
+    """Нагрузка по программам: ожидают и на приеме (чтение маленькой таблицы счетчиков)"""
+    rows = db.query(QueueProgramCounter).filter(
+        QueueProgramCounter.status.in_([QueueStatus.WAITING.name, QueueStatus.IN_PROGRESS.name]),
+        QueueProgramCounter.entry_count > 0
+    ).all()
+
+    load = {}
+    for row in rows:
+        item = load.setdefault(row.program, {"program": row.program, "waiting": 0, "in_progress": 0})
+        item[QueueStatus[row.status].value] = row.entry_count
+
+    return sorted(load.values(), key=lambda item: (-item["waiting"], item["program"]))
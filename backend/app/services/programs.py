@@ -0,0 +1,153 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from sqlalchemy.dialects.postgresql import array
+
+# Полный словарь для маппинга названий программ на коды
+PROGRAM_MAPPING = {
+    # БАКАЛАВРИАТ
+    # Русские названия
+    "бухгалтерский учёт": "accounting",
+    "бухгалтерский учет": "accounting",
+    "прикладная лингвистика": "appliedLinguistics",
+    "экономика и наука о данных": "economicsDataScience",
+    "финансы": "finance",
+    "гостеприимство": "hospitality",
+    "международная журналистика": "internationalJournalism",
+    "международное право": "internationalLaw",
+    "международные отношения": "internationalRelations",
+    "it": "it",
+    "ит": "it",
+    "юриспруденция": "jurisprudence",
+    "менеджмент": "management",
+    "маркетинг": "marketing",
+    "психология": "psychology",
+    "туризм": "tourism",
+    "переводческое дело": "translation",
+    
+    # Казахские названия
+    "бухгалтерлік есеп": "accounting",
+    "қолданбалы лингвистика": "appliedLinguistics",
+    "экономика және деректер ғылымы": "economicsDataScience",
+    "қаржы": "finance",
+    "қонақжайлылық": "hospitality",
+    "халықаралық журналистика": "internationalJournalism",
+    "халықаралық құқық": "internationalLaw",
+    "халықаралық қатынастар": "internationalRelations",
+    "құқықтану": "jurisprudence",
+    "аударма ісі": "translation",
+    
+    # Английские названия
+    "accounting": "accounting",
+    "applied linguistics": "appliedLinguistics",
+    "economics and data science": "economicsDataScience",
+    "finance": "finance",
+    "hospitality": "hospitality",
+    "international journalism": "internationalJournalism",
+    "international law": "internationalLaw",
+    "international relations": "internationalRelations",
+    "law": "jurisprudence",
+    "management": "management",
+    "marketing": "marketing",
+    "psychology": "psychology",
+    "tourism": "tourism",
+    "translation studies": "translation",
+    
+    # МАГИСТРАТУРА
+    # Русские названия
+    "политология и международные отношения": "politicalInternationalRelations",
+    "конкурентное право": "competitionLaw",
+    "консультативная психология": "consultingPsychology",
+    "экономика": "economics",
+    "право интеллектуальной собственности и бизнеса": "intellectualPropertyLaw",
+    "право it": "itLaw",
+    "право ит": "itLaw",
+    
+    # Казахские названия
+    "саясаттану және халықаралық қатынастар": "politicalInternationalRelations",
+    "бәсекелестік құқық": "competitionLaw",
+    "консультативті психология": "consultingPsychology",
+    "зияткерлік меншік және бизнес құқық": "intellectualPropertyLaw",
+    "құқық it": "itLaw",
+    
+    # Английские названия
+    "political science and international relations": "politicalInternationalRelations",
+    "competition law": "competitionLaw",
+    "counselling psychology": "consultingPsychology",
+    "economics": "economics",
+    "intellectual property and business law": "intellectualPropertyLaw",
+    "it law": "itLaw",
+    
+    # ДОКТОРАНТУРА
+    # Русские названия
+    "право": "law",
+    "phd по экономике": "phdEconomics",
+    
+    # Казахские названия
+    "құқық": "law",
+    "экономика саласындағы phd": "phdEconomics",
+    
+    # Английские названия
+    "phd in law": "law",
+    "phd in economics": "phdEconomics"
+}
+
+def normalize_program_name(name: str) -> str:
+    """Нормализовать название программы: регистр, ё -> е, лишние пробелы"""
+    normalized = name.casefold().replace("ё", "е")
+    return re.sub(r"\s+", " ", normalized).strip()
+
+# Предвычисленный справочник: нормализованное название -> код (строится один раз при импорте)
+_NORMALIZED_NAMES: Dict[str, str] = {
+    normalize_program_name(name): code for name, code in PROGRAM_MAPPING.items()
+}
+# Нормализованный код -> код (пользователь может ввести код напрямую)
+_NORMALIZED_CODES: Dict[str, str] = {
+    normalize_program_name(code): code for code in set(PROGRAM_MAPPING.values())
+}
+# Пары для поиска по подстроке, длинные названия первыми
+_NAME_INDEX: Tuple[Tuple[str, str], ...] = tuple(
+    sorted(_NORMALIZED_NAMES.items(), key=lambda item: -len(item[0]))
+)
+
+@lru_cache(maxsize=512)
+def _resolve(normalized: str) -> Tuple[str, ...]:
+    codes: List[str] = []
+
+    def add(code: str):
+        if code not in codes:
+            codes.append(code)
+
+    # Точные совпадения по названию или коду
+    if normalized in _NORMALIZED_NAMES:
+        add(_NORMALIZED_NAMES[normalized])
+    if normalized in _NORMALIZED_CODES:
+        add(_NORMALIZED_CODES[normalized])
+
+    # Частичные совпадения в названиях
+    for name, code in _NAME_INDEX:
+        if normalized in name or name in normalized:
+            add(code)
+
+    return tuple(codes)
+
+def get_program_codes_by_name(program_name: str) -> List[str]:
+    """
+    Получает возможные коды программ по названию программы (ru/kk/en) или по коду
+    """
+    if not program_name:
+        return []
+
+    normalized = normalize_program_name(program_name)
+    if not normalized:
+        return []
+
+    codes = list(_resolve(normalized))
+
+    # Если ничего не найдено, возможно пользователь ввел код напрямую
+    return codes or [program_name.strip()]
+
+def programs_overlap(column, codes: List[str]):
+    """Условие "в programs есть хотя бы один из кодов" (оператор ?| по JSONB, индексируется GIN)"""
+    return column.has_any(array(codes))
@@ -1,101 +1,101 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, cast, String
 from typing import Optional, List
 from uuid import uuid4
 import logging
 import random
 from app.models.queue import QueueEntry, QueueStatus
+from app.models.types import uuid_values
 from app.models.user import User, EmployeeStatus
 from app.schemas.queue import QueueCreate, QueueUpdate, QueueStatusResponse, PublicQueueCreate, QueueResponse
 from app.services.archive import enforce_queue_limit, cleanup_old_completed_entries
+from app.services.queue_state import transition, record_event, event_for_status
+from app.models.queue_event import QueueEventType
+from app.services.programs import programs_overlap
+from app.config import settings
+from app.services.assignment import ApplicantProfile, DeskState, RoundRobinStrategy, get_strategy, load_desk_states
 from sqlalchemy import text
 import json
 
 logger = logging.getLogger(__name__)
 
-def select_employee_automatically(db: Session) -> Optional[str]:
+class DuplicateQueueEntryError(Exception):
+    """У этого телефона уже есть активная заявка"""
+
+class EmployeeNotAvailableError(Exception):
+    """Сотрудник не в статусе available (например, повторный вызов)"""
+
+class UnknownEmployeeError(Exception):
+    """Заявку назначают сотруднику, которого нет среди приемной комиссии"""
+
+def employee_id_by_name(db: Session, full_name: str) -> Optional[str]:
+    """id сотрудника приемной комиссии по имени (для заявок с уже указанным сотрудником)"""
+    row = db.query(User.id).filter(
+        User.role == "admission",
+        User.full_name == full_name
+    ).first()
+    return row.id if row else None
+
+def select_employee_automatically(db: Session, queue: Optional[PublicQueueCreate] = None) -> Optional[DeskState]:
     """
-    Автоматически выбирает сотрудника для новой заявки
+    Автоматически выбирает сотрудника (стол) для новой заявки
     
-    Простая логика по кругу:
-    1. Находит всех доступных сотрудников (available, busy) - ИСКЛЮЧАЯ paused
-    2. Сортирует по номеру стола (по возрастанию)
-    3. Выбирает следующего по кругу (round-robin)
-    4. Сотрудники на паузе полностью исключаются из ротации
+    Политика задается ASSIGNMENT_STRATEGY (см. app/services/assignment.py):
+    round_robin (по кругу по номерам столов), least_loaded, shortest_wait,
+    affinity (язык и программы сотрудника). Сотрудники на паузе и offline
+    в распределении не участвуют.
     """
     try:
-        # Получаем всех доступных сотрудников (НЕ offline, НЕ paused)
-        available_employees = db.query(User).filter(
-            User.role == "admission",
-            User.status.in_([EmployeeStatus.AVAILABLE.value, EmployeeStatus.BUSY.value])
-            # ИСКЛЮЧАЕМ EmployeeStatus.PAUSED - они не участвуют в ротации
-        ).all()
+        desks = load_desk_states(db)
         
-        if not available_employees:
+        if not desks:
             logger.warning("No available employees found for auto-assignment (excluding paused)")
             return None
         
-        # Обрабатываем каждого сотрудника
-        employee_list = []
-        
-        for employee in available_employees:
-            # Пытаемся извлечь номер стола как число
-            desk_number = 9999  # Значение по умолчанию для сотрудников без стола
-            if employee.desk:
-                try:
-                    import re
-                    numbers = re.findall(r'\d+', str(employee.desk))
-                    if numbers:
-                        desk_number = int(numbers[0])
-                except (ValueError, AttributeError):
-                    pass
-            
-            employee_list.append({
-                'employee': employee,
-                'desk_number': desk_number,
-                'desk_original': employee.desk or 'Не указан',
-                'status': employee.status
-            })
-        
-        # Сортируем по номеру стола (по возрастанию)
-        employee_list.sort(key=lambda x: x['desk_number'])
-        
-        # Простая ротация: берем общее количество заявок по модулю количества сотрудников
-        total_entries = db.query(QueueEntry).count()
-        selected_index = total_entries % len(employee_list)
-        
-        selected_employee_data = employee_list[selected_index]
-        selected_employee = selected_employee_data['employee']
+        strategy = get_strategy()
+        applicant = ApplicantProfile(
+            programs=list(queue.programs) if queue else [],
+            form_language=queue.form_language if queue else None
+        )
+        if isinstance(strategy, RoundRobinStrategy):
+            # Ротация по общему количеству заявок, как и раньше
+            applicant.sequence = db.query(QueueEntry).count()
         
-        logger.info(f"Round-robin selection (entry #{total_entries}):")
-        logger.info(f"Available employees ({len(employee_list)}):")
-        for i, emp_data in enumerate(employee_list):
-            marker = " ← SELECTED" if i == selected_index else ""
-            logger.info(f"  {i}. {emp_data['employee'].full_name} - "
-                       f"Стол {emp_data['desk_number']} ({emp_data['desk_original']}) - "
-                       f"Status: {emp_data['status']}{marker}")
+        selected = strategy.select(applicant, desks)
+        if not selected:
+            return None
         
-        logger.info(f"Selected employee: {selected_employee.full_name} "
-                   f"(desk: {selected_employee_data['desk_original']}, "
-                   f"desk_number: {selected_employee_data['desk_number']}, "
-                   f"index: {selected_index}/{len(employee_list)-1})")
+        logger.info(f"Selected employee ({strategy.name}): {selected.employee_name} "
+                   f"(desk: {selected.desk or 'Не указан'}, waiting: {selected.waiting}, "
+                   f"expected wait: {int(selected.expected_wait())}s, candidates: {len(desks)})")
         
-        return selected_employee.full_name
+        return selected
         
     except Exception as e:
         logger.error(f"Error in automatic employee selection: {e}")
         return None
         
-def create_queue_entry(db: Session, queue: PublicQueueCreate) -> QueueResponse:
+def create_queue_entry(db: Session, queue: PublicQueueCreate, idempotency_key: Optional[str] = None) -> QueueResponse:
     """Создать новую заявку с автоматическим распределением сотрудника"""
     try:
+        employee_id = None
+        if queue.assigned_employee_name:
+            employee_id = employee_id_by_name(db, queue.assigned_employee_name)
+            if employee_id is None:
+                # Без id заявку не увидит ни один стол - распределяем как обычно
+                logger.warning(f"Unknown employee {queue.assigned_employee_name}, falling back to auto-assignment")
+                queue.assigned_employee_name = None
+        
         # АВТОМАТИЧЕСКИ ВЫБИРАЕМ СОТРУДНИКА если не указан
         if not queue.assigned_employee_name:
-            queue.assigned_employee_name = select_employee_automatically(db)
+            selected = select_employee_automatically(db, queue)
             
-            if not queue.assigned_employee_name:
+            if not selected:
                 logger.error("No employees available for assignment")
                 raise Exception("В данный момент нет доступных сотрудников для обработки заявки")
+            
+            queue.assigned_employee_name = selected.employee_name
+            employee_id = selected.employee_id
         
         # Остальная логика остается прежней
         total_count = db.query(QueueEntry).count()
@@ -136,6 +136,16 @@ def create_queue_entry(db: Session, queue: PublicQueueCreate) -> QueueResponse:
                 logger.warning("Queue is full but no COMPLETED entries to clean!")
                 raise Exception("Queue is full and no completed entries available for cleanup")
         
+        # Проверка дубликата и вставка - под блокировкой по телефону до commit,
+        # чтобы параллельные повторы одной отправки не создали две заявки
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:phone))"), {"phone": queue.phone})
+        duplicate = db.query(QueueEntry.id).filter(
+            QueueEntry.phone == queue.phone,
+            QueueEntry.status.in_([QueueStatus.WAITING, QueueStatus.IN_PROGRESS])
+        ).first()
+        if duplicate:
+            raise DuplicateQueueEntryError(duplicate.id)
+        
         # Получаем следующий номер для новой заявки
         max_queue_number = db.query(QueueEntry.queue_number).order_by(QueueEntry.queue_number.desc()).first()
         queue_number = (max_queue_number[0] + 1) if max_queue_number else 1
@@ -150,12 +160,20 @@ def create_queue_entry(db: Session, queue: PublicQueueCreate) -> QueueResponse:
             status=QueueStatus.WAITING,
             notes=queue.notes,
             assigned_employee_name=queue.assigned_employee_name,  # Теперь автоматически назначенный
-            form_language=queue.form_language 
+            assigned_employee_id=employee_id,
+            form_language=queue.form_language,
+            idempotency_key=idempotency_key
         )
         
         db.add(db_queue)
         db.flush()  # Чтобы получить ID
         
+        record_event(db, db_queue, QueueEventType.CREATED, None, actor="applicant", payload={
+            "queue_number": queue_number,
+            "employee": db_queue.assigned_employee_name,
+            "form_language": db_queue.form_language
+        })
+        
         # ОДНОВРЕМЕННО создаем копию в архиве
         from app.models.archive import ArchivedQueueEntry, ArchiveQueueStatus
         
@@ -189,43 +207,111 @@ def create_queue_entry(db: Session, queue: PublicQueueCreate) -> QueueResponse:
         db.rollback()
         raise
 
-def update_archive_status(db: Session, queue_entry: QueueEntry):
-    """Обновить статус в архиве при изменении в основной таблице"""
-    try:
-        from app.models.archive import ArchivedQueueEntry, ArchiveQueueStatus
-        
-        archived_entry = db.query(ArchivedQueueEntry).filter(
-            ArchivedQueueEntry.original_id == queue_entry.id
-        ).first()
-        
-        if archived_entry:
-            archived_entry.status = ArchiveQueueStatus(queue_entry.status.value)
-            archived_entry.updated_at = queue_entry.updated_at
-            archived_entry.processing_time = queue_entry.processing_time
-            
-            if queue_entry.status == QueueStatus.COMPLETED:
-                archived_entry.completed_at = queue_entry.updated_at
-            
-            db.add(archived_entry)
-            logger.info(f"Updated archive status for entry {queue_entry.id}")
-        
-    except Exception as e:
-        logger.warning(f"Failed to update archive status for {queue_entry.id}: {e}")
-
-def update_queue_entry(db: Session, queue_id: str, queue_update: QueueUpdate) -> QueueResponse:
+def update_queue_entry(db: Session, queue_id: str, queue_update: QueueUpdate, actor: Optional[str] = None) -> QueueResponse:
+    """Обновить заявку; смена статуса проходит через автомат состояний (queue_state)"""
     queue_entry = db.query(QueueEntry).filter(QueueEntry.id == queue_id).first()
     if not queue_entry:
         return None
-    for key, value in queue_update.dict(exclude_unset=True).items():
+    changes = queue_update.dict(exclude_unset=True)
+    new_status = changes.pop("status", None)
+    
+    # Стол заявки определяется по id: имя без id переназначило бы ее только на экране
+    if "assigned_employee_name" in changes:
+        employee_name = changes["assigned_employee_name"]
+        employee_id = employee_id_by_name(db, employee_name) if employee_name else None
+        if employee_name and employee_id is None:
+            raise UnknownEmployeeError(employee_name)
+        changes["assigned_employee_id"] = employee_id
+    
+    for key, value in changes.items():
         setattr(queue_entry, key, value)
     
-    # Обновляем архив тоже
-    update_archive_status(db, queue_entry)
+    if new_status is not None and new_status != queue_entry.status:
+        transition(db, queue_entry, event_for_status(queue_entry, new_status), actor=actor)
     
     db.commit()
     db.refresh(queue_entry)
     return queue_entry
 
+def steal_waiting_entry(db: Session, employee: User) -> Optional[QueueEntry]:
+    """
+    Найти и заблокировать заявку для перехвата с чужого стола
+
+    Берется стол с наибольшим числом ожидающих (не меньше
+    QUEUE_STEAL_MIN_BACKLOG), на нем - самая старая заявка, подходящая
+    сотруднику по языку и программам. Строка блокируется с SKIP LOCKED,
+    как и при обычном вызове.
+    """
+    # Заявки без сотрудника (например, удаленного) - отдельная "очередь" с ключом ''
+    employee_key = func.coalesce(cast(QueueEntry.assigned_employee_id, String), "")
+    backlog = db.query(
+        employee_key.label("employee_id"),
+        func.count().label("waiting")
+    ).filter(
+        QueueEntry.status == QueueStatus.WAITING,
+        employee_key != employee.id
+    ).group_by(employee_key).subquery()
+    
+    query = db.query(QueueEntry).join(
+        backlog, backlog.c.employee_id == employee_key
+    ).filter(
+        QueueEntry.status == QueueStatus.WAITING,
+        backlog.c.waiting >= settings.QUEUE_STEAL_MIN_BACKLOG
+    )
+    if employee.languages:
+        query = query.filter(func.coalesce(QueueEntry.form_language, "ru").in_(employee.languages))
+    if employee.programs:
+        query = query.filter(programs_overlap(QueueEntry.programs, employee.programs))
+    
+    return query.order_by(
+        backlog.c.waiting.desc(), QueueEntry.queue_number
+    ).with_for_update(of=QueueEntry, skip_locked=True).first()
+
+def claim_next_entry(db: Session, employee: User, event: QueueEventType = QueueEventType.CALLED,
+                     payload: Optional[dict] = None) -> Optional[QueueEntry]:
+    """
+    Атомарно взять следующую заявку сотрудника (одна транзакция, один commit)
+
+    Строка сотрудника блокируется FOR UPDATE, поэтому двойной клик или
+    вторая вкладка ждут первый вызов и затем видят статус busy. Заявка
+    выбирается с FOR UPDATE SKIP LOCKED: строку, которую уже забирает
+    другая транзакция, пропускаем, а не ждем.
+    """
+    locked_employee = db.query(User).filter(
+        User.id == employee.id
+    ).with_for_update().populate_existing().one()
+    
+    if locked_employee.status != EmployeeStatus.AVAILABLE.value:
+        db.rollback()
+        raise EmployeeNotAvailableError(employee.id)
+    
+    next_entry = db.query(QueueEntry).filter(
+        QueueEntry.status == QueueStatus.WAITING,
+        QueueEntry.assigned_employee_id == locked_employee.id
+    ).order_by(QueueEntry.queue_number).with_for_update(skip_locked=True).first()
+    
+    # Своя очередь пуста - в режиме перехвата берем заявку с перегруженного стола
+    payload = dict(payload or {})
+    if not next_entry and settings.QUEUE_WORK_STEALING:
+        next_entry = steal_waiting_entry(db, locked_employee)
+        if next_entry:
+            payload["stolen_from"] = next_entry.assigned_employee_name
+            logger.info(f"🔀 {locked_employee.full_name} перехватывает заявку {next_entry.id} "
+                        f"у {next_entry.assigned_employee_name}")
+            next_entry.assigned_employee_id = locked_employee.id
+            next_entry.assigned_employee_name = locked_employee.full_name
+    
+    if not next_entry:
+        db.rollback()
+        return None
+    
+    transition(db, next_entry, event, actor=locked_employee.id, payload=payload)
+    locked_employee.status = EmployeeStatus.BUSY.value
+    
+    db.commit()
+    db.refresh(next_entry)
+    return next_entry
+
 def get_all_queue_entries(db: Session, status: Optional[QueueStatus] = None) -> List[QueueResponse]:
     query = db.query(QueueEntry)
     if status:
@@ -254,33 +340,12 @@ def get_queue_status(db: Session, phone: str) -> Optional[QueueStatusResponse]:
         created_at=queue_entry.created_at
     )
 
-def start_processing_time(db: Session, queue_id: str):
-    """Start processing time for a queue entry"""
-    queue_entry = db.query(QueueEntry).filter(QueueEntry.id == queue_id).first()
-    if not queue_entry:
-        return None
-    
-    queue_entry.status = QueueStatus.IN_PROGRESS
-    queue_entry.updated_at = func.now()
-    db.commit()
-    db.refresh(queue_entry)
-    return queue_entry
-
-def end_processing_time(db: Session, queue_id: str):
-    """End processing time and calculate the duration"""
-    queue_entry = db.query(QueueEntry).filter(QueueEntry.id == queue_id).first()
-    if not queue_entry:
-        return None
-    
-    # Calculate processing time in seconds
-    if queue_entry.updated_at:
-        # Получаем текущее время
-        current_time = db.query(func.now()).scalar()
-        # Вычисляем разницу в секундах
-        processing_time = int((current_time - queue_entry.updated_at).total_seconds())
-        queue_entry.processing_time = processing_time
-    
-    queue_entry.status = QueueStatus.COMPLETED
-    db.commit()
-    db.refresh(queue_entry)
-    return queue_entry
\ No newline at end of file
+def delete_queue_entries(db: Session, entry_ids: List[str]) -> List[str]:
+    """Удалить заявки одним запросом, вернуть id реально удаленных (без commit)"""
+    if not entry_ids:
+        return []
+    result = db.execute(
+        text("DELETE FROM queue_entries WHERE id = ANY(CAST(:ids AS uuid[])) RETURNING id::text AS id"),
+        {"ids": uuid_values(entry_ids)}
+    )
+    return [row.id for row in result]
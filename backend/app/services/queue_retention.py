@@ -0,0 +1,128 @@
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import engine
+from app.models.sync_settings import SyncLog
+
+logger = logging.getLogger(__name__)
+
+# Завершенные заявки уходят из основной таблицы пачками. Архивная копия
+# создается вместе с заявкой и ведется автоматом состояний, поэтому здесь
+# копируются только заявки без копии (появившиеся до этого механизма).
+RETENTION_CHUNK_SQL = text("""
+    WITH doomed AS (
+        SELECT id
+        FROM queue_entries
+        WHERE status = 'COMPLETED' AND COALESCE(updated_at, created_at) < :cutoff
+        ORDER BY COALESCE(updated_at, created_at)
+        LIMIT :chunk_size
+        FOR UPDATE SKIP LOCKED
+    ),
+    copied AS (
+        INSERT INTO archived_queue_entries (
+            id, original_id, queue_number, full_name, phone, programs, status, notes,
+            assigned_employee_name, created_at, updated_at, completed_at, processing_time,
+            form_language, archive_reason
+        )
+        SELECT gen_random_uuid(), q.id, q.queue_number, q.full_name, q.phone, q.programs,
+               'COMPLETED', q.notes, q.assigned_employee_name, q.created_at, q.updated_at,
+               q.updated_at, q.processing_time, q.form_language, 'retention'
+        FROM queue_entries q
+        JOIN doomed d ON d.id = q.id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM archived_queue_entries a WHERE a.original_id = q.id
+        )
+        RETURNING 1
+    ),
+    removed AS (
+        DELETE FROM queue_entries q
+        USING doomed d
+        WHERE q.id = d.id
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM removed) AS removed, (SELECT COUNT(*) FROM copied) AS copied
+""")
+
+COMPACT_TABLES = ["queue_entries", "queue_program_counters"]
+
+def run_queue_retention(db: Session, older_than_hours: Optional[int] = None,
+                        chunk_size: Optional[int] = None) -> dict:
+    """
+    Убрать из queue_entries завершенные заявки старше older_than_hours
+
+    Пачки по chunk_size строк, commit после каждой: блокировки короткие,
+    а строки, занятые другими транзакциями, пропускаются до следующего запуска.
+    """
+    hours = settings.QUEUE_RETENTION_HOURS if older_than_hours is None else older_than_hours
+    chunk_size = chunk_size or settings.QUEUE_RETENTION_CHUNK_SIZE
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+    started = time.monotonic()
+
+    removed_rows = 0
+    copied_rows = 0
+    chunks = 0
+    while True:
+        row = db.execute(RETENTION_CHUNK_SQL, {"cutoff": cutoff, "chunk_size": chunk_size}).first()
+        db.commit()
+
+        if row.removed:
+            chunks += 1
+            removed_rows += row.removed
+            copied_rows += row.copied
+        if row.removed < chunk_size:
+            break
+
+    return {
+        "removed_rows": removed_rows,
+        "archived_rows": copied_rows,
+        "chunks": chunks,
+        "cutoff": cutoff.isoformat(),
+        "elapsed_seconds": round(time.monotonic() - started, 3)
+    }
+
+def compact_queue_tables() -> dict:
+    """Убрать нулевые счетчики и VACUUM (ANALYZE) живых таблиц (вне транзакции)"""
+    started = time.monotonic()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("DELETE FROM queue_program_counters WHERE entry_count = 0"))
+        for table in COMPACT_TABLES:
+            connection.execute(text(f"VACUUM (ANALYZE) {table}"))
+    return {"compacted_tables": COMPACT_TABLES, "elapsed_seconds": round(time.monotonic() - started, 3)}
+
+def _record_run(db: Session, status: str, report: dict):
+    """Отчет о запуске - в sync_logs, рядом с отчетами синхронизации"""
+    db.add(SyncLog(
+        operation="queue_retention",
+        status=status,
+        message=json.dumps(report, ensure_ascii=False)
+    ))
+    db.commit()
+
+def run_retention_and_compaction(db: Session, older_than_hours: Optional[int] = None) -> dict:
+    """Очистка и уплотнение с отчетом: длительность и перемещенные строки"""
+    started = time.monotonic()
+    try:
+        report = run_queue_retention(db, older_than_hours)
+        if report["removed_rows"]:
+            report["compaction"] = compact_queue_tables()
+        report["total_seconds"] = round(time.monotonic() - started, 3)
+
+        logger.info(
+            f"🧹 Очистка очереди: удалено {report['removed_rows']} завершенных заявок "
+            f"(скопировано в архив {report['archived_rows']}) за {report['total_seconds']} сек"
+        )
+        _record_run(db, "success", report)
+        return report
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Ошибка очистки очереди: {e}")
+        _record_run(db, "error", {"error": str(e), "total_seconds": round(time.monotonic() - started, 3)})
+        raise
@@ -0,0 +1,234 @@
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, text, tuple_
+from sqlalchemy.orm import Session
+
+from app.models.archive import ArchivedQueueEntry, ArchiveQueueStatus
+from app.models.queue import QueueEntry, QueueStatus
+from app.models.queue_event import QueueEvent, QueueEventType
+from app.models.user import User
+from app.services.user_cache import invalidate_after_commit
+from app.services.assignment import service_times
+
+logger = logging.getLogger(__name__)
+
+# Конечный автомат заявки: событие -> (допустимые исходные статусы, новый статус)
+# Для CREATED исходного статуса нет; MOVED_BACK меняет только номер в очереди.
+TRANSITIONS = {
+    QueueEventType.CREATED: (None, QueueStatus.WAITING),
+    QueueEventType.CALLED: ({QueueStatus.WAITING}, QueueStatus.IN_PROGRESS),
+    QueueEventType.STARTED: ({QueueStatus.WAITING, QueueStatus.PAUSED}, QueueStatus.IN_PROGRESS),
+    QueueEventType.PAUSED: ({QueueStatus.IN_PROGRESS}, QueueStatus.PAUSED),
+    QueueEventType.COMPLETED: ({QueueStatus.IN_PROGRESS, QueueStatus.PAUSED}, QueueStatus.COMPLETED),
+    QueueEventType.CANCELLED: (
+        {QueueStatus.WAITING, QueueStatus.IN_PROGRESS, QueueStatus.PAUSED},
+        QueueStatus.COMPLETED  # В основной таблице отмена хранится как completed
+    ),
+    QueueEventType.MOVED_BACK: ({QueueStatus.WAITING}, QueueStatus.WAITING),
+}
+
+# Статус копии в архиве; отличается от основной таблицы только для отмены
+ARCHIVE_STATUS = {
+    QueueEventType.CANCELLED: ArchiveQueueStatus.CANCELLED,
+}
+
+# Прямая смена статуса (PUT заявки) -> событие
+STATUS_EVENTS = {
+    QueueStatus.IN_PROGRESS: QueueEventType.STARTED,
+    QueueStatus.PAUSED: QueueEventType.PAUSED,
+    QueueStatus.COMPLETED: QueueEventType.COMPLETED,
+}
+
+class InvalidTransitionError(Exception):
+    """Переход недопустим для текущего статуса заявки"""
+
+    def __init__(self, entry_id: str, action: str, current: Optional[QueueStatus]):
+        self.entry_id = entry_id
+        self.current = current
+        current_value = current.value if current else None
+        super().__init__(f"Cannot apply '{action}' to queue entry {entry_id} in status '{current_value}'")
+
+def invalid_transition(error: InvalidTransitionError) -> HTTPException:
+    return HTTPException(status_code=409, detail=str(error))
+
+def event_for_status(entry: QueueEntry, target: QueueStatus) -> QueueEventType:
+    """Событие для прямой смены статуса; вернуть заявку в waiting нельзя"""
+    event = STATUS_EVENTS.get(target)
+    if event is None:
+        raise InvalidTransitionError(entry.id, f"status={target.value}", entry.status)
+    return event
+
+def record_event(db: Session, entry: QueueEntry, event: QueueEventType,
+                 from_status: Optional[QueueStatus], actor: Optional[str] = None,
+                 payload: Optional[dict] = None) -> QueueEvent:
+    """Добавить событие в журнал (без commit, в транзакции изменения заявки)"""
+    queue_event = QueueEvent(
+        entry_id=entry.id,
+        event_type=event.value,
+        from_status=from_status.value if from_status else None,
+        to_status=TRANSITIONS[event][1].value,
+        actor=actor,
+        payload=payload
+    )
+    db.add(queue_event)
+    return queue_event
+
+def _project_archive(db: Session, entry: QueueEntry, event: QueueEventType):
+    """Проекция в архивную копию заявки: тот же переход, та же транзакция"""
+    archived_entry = db.query(ArchivedQueueEntry).filter(
+        ArchivedQueueEntry.original_id == entry.id
+    ).first()
+    if not archived_entry:
+        return
+
+    archived_entry.status = ARCHIVE_STATUS.get(event, ArchiveQueueStatus(entry.status.value))
+    archived_entry.queue_number = entry.queue_number
+    archived_entry.assigned_employee_name = entry.assigned_employee_name
+    archived_entry.updated_at = entry.updated_at
+    archived_entry.processing_time = entry.processing_time
+    if entry.status == QueueStatus.COMPLETED:
+        archived_entry.completed_at = entry.updated_at
+    db.add(archived_entry)
+
+def transition(db: Session, entry: QueueEntry, event: QueueEventType,
+               actor: Optional[str] = None, payload: Optional[dict] = None) -> QueueEvent:
+    """
+    Перевести заявку по событию
+
+    Проверяет допустимость перехода, меняет строку в queue_entries и
+    архивную копию и дописывает событие в queue_events - все в одной
+    транзакции, commit делает вызывающий код.
+    """
+    allowed, target = TRANSITIONS[event]
+    current = entry.status
+    if allowed is None or current not in allowed:
+        raise InvalidTransitionError(entry.id, event.value, current)
+
+    payload = dict(payload or {})
+
+    if event in (QueueEventType.CALLED, QueueEventType.STARTED):
+        # updated_at - момент начала обработки, от него считается processing_time
+        entry.updated_at = func.now()
+    elif event in (QueueEventType.COMPLETED, QueueEventType.CANCELLED) and current != QueueStatus.WAITING:
+        if entry.updated_at:
+            current_time = db.query(func.now()).scalar()
+            entry.processing_time = int((current_time - entry.updated_at).total_seconds())
+            payload["processing_time"] = entry.processing_time
+            if event == QueueEventType.COMPLETED:
+                service_times.record(entry.assigned_employee_id, entry.processing_time)
+
+    entry.status = target
+    payload.setdefault("queue_number", entry.queue_number)
+    if entry.assigned_employee_name:
+        payload.setdefault("employee", entry.assigned_employee_name)
+
+    db.add(entry)
+    db.flush()
+    _project_archive(db, entry, event)
+
+    logger.info(f"🔁 Заявка {entry.id}: {event.value} ({current.value} → {target.value})")
+    return record_event(db, entry, event, current, actor, payload)
+
+# Завершение текущей заявки сотрудника одним запросом: заявка, архивная копия,
+# событие в журнале и статус сотрудника. Enum в базе хранится по имени.
+COMPLETE_CURRENT_SQL = text("""
+    WITH done AS (
+        UPDATE queue_entries
+        SET status = 'COMPLETED',
+            processing_time = CASE
+                WHEN updated_at IS NOT NULL THEN EXTRACT(EPOCH FROM now() - updated_at)::int
+                ELSE processing_time
+            END,
+            updated_at = now()
+        WHERE id = (
+            SELECT id FROM queue_entries
+            WHERE status = 'IN_PROGRESS' AND assigned_employee_id = :employee_id
+            ORDER BY queue_number
+            LIMIT 1
+            FOR UPDATE
+        )
+        RETURNING id, queue_number, processing_time, assigned_employee_name
+    ),
+    archived AS (
+        UPDATE archived_queue_entries a
+        SET status = 'COMPLETED',
+            updated_at = now(),
+            completed_at = now(),
+            processing_time = d.processing_time
+        FROM done d
+        WHERE a.original_id = d.id
+    ),
+    logged AS (
+        INSERT INTO queue_events (entry_id, event_type, from_status, to_status, actor, payload, created_at)
+        SELECT d.id, 'completed', 'in_progress', 'completed', :actor,
+               jsonb_build_object(
+                   'queue_number', d.queue_number,
+                   'employee', d.assigned_employee_name,
+                   'processing_time', d.processing_time
+               ),
+               now()
+        FROM done d
+    ),
+    employee AS (
+        UPDATE users SET status = :employee_status, updated_at = now()
+        WHERE id = :employee_id
+    )
+    SELECT id::text AS id, queue_number, processing_time FROM done
+""")
+
+def complete_current(db: Session, employee: User, employee_status: str):
+    """
+    Завершить текущую заявку сотрудника и сменить его статус за один запрос
+
+    processing_time считается в базе (now() - updated_at). Возвращает
+    строку завершенной заявки или None, если активной заявки нет (статус
+    сотрудника при этом тоже меняется - вызывающий код решает, делать ли
+    commit). Commit делает вызывающий код.
+    """
+    row = db.execute(COMPLETE_CURRENT_SQL, {
+        "employee_id": employee.id,
+        "employee_status": employee_status,
+        "actor": employee.id
+    }).first()
+    invalidate_after_commit(db, employee.id)
+
+    if row:
+        service_times.record(employee.id, row.processing_time)
+        logger.info(f"🔁 Заявка {row.id}: completed (in_progress → completed), {row.processing_time} сек")
+    return row
+
+# Транзакции с номером меньше xmin снимка завершены: их события уже не появятся задним числом
+SNAPSHOT_XMIN = text("(pg_snapshot_xmin(pg_current_snapshot())::text::bigint)")
+
+def event_cursor(event: QueueEvent) -> str:
+    """Смещение потребителя после события (txid.id)"""
+    return f"{event.txid}.{event.id}"
+
+def parse_event_cursor(cursor: Optional[str]) -> Tuple[int, int]:
+    if not cursor:
+        return 0, 0
+    try:
+        txid, event_id = cursor.split(".")
+        return int(txid), int(event_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def read_events(db: Session, cursor: Optional[str] = None, limit: int = 100,
+                entry_ids: Optional[Iterable[str]] = None) -> List[QueueEvent]:
+    """
+    События после смещения cursor в порядке (txid, id)
+
+    Отдаются только события завершенных транзакций (txid < xmin), поэтому
+    ни одно событие не окажется позади уже выданного смещения. Долгая
+    открытая транзакция в базе задерживает выдачу, но не теряет событий.
+    """
+    after_txid, after_id = parse_event_cursor(cursor)
+    query = db.query(QueueEvent).filter(
+        tuple_(QueueEvent.txid, QueueEvent.id) > tuple_(after_txid, after_id),
+        QueueEvent.txid < SNAPSHOT_XMIN
+    )
+    if entry_ids:
+        query = query.filter(QueueEvent.entry_id.in_(list(entry_ids)))
+    return query.order_by(QueueEvent.txid, QueueEvent.id).limit(limit).all()
@@ -0,0 +1,221 @@
+import ipaddress
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from app.config import settings
+
+class RateLimitBackend(ABC):
+    """Хранилище счетчиков скользящего окна (реализации подключаются по имени)"""
+
+    @abstractmethod
+    def check(self, key: str, limit: int, window_seconds: float) -> Optional[float]:
+        """Через сколько секунд можно повторить (None - лимит не исчерпан); попытку не расходует"""
+
+    @abstractmethod
+    def hit(self, key: str, limit: int, window_seconds: float) -> Optional[float]:
+        """Учесть попытку; если лимит уже исчерпан - вернуть время ожидания"""
+
+    @abstractmethod
+    def reset(self, key: str):
+        """Сбросить счетчик ключа"""
+
+class InMemoryBackend(RateLimitBackend):
+    """Счетчики в памяти процесса: без обращения к базе, но у каждого воркера свои"""
+
+    SWEEP_EVERY = 1000  # Раз в столько попаданий выбрасываем давно неактивные ключи
+
+    def __init__(self):
+        self._hits: Dict[str, Tuple[float, Deque[float]]] = {}
+        self._lock = threading.Lock()
+        self._since_sweep = 0
+
+    def _prune(self, key: str, window_seconds: float, now: float) -> Deque[float]:
+        entry = self._hits.get(key)
+        if entry is None:
+            return deque()
+        hits = entry[1]
+        while hits and hits[0] <= now - window_seconds:
+            hits.popleft()
+        if not hits:
+            del self._hits[key]
+        return hits
+
+    def _sweep(self, now: float):
+        stale = [key for key, (expires_at, _) in self._hits.items() if expires_at <= now]
+        for key in stale:
+            del self._hits[key]
+
+    def check(self, key: str, limit: int, window_seconds: float) -> Optional[float]:
+        now = time.monotonic()
+        with self._lock:
+            hits = self._prune(key, window_seconds, now)
+            if len(hits) < limit:
+                return None
+            return max(hits[0] + window_seconds - now, 0.0)
+
+    def hit(self, key: str, limit: int, window_seconds: float) -> Optional[float]:
+        now = time.monotonic()
+        with self._lock:
+            self._since_sweep += 1
+            if self._since_sweep >= self.SWEEP_EVERY:
+                self._since_sweep = 0
+                self._sweep(now)
+
+            hits = self._prune(key, window_seconds, now)
+            if len(hits) >= limit:
+                return max(hits[0] + window_seconds - now, 0.0)
+            hits.append(now)
+            self._hits[key] = (now + window_seconds, hits)
+            return None
+
+    def reset(self, key: str):
+        with self._lock:
+            self._hits.pop(key, None)
+
+class NullBackend(RateLimitBackend):
+    """Ограничения выключены"""
+
+    def check(self, key, limit, window_seconds):
+        return None
+
+    def hit(self, key, limit, window_seconds):
+        return None
+
+    def reset(self, key):
+        pass
+
+_BACKENDS: Dict[str, Callable[[], RateLimitBackend]] = {
+    "memory": InMemoryBackend,
+    "none": NullBackend,
+}
+_backend: Optional[RateLimitBackend] = None
+_backend_lock = threading.Lock()
+
+def register_backend(name: str, factory: Callable[[], RateLimitBackend]):
+    """Подключить другое хранилище счетчиков (например, общее для нескольких воркеров)"""
+    _BACKENDS[name] = factory
+
+def get_backend() -> RateLimitBackend:
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = settings.RATE_LIMIT_BACKEND if settings.RATE_LIMIT_ENABLED else "none"
+            if name not in _BACKENDS:
+                raise ValueError(f"Unknown rate limit backend: {name}")
+            _backend = _BACKENDS[name]()
+        return _backend
+
+def parse_rule(rule: str) -> Tuple[int, int]:
+    """Правило вида "20/60": не больше 20 попыток за 60 секунд"""
+    limit, window = rule.split("/")
+    return int(limit), int(window)
+
+class SlidingWindowLimiter:
+    """
+    Ограничитель попыток со скользящим окном
+
+    check() не расходует попытку, hit() - расходует, reset() - сбрасывает
+    счетчик ключа (например, после успешного входа).
+    """
+
+    def __init__(self, limit: int, window_seconds: float, namespace: str = "default"):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.namespace = namespace
+
+    @classmethod
+    def from_rule(cls, rule: str, namespace: str) -> "SlidingWindowLimiter":
+        limit, window = parse_rule(rule)
+        return cls(limit, window, namespace)
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def check(self, key: str) -> Optional[float]:
+        return get_backend().check(self._key(key), self.limit, self.window_seconds)
+
+    def hit(self, key: str) -> Optional[float]:
+        return get_backend().hit(self._key(key), self.limit, self.window_seconds)
+
+    def reset(self, key: str):
+        get_backend().reset(self._key(key))
+
+    def enforce(self, key: str, detail: str = "Too many requests"):
+        """Учесть попытку или сразу ответить 429"""
+        retry_after = self.hit(key)
+        if retry_after is not None:
+            raise too_many_requests(retry_after, detail)
+
+@lru_cache(maxsize=8)
+def _proxy_networks(proxies: Tuple[str, ...]) -> Tuple:
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+def is_trusted_proxy(host: Optional[str]) -> bool:
+    """Соединение пришло от нашего прокси (TRUSTED_PROXY_IPS: адреса или подсети)"""
+    try:
+        address = ipaddress.ip_address(host or "")
+    except ValueError:
+        return False
+    return any(address in network for network in _proxy_networks(tuple(settings.TRUSTED_PROXY_IPS)))
+
+def client_ip(request: Request) -> str:
+    """
+    IP клиента: X-Real-IP - только если соединение пришло от доверенного прокси
+
+    Порт бэкенда опубликован напрямую, и заголовок от любого другого
+    клиента подделывается: на нем нельзя строить лимиты.
+    """
+    peer = request.client.host if request.client else None
+    real_ip = request.headers.get("x-real-ip")
+    if real_ip and is_trusted_proxy(peer):
+        return real_ip.strip()
+    return peer or "unknown"
+
+def limited_client_ip(request: Request) -> Optional[str]:
+    """
+    Ключ для лимитов по IP: доверенные адреса (киоски, NAT кампуса) не ограничиваются
+
+    Список сверяется только с проверенным адресом из client_ip(): X-Real-IP
+    от не-прокси уже отброшен, иначе подставленный адрес киоска снимал бы лимит.
+    """
+    ip = client_ip(request)
+    return None if ip in settings.RATE_LIMIT_TRUSTED_IPS else ip
+
+def normalize_phone_key(phone: str) -> str:
+    return re.sub(r"\D", "", phone or "")
+
+def too_many_requests(retry_after: float, detail: str = "Too many requests") -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(int(retry_after) + 1)}
+    )
+
+def limit_by(limiter: SlidingWindowLimiter, key_func: Callable[[Request], Optional[str]]):
+    """
+    Зависимость FastAPI: 429 до любой работы с базой
+
+    key_func достает ключ из запроса (IP, параметр пути или query);
+    пустой ключ не ограничивается.
+    """
+    async def dependency(request: Request):
+        key = key_func(request)
+        if key:
+            limiter.enforce(key)
+    return dependency
+
+def path_param(name: str) -> Callable[[Request], Optional[str]]:
+    return lambda request: request.path_params.get(name)
+
+def query_param(name: str, normalize: Callable[[str], str] = lambda value: value) -> Callable[[Request], Optional[str]]:
+    def key_func(request: Request) -> Optional[str]:
+        value = request.query_params.get(name)
+        return normalize(value) if value else None
+    return key_func
@@ -1,139 +1,246 @@
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import event, text
+from sqlalchemy import text
 from apscheduler.schedulers.background import BackgroundScheduler
 
+from app.config import settings
 from app.database import SessionLocal
 from app.models.archive import ArchivedQueueEntry
+from app.models.sync_settings import SyncLog
+from app.services.sync_listener import SyncLogListener
 
 logger = logging.getLogger(__name__)
 
+SYNC_RETRY_DELAY_SECONDS = 30
+
 # Глобальный планировщик для триггеров БД
 scheduler = BackgroundScheduler()
 
+_sync_lock = threading.Lock()
+
+def _mark_processed(db: Session, log_ids: list):
+    """
+    Одним запросом пометить обработанными прочитанные записи лога
+
+    Именно по id, а не "все до max(id)": id из SERIAL выдается при INSERT,
+    и транзакция с меньшим id может закоммититься уже после чтения пачки.
+    Такая запись осталась бы помеченной, но не примененной.
+    """
+    db.execute(text("""
+        UPDATE sync_log SET processed = TRUE
+        WHERE id = ANY(:log_ids)
+    """), {"log_ids": log_ids})
+
+def _schedule_retry():
+    """Повторить обработку позже, если часть изменений не удалось применить"""
+    if not scheduler.running:
+        return
+    scheduler.add_job(
+        func=process_sync_log_job,
+        trigger="date",
+        run_date=datetime.now() + timedelta(seconds=SYNC_RETRY_DELAY_SECONDS),
+        id="process_sync_log_retry",
+        replace_existing=True
+    )
+
+def _apply_isolated(google_sheets_service, entries, delete_ids) -> list:
+    """
+    Применить изменения пачки по одному, чтобы одна "ядовитая" строка
+    не держала всю пачку в бесконечном повторе
+
+    Возвращает [(entry_id, ошибка)] для изменений, упавших без шанса на повтор.
+    Временная ошибка прерывает разбор: пачка повторится целиком (применяется
+    состояние, а не дельта, поэтому уже примененное безопасно применить снова).
+    """
+    changes = [([entry], [], str(entry.id)) for entry in entries]
+    changes += [([], [entry_id], entry_id) for entry_id in delete_ids]
+    
+    poisoned = []
+    for upserts, deletes, entry_id in changes:
+        result = google_sheets_service.apply_changes(upserts, deletes)
+        if result.get("success"):
+            continue
+        if result.get("retryable", True):
+            return None
+        poisoned.append((entry_id, result.get("error")))
+    return poisoned
+
+def _record_poisoned(db: Session, poisoned: list):
+    """Отбракованные изменения - в sync_logs, чтобы их было видно в админке"""
+    for entry_id, error in poisoned:
+        logger.error(f"☠️ Изменение записи {entry_id} отброшено: {error}")
+        db.add(SyncLog(
+            operation="sheets_sync",
+            entry_id=entry_id,
+            status="error",
+            message=f"Skipped after non-retryable error: {error}"
+        ))
+
+def coalesce_changes(log_rows) -> tuple:
+    """
+    Схлопнуть лог изменений до последней операции по каждой записи
+    
+    Возвращает (ids для upsert, ids для удаления). INSERT/UPDATE дают upsert,
+    DELETE перекрывает все предыдущие операции над той же записью.
+    """
+    last_operation = {}
+    for _, operation, entry_id in log_rows:
+        last_operation[entry_id] = 'DELETE' if operation == 'DELETE' else 'UPSERT'
+    
+    upsert_ids = [entry_id for entry_id, op in last_operation.items() if op == 'UPSERT']
+    delete_ids = [entry_id for entry_id, op in last_operation.items() if op == 'DELETE']
+    return upsert_ids, delete_ids
+
 def process_sync_log(db: Session):
-    """Обработка логов синхронизации"""
+    """Обработка логов синхронизации (единственный путь изменений архива в Google Sheets)"""
     try:
-        # Получаем необработанные записи
+        # Получаем необработанные записи в порядке монотонного курсора (id)
         unprocessed = db.execute(text("""
-            SELECT id, operation, entry_id FROM sync_log 
+            SELECT id, operation, entry_id, origin FROM sync_log 
             WHERE processed = FALSE
-            ORDER BY timestamp ASC
+            ORDER BY id ASC
         """)).fetchall()
         
         if not unprocessed:
             return
-            
-        logger.info(f"📝 Обрабатываем {len(unprocessed)} записей синхронизации")
         
-        # Группируем операции по типу
-        delete_operations = []
-        update_operations = []
+        log_rows = [(log_id, operation, entry_id) for log_id, operation, entry_id, _ in unprocessed]
+        upsert_ids, delete_ids = coalesce_changes(log_rows)
         
-        for log_entry in unprocessed:
-            log_id, operation, entry_id = log_entry
-            if operation == 'DELETE':
-                delete_operations.append((log_id, entry_id))
-            elif operation == 'UPDATE':
-                update_operations.append((log_id, entry_id))
+        # Актуальное состояние всех затронутых записей - одним запросом
+        entries = db.query(ArchivedQueueEntry).filter(
+            ArchivedQueueEntry.id.in_(upsert_ids)
+        ).all() if upsert_ids else []
         
-        # Если есть удаления - делаем полную пересинхронизацию
-        if delete_operations:
-            logger.info(f"🔄 Найдено {len(delete_operations)} удалений - запускаем полную пересинхронизацию")
-            
-            try:
-                from app.services.google_sheets import google_sheets_service
-                result = google_sheets_service.sync_all_data(db)
-                
-                if result.get("success"):
-                    logger.info(f"✅ Полная пересинхронизация завершена: {result.get('synced_count', 0)} записей")
-                    # Помечаем все операции удаления как обработанные
-                    for log_id, entry_id in delete_operations:
-                        db.execute(text("UPDATE sync_log SET processed = TRUE WHERE id = :log_id"), 
-                                  {"log_id": log_id})
-                        logger.info(f"🗑️ Обработано удаление записи {entry_id} через полную синхронизацию")
-                else:
-                    logger.error(f"❌ Ошибка полной пересинхронизации: {result.get('error')}")
-                    
-            except Exception as e:
-                logger.error(f"❌ Исключение при полной пересинхронизации: {e}")
+        # Запись успели удалить после UPDATE, но DELETE еще не дошел - удаляем строку
+        found_ids = {str(entry.id) for entry in entries}
+        delete_ids.extend(entry_id for entry_id in upsert_ids if entry_id not in found_ids)
         
-        # Обрабатываем UPDATE операции по отдельности
-        for log_id, entry_id in update_operations:
-            try:
-                from app.services.google_sheets import google_sheets_service
-                
-                # Для UPDATE нужно получить актуальные данные из БД
-                entry = db.query(ArchivedQueueEntry).filter(
-                    ArchivedQueueEntry.id == entry_id
-                ).first()
-                
-                if entry:
-                    result = google_sheets_service.update_entry_by_id(entry)
-                    if result.get("success"):
-                        logger.info(f"📝 Обновлена запись {entry_id} в Google Sheets через триггер БД")
-                        db.execute(text("UPDATE sync_log SET processed = TRUE WHERE id = :log_id"), 
-                                  {"log_id": log_id})
-                    else:
-                        logger.error(f"❌ Ошибка обновления {entry_id}: {result.get('error')}")
-                else:
-                    logger.warning(f"⚠️ Запись {entry_id} не найдена для обновления")
-                    db.execute(text("UPDATE sync_log SET processed = TRUE WHERE id = :log_id"), 
-                              {"log_id": log_id})
-                          
-            except Exception as e:
-                logger.error(f"❌ Ошибка обработки UPDATE для {entry_id}: {e}")
+        logger.info(
+            f"📝 Обрабатываем {len(unprocessed)} записей синхронизации -> "
+            f"{len(entries)} upsert, {len(delete_ids)} удалений"
+        )
         
+        from app.services.google_sheets import google_sheets_service
+        result = google_sheets_service.apply_changes(entries, delete_ids)
+        realtime_sync.record_batch(unprocessed, result)
+        
+        if not result.get("success"):
+            logger.error(f"❌ Ошибка применения изменений: {result.get('error')}")
+            
+            poisoned = None
+            if not result.get("retryable", True):
+                # Ошибка данных: ищем виноватые строки, остальное применяем
+                poisoned = _apply_isolated(google_sheets_service, entries, delete_ids)
+            
+            if poisoned is None:
+                # Курсор не двигаем: пачка будет применена целиком при повторе
+                db.rollback()
+                _schedule_retry()
+                return
+            
+            _record_poisoned(db, poisoned)
+        
+        _mark_processed(db, [row[0] for row in unprocessed])
         db.commit()
         
     except Exception as e:
         logger.error(f"❌ Ошибка обработки логов синхронизации: {e}")
         db.rollback()
+        _schedule_retry()
 
 def process_sync_log_job():
     """Джоб для обработки логов синхронизации"""
+    # Слушатель NOTIFY, повтор и запасной опрос не должны обрабатывать лог одновременно
+    with _sync_lock:
+        try:
+            db = SessionLocal()
+            try:
+                process_sync_log(db)
+            finally:
+                db.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка джоба обработки логов: {e}")
+
+def ensure_archive_partitions_job():
+    """Джоб: заранее создать партиции архива на следующие месяцы"""
     try:
+        from app.services.archive_partitions import ensure_archive_partitions
         db = SessionLocal()
-        process_sync_log(db)
-        db.close()
+        try:
+            ensure_archive_partitions(db)
+        finally:
+            db.close()
+    except Exception as e:
+        logger.error(f"❌ Ошибка джоба партиций архива: {e}")
+
+def queue_retention_job():
+    """Джоб: убрать старые завершенные заявки из основной таблицы и уплотнить ее"""
+    try:
+        from app.services.queue_retention import run_retention_and_compaction
+        db = SessionLocal()
+        try:
+            run_retention_and_compaction(db)
+        finally:
+            db.close()
     except Exception as e:
-        logger.error(f"❌ Ошибка джоба обработки логов: {e}")
+        logger.error(f"❌ Ошибка джоба очистки очереди: {e}")
 
 def setup_database_triggers(db: Session):
     """Настройка триггеров базы данных для отслеживания прямых изменений"""
     try:
         # Создаем таблицу для логов синхронизации (с правильным типом для UUID)
+        # Таблицу не пересоздаем: необработанные изменения должны пережить рестарт
         sync_log_table = """
-        -- Удаляем старую таблицу если есть с неправильным типом
-        DROP TABLE IF EXISTS sync_log;
-        
-        -- Создаем новую таблицу с правильным типом
-        CREATE TABLE sync_log (
+        CREATE TABLE IF NOT EXISTS sync_log (
             id SERIAL PRIMARY KEY,
             operation VARCHAR(10) NOT NULL,
             entry_id TEXT NOT NULL,
             timestamp TIMESTAMP DEFAULT NOW(),
             processed BOOLEAN DEFAULT FALSE
         );
+        
+        -- Источник изменения: 'app' для соединений приложения, иначе 'external'
+        ALTER TABLE sync_log ADD COLUMN IF NOT EXISTS origin VARCHAR(20);
+        
+        -- Частичный индекс: выборка необработанных записей не читает историю
+        CREATE INDEX IF NOT EXISTS ix_sync_log_unprocessed
+            ON sync_log (id) WHERE processed = FALSE;
         """
         
         # SQL триггер с правильным синтаксисом $$..$$
-        trigger_sql = """
+        # Один и тот же payload в рамках транзакции Postgres схлопывает в одно уведомление
+        trigger_sql = f"""
         -- Удаляем старую функцию
         DROP FUNCTION IF EXISTS notify_archive_changes() CASCADE;
         
         -- Создаем функцию с правильным синтаксисом
         CREATE OR REPLACE FUNCTION notify_archive_changes()
         RETURNS trigger AS $$
+        DECLARE
+            change_origin TEXT := COALESCE(NULLIF(current_setting('app.change_origin', true), ''), 'external');
         BEGIN
+            -- Пакетные операции (очистка архива) выключают построчный лог и сверяют таблицу одним проходом
+            IF current_setting('app.sync_suppress', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            
             IF TG_OP = 'DELETE' THEN
-                INSERT INTO sync_log (operation, entry_id, timestamp) 
-                VALUES ('DELETE', OLD.id::text, NOW());
+                INSERT INTO sync_log (operation, entry_id, timestamp, origin) 
+                VALUES ('DELETE', OLD.id::text, NOW(), change_origin);
+                PERFORM pg_notify('{settings.SYNC_NOTIFY_CHANNEL}', 'sync_log');
                 RETURN OLD;
             ELSIF TG_OP = 'UPDATE' THEN
-                INSERT INTO sync_log (operation, entry_id, timestamp) 
-                VALUES ('UPDATE', NEW.id::text, NOW());
+                INSERT INTO sync_log (operation, entry_id, timestamp, origin) 
+                VALUES ('UPDATE', NEW.id::text, NOW(), change_origin);
+                PERFORM pg_notify('{settings.SYNC_NOTIFY_CHANNEL}', 'sync_log');
+                RETURN NEW;
+            ELSIF TG_OP = 'INSERT' THEN
+                INSERT INTO sync_log (operation, entry_id, timestamp, origin) 
+                VALUES ('INSERT', NEW.id::text, NOW(), change_origin);
+                PERFORM pg_notify('{settings.SYNC_NOTIFY_CHANNEL}', 'sync_log');
                 RETURN NEW;
             END IF;
             RETURN NULL;
@@ -143,6 +250,13 @@ def setup_database_triggers(db: Session):
         -- Удаляем старые триггеры если есть
         DROP TRIGGER IF EXISTS archive_delete_trigger ON archived_queue_entries;
         DROP TRIGGER IF EXISTS archive_update_trigger ON archived_queue_entries;
+        DROP TRIGGER IF EXISTS archive_insert_trigger ON archived_queue_entries;
+        
+        -- Создаем триггер для вставок (заменяет ORM-слушатель after_insert)
+        CREATE TRIGGER archive_insert_trigger
+            AFTER INSERT ON archived_queue_entries
+            FOR EACH ROW
+            EXECUTE FUNCTION notify_archive_changes();
         
         -- Создаем триггер для удалений
         CREATE TRIGGER archive_delete_trigger
@@ -150,7 +264,7 @@ def setup_database_triggers(db: Session):
             FOR EACH ROW
             EXECUTE FUNCTION notify_archive_changes();
             
-        -- Создаем триггер для обновлений (для изменений через Adminer)
+        -- Создаем триггер для обновлений (из приложения и через Adminer)
         CREATE TRIGGER archive_update_trigger
             AFTER UPDATE ON archived_queue_entries
             FOR EACH ROW
@@ -161,124 +275,117 @@ def setup_database_triggers(db: Session):
         db.execute(text(trigger_sql))
         db.commit()
         
-        logger.info("✅ Триггеры базы данных для синхронизации настроены (DELETE + UPDATE)")
+        logger.info("✅ Триггеры базы данных для синхронизации настроены (INSERT + UPDATE + DELETE + NOTIFY)")
         
     except Exception as e:
         logger.error(f"❌ Ошибка настройки триггеров БД: {e}")
         db.rollback()
 
 class RealTimeSyncScheduler:
-    """Класс для управления синхронизацией в реальном времени"""
+    """
+    Статистика конвейера синхронизации
     
-    def __init__(self):
-        self.is_initialized = False
-        self._setup_database_events()
+    Единственный источник изменений архива - sync_log, который пишет триггер БД
+    (и для приложения, и для Adminer). ORM-слушатели не используются, чтобы
+    одно изменение не уходило в Google Sheets дважды.
+    """
     
-    def _setup_database_events(self):
-        """Настройка событий базы данных для автоматической синхронизации"""
-        if self.is_initialized:
-            return
-        
-        # Событие после добавления новой записи
-        @event.listens_for(ArchivedQueueEntry, 'after_insert')
-        def after_insert_listener(mapper, connection, target):
-            """Обработчик добавления новой записи в архив"""
-            logger.info(f"🆕 Новая запись в архиве: {target.id}")
-            self._handle_insert(target)
-        
-        # Событие после обновления записи
-        @event.listens_for(ArchivedQueueEntry, 'after_update')
-        def after_update_listener(mapper, connection, target):
-            """Обработчик обновления записи в архиве"""
-            logger.info(f"📝 Обновлена запись в архиве: {target.id}")
-            self._handle_update(target)
-        
-        # 🆕 НОВОЕ: Событие после удаления записи
-        @event.listens_for(ArchivedQueueEntry, 'after_delete')
-        def after_delete_listener(mapper, connection, target):
-            """Обработчик удаления записи из архива"""
-            logger.info(f"🗑️ Удалена запись из архива: {target.id}")
-            self._handle_delete(target)
-        
-        self.is_initialized = True
-        logger.info("✅ Database events для синхронизации настроены (включая удаление)")
-    
-    def _handle_insert(self, target: ArchivedQueueEntry):
-        """Обработать добавление новой записи"""
-        try:
-            from app.services.google_sheets import google_sheets_service
-            
-            logger.info(f"🔄 Синхронизируем новую запись {target.id} с Google Sheets")
-            result = google_sheets_service.add_single_entry(target)
-            
-            if result["success"]:
-                logger.info(f"✅ Запись {target.id} успешно добавлена в Google Sheets")
-            else:
-                logger.error(f"❌ Ошибка добавления записи {target.id}: {result.get('error')}")
-                
-        except Exception as e:
-            logger.error(f"💥 Исключение при добавлении записи {target.id}: {e}")
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.failed_batches = 0
+        self.log_rows = 0
+        self.applied_changes = 0
+        self.api_calls = 0
+        self.by_origin = {}
+        self.last_batch_at = None
+        self.last_error = None
     
-    def _handle_update(self, target: ArchivedQueueEntry):
-        """Обработать обновление записи"""
-        try:
-            from app.services.google_sheets import google_sheets_service
-            
-            logger.info(f"🔄 Синхронизируем обновление записи {target.id} с Google Sheets")
-            result = google_sheets_service.update_entry_by_id(target)
-            
-            if result["success"]:
-                logger.info(f"✅ Запись {target.id} успешно обновлена в Google Sheets")
+    def record_batch(self, log_rows, result: dict):
+        """Учесть обработанную пачку (log_rows: строки sync_log с колонкой origin)"""
+        with self._lock:
+            self.batches += 1
+            self.log_rows += len(log_rows)
+            self.api_calls += result.get("api_calls", 0)
+            self.last_batch_at = datetime.now()
+            for row in log_rows:
+                origin = row[3] or "external"
+                self.by_origin[origin] = self.by_origin.get(origin, 0) + 1
+            if result.get("success"):
+                self.applied_changes += result.get("updated", 0) + result.get("appended", 0) + result.get("deleted", 0)
+                self.last_error = None
             else:
-                logger.error(f"❌ Ошибка обновления записи {target.id}: {result.get('error')}")
-                
-        except Exception as e:
-            logger.error(f"💥 Исключение при обновлении записи {target.id}: {e}")
+                self.failed_batches += 1
+                self.last_error = result.get("error")
     
-    def _handle_delete(self, target: ArchivedQueueEntry):
-        """🆕 НОВОЕ: Обработать удаление записи"""
-        try:
-            from app.services.google_sheets import google_sheets_service
-            
-            logger.info(f"🗑️ Синхронизируем удаление записи {target.id} из Google Sheets")
-            result = google_sheets_service.delete_entry_by_id(str(target.id))
-            
-            if result["success"]:
-                logger.info(f"✅ Запись {target.id} успешно удалена из Google Sheets")
-            else:
-                logger.error(f"❌ Ошибка удаления записи {target.id}: {result.get('error')}")
-                
-        except Exception as e:
-            logger.error(f"💥 Исключение при удалении записи {target.id}: {e}")
+    def get_sync_stats(self) -> dict:
+        """Статистика для /sync/google-sheets/status"""
+        with self._lock:
+            return {
+                "mode": "notify" if sync_log_listener.is_running else "polling",
+                "batches": self.batches,
+                "failed_batches": self.failed_batches,
+                "log_rows": self.log_rows,
+                "applied_changes": self.applied_changes,
+                "api_calls": self.api_calls,
+                "by_origin": dict(self.by_origin),
+                "last_batch_at": self.last_batch_at.isoformat() if self.last_batch_at else None,
+                "last_error": self.last_error
+            }
 
 # Глобальный экземпляр планировщика
 realtime_sync = RealTimeSyncScheduler()
 
+# Слушатель уведомлений триггера: будит обработку sync_log сразу после изменения
+sync_log_listener = SyncLogListener(on_change=process_sync_log_job)
+
 def initialize_sync_scheduler():
     """Инициализировать планировщик синхронизации"""
     logger.info("🚀 Инициализация планировщика синхронизации...")
     
     try:
-        # Инициализируем события базы данных
-        realtime_sync._setup_database_events()
-        
         # 🆕 НОВОЕ: Настраиваем триггеры БД для изменений через Adminer
         db = SessionLocal()
         setup_database_triggers(db)
         db.close()
         
-        # 🆕 НОВОЕ: Планируем обработку логов каждые 10 секунд (компромисс скорость/логи)
+        # Партиции архива на месяцы вперед проверяем раз в сутки
         scheduler.add_job(
-            func=process_sync_log_job,
-            trigger="interval",
-            seconds=10,
-            id="process_sync_log",
+            func=ensure_archive_partitions_job,
+            trigger="cron",
+            hour=3,
+            id="ensure_archive_partitions",
             replace_existing=True
         )
         
+        # Основная таблица остается маленькой: очистка раз в сутки вне приема
+        if settings.QUEUE_RETENTION_ENABLED:
+            scheduler.add_job(
+                func=queue_retention_job,
+                trigger="cron",
+                hour=settings.QUEUE_RETENTION_CRON_HOUR,
+                minute=settings.QUEUE_RETENTION_CRON_MINUTE,
+                id="queue_retention",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+        
         if not scheduler.running:
             scheduler.start()
         
+        # Изменения из Adminer приходят через LISTEN/NOTIFY без опроса базы.
+        # Интервальный опрос включаем только если подписаться на канал не удалось.
+        if not sync_log_listener.start():
+            logger.warning(f"⚠️ LISTEN недоступен, опрашиваем sync_log каждые {settings.SYNC_FALLBACK_POLL_SECONDS} сек")
+            scheduler.add_job(
+                func=process_sync_log_job,
+                trigger="interval",
+                seconds=settings.SYNC_FALLBACK_POLL_SECONDS,
+                id="process_sync_log",
+                replace_existing=True
+            )
+        
         logger.info("✅ Планировщик синхронизации инициализирован (SQLAlchemy + DB Triggers)")
         return True
         
@@ -290,6 +397,7 @@ def shutdown_sync_scheduler():
     """Остановить планировщик синхронизации"""
     logger.info("🛑 Остановка планировщика синхронизации...")
     try:
+        sync_log_listener.stop()
         if scheduler.running:
             scheduler.shutdown()
         logger.info("✅ Планировщик синхронизации остановлен")
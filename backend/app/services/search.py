@@ -0,0 +1,165 @@
+import logging
+import re
+from typing import List, Optional
+
+from sqlalchemy import case, func, literal, or_, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.archive import ArchivedQueueEntry
+from app.models.queue import QueueEntry
+
+logger = logging.getLogger(__name__)
+
+# Латинские буквы, которые выглядят как кириллические (после приведения к нижнему регистру)
+_HOMOGLYPHS_LATIN = "aeopcxykmtbh"
+_HOMOGLYPHS_CYRILLIC = "аеорсхукмтвн"
+_HOMOGLYPHS = str.maketrans(_HOMOGLYPHS_LATIN, _HOMOGLYPHS_CYRILLIC)
+
+SEARCH_SETUP_SQL = f"""
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION search_normalize(value TEXT)
+RETURNS TEXT AS $$
+    SELECT btrim(regexp_replace(
+        translate(replace(lower(COALESCE(value, '')), 'ё', 'е'), '{_HOMOGLYPHS_LATIN}', '{_HOMOGLYPHS_CYRILLIC}'),
+        '\\s+', ' ', 'g'
+    ))
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION search_phone(value TEXT)
+RETURNS TEXT AS $$
+    SELECT regexp_replace(COALESCE(value, ''), '\\D', '', 'g')
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE INDEX IF NOT EXISTS ix_queue_entries_name_trgm
+    ON queue_entries USING GIN (search_normalize(full_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_queue_entries_phone_trgm
+    ON queue_entries USING GIN (search_phone(phone) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_archived_queue_entries_name_trgm
+    ON archived_queue_entries USING GIN (search_normalize(full_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_archived_queue_entries_phone_trgm
+    ON archived_queue_entries USING GIN (search_phone(phone) gin_trgm_ops);
+"""
+
+MIN_PHONE_DIGITS = 4  # Короче - это не телефон, а шум
+
+def setup_search(db: Session):
+    """Подключить pg_trgm, функции нормализации и триграммные индексы"""
+    try:
+        db.execute(text(SEARCH_SETUP_SQL))
+        db.commit()
+        logger.info("✅ Поиск по заявкам настроен (pg_trgm)")
+    except Exception as e:
+        logger.error(f"❌ Ошибка настройки поиска: {e}")
+        db.rollback()
+
+def normalize_name(value: str) -> str:
+    """То же, что search_normalize() в базе: регистр, ё -> е, латинские двойники, пробелы"""
+    normalized = (value or "").lower().replace("ё", "е").translate(_HOMOGLYPHS)
+    return re.sub(r"\s+", " ", normalized).strip()
+
+def normalize_phone(value: str) -> str:
+    return re.sub(r"\D", "", value or "")
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def name_contains(column, value: str):
+    """Подстрока в нормализованном ФИО (индексируется триграммами)"""
+    pattern = f"%{_escape_like(normalize_name(value))}%"
+    return func.search_normalize(column).like(pattern)
+
+def _search_model(db: Session, model, source: str, query: str, limit: int) -> List[dict]:
+    name = func.search_normalize(model.full_name)
+    normalized = normalize_name(query)
+    digits = normalize_phone(query)
+
+    conditions = [
+        name.op("%")(normalized),
+        name.like(f"%{_escape_like(normalized)}%"),
+    ]
+    score = func.similarity(name, normalized)
+
+    if len(digits) >= MIN_PHONE_DIGITS:
+        phone_match = func.search_phone(model.phone).like(f"%{digits}%")
+        conditions.append(phone_match)
+        # Совпадение по телефону точнее любого похожего имени
+        score = func.greatest(score, case((phone_match, literal(1.0)), else_=literal(0.0)))
+
+    rows = db.query(model, score.label("score")).filter(
+        or_(*conditions)
+    ).order_by(score.desc(), model.created_at.desc()).limit(limit).all()
+
+    results = []
+    for entry, entry_score in rows:
+        results.append({
+            "source": source,
+            "id": entry.id,
+            "queue_number": entry.queue_number,
+            "full_name": entry.full_name,
+            "phone": entry.phone,
+            "status": entry.status.value if hasattr(entry.status, "value") else entry.status,
+            "assigned_employee_name": entry.assigned_employee_name,
+            "created_at": entry.created_at,
+            "score": round(float(entry_score or 0), 3),
+        })
+    return results
+
+def search_applicants(db: Session, query: str, scope: str = "all", limit: Optional[int] = None) -> List[dict]:
+    """
+    Нечеткий поиск абитуриентов по ФИО и телефону с ранжированием
+
+    Ищем в живой очереди и/или в архиве, результаты объединяем по убыванию похожести.
+    """
+    if not normalize_name(query):
+        return []
+
+    limit = max(1, min(limit or settings.SEARCH_RESULTS_LIMIT, settings.PAGE_SIZE_MAX))
+    results = []
+    if scope in ("all", "queue"):
+        results.extend(_search_model(db, QueueEntry, "queue", query, limit))
+    if scope in ("all", "archive"):
+        results.extend(_search_model(db, ArchivedQueueEntry, "archive", query, limit))
+
+    results.sort(key=lambda item: item["score"], reverse=True)
+    return results[:limit]
+
+def find_queue_entry_by_name(db: Session, full_name: str, phone: Optional[str] = None) -> Optional[QueueEntry]:
+    """
+    Заявка по ФИО для публичной проверки статуса
+
+    Сначала точное совпадение нормализованного ФИО (регистр, ё/е, латиница/кириллица).
+    Похожее написание - только вместе с телефоном заявки: ответ содержит id,
+    которого достаточно для отмены, поэтому по одному похожему ФИО чужую
+    заявку не отдаем.
+    """
+    normalized = normalize_name(full_name)
+    if not normalized:
+        return None
+
+    name = func.search_normalize(QueueEntry.full_name)
+
+    entry = db.query(QueueEntry).filter(
+        name == normalized
+    ).order_by(QueueEntry.created_at.desc()).first()
+    if entry:
+        return entry
+
+    phone_digits = re.sub(r"\D", "", phone or "")
+    if not phone_digits:
+        return None
+
+    score = func.similarity(name, normalized)
+    candidates = db.query(QueueEntry).filter(
+        name.op("%")(normalized),
+        score >= settings.SEARCH_PUBLIC_MIN_SIMILARITY,
+        func.search_phone(QueueEntry.phone) == phone_digits
+    ).order_by(score.desc(), QueueEntry.created_at.desc()).limit(2).all()
+
+    if not candidates:
+        return None
+    # Несколько разных людей с этим телефоном и похожими ФИО - не угадываем
+    if len({normalize_name(entry.full_name) for entry in candidates}) > 1:
+        return None
+    return candidates[0]
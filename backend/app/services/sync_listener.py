@@ -0,0 +1,140 @@
+import logging
+import select
+import threading
+import time
+from typing import Callable, Optional
+
+import psycopg2
+import psycopg2.extensions
+from sqlalchemy.engine import make_url
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+def _build_dsn(database_url: str) -> str:
+    """Превращает SQLAlchemy URL (postgresql+psycopg2://...) в DSN для psycopg2"""
+    url = make_url(database_url).set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+class SyncLogListener:
+    """
+    Слушатель LISTEN/NOTIFY для таблицы sync_log
+
+    Держит отдельное соединение с Postgres и ждет уведомлений от триггера
+    архива. Пока уведомлений нет, в базу не уходит ни одного запроса.
+    При получении уведомления немного ждет (debounce), чтобы собрать пачку
+    изменений из одной транзакции/серии правок, и вызывает on_change.
+    """
+
+    def __init__(
+        self,
+        on_change: Callable[[], None],
+        channel: str = settings.SYNC_NOTIFY_CHANNEL,
+        debounce_seconds: float = settings.SYNC_NOTIFY_DEBOUNCE_SECONDS,
+        reconnect_delay: float = 5.0,
+        wait_timeout: float = 5.0,
+    ):
+        self.on_change = on_change
+        self.channel = channel
+        self.debounce_seconds = debounce_seconds
+        self.reconnect_delay = reconnect_delay
+        self.wait_timeout = wait_timeout
+        self._dsn = _build_dsn(settings.DATABASE_URL)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._connection = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        """Проверить соединение и запустить фоновый поток слушателя"""
+        if self.is_running:
+            return True
+
+        try:
+            self._connect()
+        except Exception as e:
+            logger.error(f"❌ Не удалось подписаться на канал {self.channel}: {e}")
+            return False
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="sync-log-listener", daemon=True)
+        self._thread.start()
+        logger.info(f"👂 Слушатель sync_log запущен (канал {self.channel})")
+        return True
+
+    def stop(self):
+        """Остановить поток слушателя и закрыть соединение"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.wait_timeout + 1)
+            self._thread = None
+        self._close()
+        logger.info("🛑 Слушатель sync_log остановлен")
+
+    def _connect(self):
+        self._close()
+        connection = psycopg2.connect(self._dsn)
+        connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}";')
+        self._connection = connection
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    def _drain(self) -> int:
+        """Забрать все накопившиеся уведомления, вернуть их количество"""
+        self._connection.poll()
+        count = len(self._connection.notifies)
+        self._connection.notifies.clear()
+        return count
+
+    def _fire(self):
+        try:
+            self.on_change()
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработки изменений sync_log: {e}")
+
+    def _run(self):
+        # Догоняем изменения, сделанные пока слушатель не работал
+        self._fire()
+
+        while not self._stop_event.is_set():
+            try:
+                if self._connection is None:
+                    self._connect()
+                    logger.info(f"🔌 Переподключение к каналу {self.channel} выполнено")
+                    self._fire()
+
+                ready, _, _ = select.select([self._connection], [], [], self.wait_timeout)
+                if not ready:
+                    continue
+
+                received = self._drain()
+                if not received:
+                    continue
+
+                # Собираем пачку: ждем, пока поток уведомлений не затихнет
+                deadline = time.monotonic() + self.debounce_seconds
+                while time.monotonic() < deadline:
+                    remaining = max(0.0, deadline - time.monotonic())
+                    ready, _, _ = select.select([self._connection], [], [], remaining)
+                    if ready:
+                        received += self._drain()
+
+                logger.debug(f"🔔 Получено {received} уведомлений sync_log")
+                self._fire()
+
+            except Exception as e:
+                logger.error(f"❌ Ошибка слушателя sync_log: {e}")
+                self._close()
+                self._stop_event.wait(self.reconnect_delay)
@@ -25,6 +25,11 @@ def create_user(db: Session, user: UserCreate | AdminUserCreate, role: str = "ap
     if hasattr(user, 'desk') and user.desk is not None:
         user_data["desk"] = user.desk
     
+    # Языки и программы сотрудника (для перехвата заявок с других столов)
+    for field in ("languages", "programs"):
+        if getattr(user, field, None) is not None:
+            user_data[field] = getattr(user, field)
+    
     # Создаем объект пользователя с использованием словаря
     db_user = User(**user_data)
     
@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.config import settings
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = "user_cache_invalidate"
+
+class UserCache:
+    """
+    Короткоживущий кэш пользователей по id для get_current_user
+
+    Стойки приема опрашивают API каждые несколько секунд, и почти каждый
+    запрос начинался с одного и того же SELECT по users. Храним снимок
+    колонок (не ORM-объект, он привязан к сессии) и при попадании
+    подключаем пользователя к сессии запроса без обращения к базе.
+    Изменения пользователей сбрасывают запись после commit (события сессии ниже),
+    TTL ограничивает устаревание между воркерами.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, dict]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: str) -> Optional[User]:
+        if self.ttl_seconds <= 0:
+            return db.query(User).filter(User.id == user_id).first()
+
+        with self._lock:
+            cached = self._entries.get(user_id)
+
+        if cached and cached[0] > time.monotonic():
+            user = User(**cached[1])
+            make_transient_to_detached(user)
+            # load=False - без SELECT; объект становится частью сессии запроса,
+            # поэтому изменения (например, статуса сотрудника) сохраняются как обычно
+            return db.merge(user, load=False)
+
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is not None:
+            self.put(user)
+        return user
+
+    def put(self, user: User):
+        snapshot = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, snapshot)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Глобальный кэш пользователей
+user_cache = UserCache(ttl_seconds=settings.USER_CACHE_TTL_SECONDS)
+
+def invalidate_after_commit(session: Session, user_id: str):
+    """Пользователь изменен сырым SQL (мимо flush): сбросить запись после commit"""
+    session.info.setdefault(_PENDING_KEY, set()).add(user_id)
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    """Запомнить измененных/удаленных пользователей; сбрасываем только после commit"""
+    changed = [obj.id for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User)]
+    if changed:
+        session.info.setdefault(_PENDING_KEY, set()).update(changed)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        user_cache.invalidate(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_users(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -1,6 +1,7 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import Response, JSONResponse
+from sqlalchemy.exc import DataError
 from app.api.routes import auth, queue, admission, admin, public
 from app.database import Base, engine
 from app.config import settings
@@ -16,6 +17,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Exact"],
 )
 
 @app.options("/{path:path}")
@@ -28,6 +30,13 @@ app.include_router(admission.router, prefix="/api/admission", tags=["admission"]
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 app.include_router(public.router, prefix="/api", tags=["public"])  # Это уже правильно
 
+@app.exception_handler(DataError)
+async def handle_data_error(request: Request, exc: DataError):
+    """Некорректное значение в сыром SQL (например, не-UUID id) - ошибка клиента, а не 500"""
+    if getattr(exc.orig, "pgcode", None) == "22P02":  # invalid_text_representation
+        return JSONResponse(status_code=404, content={"detail": "Not found"})
+    return JSONResponse(status_code=400, content={"detail": "Invalid request data"})
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Admission Queue API"}
@@ -38,6 +47,24 @@ async def startup_event():
     """Инициализация при запуске приложения"""
     print("🚀 Запуск приложения...")
     
+    # Партиции архива должны существовать до первой вставки, триггер агрегатов - тоже
+    try:
+        from app.services.archive_partitions import ensure_archive_partitions
+        from app.database import SessionLocal
+        
+        from app.services.archive_stats import setup_archive_statistics
+        from app.services.search import setup_search
+        from app.services.program_counters import setup_program_counters
+        
+        db = SessionLocal()
+        ensure_archive_partitions(db)
+        setup_archive_statistics(db)
+        setup_search(db)
+        setup_program_counters(db)
+        db.close()
+    except Exception as e:
+        print(f"❌ Ошибка подготовки партиций и агрегатов архива: {e}")
+    
     # Инициализация планировщика синхронизации
     try:
         from app.services.scheduler import initialize_sync_scheduler
@@ -74,6 +101,10 @@ async def shutdown_event():
     try:
         from app.services.scheduler import shutdown_sync_scheduler
         shutdown_sync_scheduler()
+        from app.services.export_jobs import export_jobs
+        export_jobs.shutdown()
+        from app.services.captcha import captcha_verifier
+        captcha_verifier.close()
         print("✅ Планировщик синхронизации остановлен")
     except Exception as e:
         print(f"❌ Ошибка остановки планировщика: {e}")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Скрипт для создания индекса archived_queue_entries.original_id
+Архивная копия заявки ищется по original_id при каждом переходе статуса,
+при завершении приема одним запросом и при плановой очистке очереди.
+Безопасно запускать повторно
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# На партиционированном архиве индекс создается на каждой партиции (и на будущих)
+INDEX_SQL = "CREATE INDEX IF NOT EXISTS ix_archived_queue_entries_original_id ON archived_queue_entries (original_id)"
+
+def create_original_id_index():
+    """Создать индекс и обновить статистику архива"""
+    db = SessionLocal()
+
+    try:
+        db.execute(text(INDEX_SQL))
+        logger.info(INDEX_SQL)
+        db.commit()
+
+        db.execute(text("ANALYZE archived_queue_entries"))
+        db.commit()
+        logger.info("✅ Индекс по original_id создан")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("🚀 Создаем индекс архива по original_id...")
+    create_original_id_index()
+    print("✅ Миграция завершена!")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Скрипт для перевода archived_queue_entries на помесячные партиции по archived_at
+Запустить один раз при остановленном приложении
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.services.archive_partitions import (
+    ARCHIVE_TABLE,
+    DEFAULT_PARTITION,
+    add_months,
+    create_month_partition,
+    is_archive_partitioned,
+    month_start,
+)
+from app.config import settings
+from sqlalchemy import text
+from datetime import datetime, timezone
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LEGACY_TABLE = f"{ARCHIVE_TABLE}_legacy"
+
+def migrate_archive_to_partitions():
+    """Пересоздать архив как партиционированную таблицу и перенести данные"""
+    db = SessionLocal()
+
+    try:
+        if is_archive_partitioned(db):
+            logger.info("Архив уже партиционирован, миграция не нужна")
+            return
+
+        # archived_at становится частью первичного ключа - пустых значений быть не должно
+        filled = db.execute(text(f"""
+            UPDATE {ARCHIVE_TABLE}
+            SET archived_at = COALESCE(created_at, NOW())
+            WHERE archived_at IS NULL
+        """)).rowcount
+        logger.info(f"Заполнено пустых archived_at: {filled}")
+
+        db.execute(text(f"""
+            DROP TRIGGER IF EXISTS archive_insert_trigger ON {ARCHIVE_TABLE};
+            DROP TRIGGER IF EXISTS archive_update_trigger ON {ARCHIVE_TABLE};
+            DROP TRIGGER IF EXISTS archive_delete_trigger ON {ARCHIVE_TABLE};
+            ALTER TABLE {ARCHIVE_TABLE} RENAME TO {LEGACY_TABLE};
+            ALTER INDEX IF EXISTS {ARCHIVE_TABLE}_pkey RENAME TO {LEGACY_TABLE}_pkey;
+
+            CREATE TABLE {ARCHIVE_TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS)
+                PARTITION BY RANGE (archived_at);
+            ALTER TABLE {ARCHIVE_TABLE} ALTER COLUMN archived_at SET NOT NULL;
+            ALTER TABLE {ARCHIVE_TABLE} ADD PRIMARY KEY (id, archived_at);
+        """))
+
+        # Партиции на весь диапазон существующих данных и на месяцы вперед
+        oldest = db.execute(text(f"SELECT MIN(archived_at) FROM {LEGACY_TABLE}")).scalar()
+        current = month_start(datetime.now(timezone.utc))
+        start = month_start(oldest) if oldest else current
+        end = add_months(current, settings.ARCHIVE_PARTITION_MONTHS_AHEAD)
+
+        created = 0
+        while start <= end:
+            create_month_partition(db, start)
+            start = add_months(start, 1)
+            created += 1
+
+        db.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION}
+            PARTITION OF {ARCHIVE_TABLE} DEFAULT
+        """))
+        logger.info(f"Создано партиций: {created} (+ DEFAULT)")
+
+        moved = db.execute(text(f"INSERT INTO {ARCHIVE_TABLE} SELECT * FROM {LEGACY_TABLE}")).rowcount
+        logger.info(f"Перенесено записей: {moved}")
+
+        db.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+
+        # Сохраняем все изменения одной транзакцией
+        db.commit()
+
+        logger.info("✅ Архив переведен на партиции. Триггеры синхронизации пересоздадутся при старте приложения")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("🚀 Начинаем перевод архива на партиции...")
+    migrate_archive_to_partitions()
+    print("✅ Миграция завершена!")
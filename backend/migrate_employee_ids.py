@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Скрипт для связи заявок с сотрудниками по id вместо имени
+Добавляет queue_entries.assigned_employee_id (FK на users), индекс и
+заполняет колонку по assigned_employee_name. Безопасно запускать повторно
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def add_employee_ids():
+    """Добавить assigned_employee_id и заполнить его по имени сотрудника"""
+    db = SessionLocal()
+
+    try:
+        db.execute(text("ALTER TABLE queue_entries ADD COLUMN IF NOT EXISTS assigned_employee_id VARCHAR"))
+        db.execute(text("""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_constraint WHERE conname = 'queue_entries_assigned_employee_id_fkey'
+                ) THEN
+                    ALTER TABLE queue_entries
+                    ADD CONSTRAINT queue_entries_assigned_employee_id_fkey
+                    FOREIGN KEY (assigned_employee_id) REFERENCES users (id) ON DELETE SET NULL;
+                END IF;
+            END $$;
+        """))
+        db.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_queue_entries_employee_status_number
+            ON queue_entries (assigned_employee_id, status, queue_number)
+        """))
+
+        # При одинаковых именах у сотрудников берем созданного раньше
+        result = db.execute(text("""
+            UPDATE queue_entries q
+            SET assigned_employee_id = u.id
+            FROM (
+                SELECT DISTINCT ON (full_name) id, full_name
+                FROM users
+                WHERE role = 'admission'
+                ORDER BY full_name, created_at
+            ) u
+            WHERE q.assigned_employee_id IS NULL
+              AND q.assigned_employee_name = u.full_name
+        """))
+        logger.info(f"🔗 Связано заявок с сотрудниками: {result.rowcount}")
+
+        orphaned = db.execute(text("""
+            SELECT COUNT(*) FROM queue_entries
+            WHERE assigned_employee_id IS NULL AND assigned_employee_name IS NOT NULL
+        """)).scalar()
+        if orphaned:
+            logger.warning(f"⚠️ Заявок с именем сотрудника, которого нет среди пользователей: {orphaned}")
+
+        db.commit()
+        logger.info("✅ Колонка assigned_employee_id, внешний ключ и индекс созданы")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("🚀 Связываем заявки с сотрудниками по id...")
+    add_employee_ids()
+    print("✅ Миграция завершена!")
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Скрипт для добавления языков и программ сотрудников (перехват заявок)
+Безопасно запускать повторно
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def add_employee_skills():
+    """Добавить колонки users.languages и users.programs (NULL - без ограничений)"""
+    db = SessionLocal()
+
+    try:
+        db.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS languages JSONB"))
+        db.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS programs JSONB"))
+
+        db.commit()
+        logger.info("✅ Колонки languages и programs добавлены в users")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("🚀 Добавляем языки и программы сотрудников...")
+    add_employee_skills()
+    print("✅ Миграция завершена!")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Скрипт для добавления ключей идемпотентности в queue_entries
+Безопасно запускать повторно
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def add_idempotency_keys():
+    """Добавить колонку idempotency_key и уникальный индекс по ней"""
+    db = SessionLocal()
+
+    try:
+        db.execute(text("ALTER TABLE queue_entries ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64)"))
+        db.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_queue_entries_idempotency_key
+            ON queue_entries (idempotency_key)
+        """))
+
+        db.commit()
+        logger.info("✅ Колонка idempotency_key и уникальный индекс созданы")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("🚀 Добавляем ключи идемпотентности...")
+    add_idempotency_keys()
+    print("✅ Миграция завершена!")
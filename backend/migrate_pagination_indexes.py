@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Скрипт для создания индексов постраничной выдачи (keyset по времени и id)
+Безопасно запускать повторно
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_queue_entries_created_at_id ON queue_entries (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id)",
+    # На партиционированном архиве индекс создается на каждой партиции
+    "CREATE INDEX IF NOT EXISTS ix_archived_queue_entries_archived_at_id ON archived_queue_entries (archived_at, id)",
+]
+
+def create_pagination_indexes():
+    """Создать индексы под сортировку постраничных списков"""
+    db = SessionLocal()
+
+    try:
+        for statement in INDEXES:
+            db.execute(text(statement))
+            logger.info(statement)
+
+        db.commit()
+        logger.info("✅ Индексы постраничной выдачи созданы")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("🚀 Создаем индексы постраничной выдачи...")
+    create_pagination_indexes()
+    print("✅ Миграция завершена!")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Скрипт для перевода колонки programs в JSONB и создания GIN индексов
+Запустить один раз при остановленном приложении
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TABLES = {
+    "queue_entries": "ix_queue_entries_programs_gin",
+    "archived_queue_entries": "ix_archived_queue_entries_programs_gin",
+}
+
+def migrate_programs_to_jsonb():
+    """Сменить тип programs с JSON на JSONB и построить GIN индексы"""
+    db = SessionLocal()
+
+    try:
+        for table, index_name in TABLES.items():
+            column_type = db.execute(text("""
+                SELECT data_type FROM information_schema.columns
+                WHERE table_name = :table AND column_name = 'programs'
+            """), {"table": table}).scalar()
+
+            if column_type is None:
+                logger.info(f"Таблица {table} не найдена, пропускаем")
+                continue
+
+            if column_type != "jsonb":
+                # Для партиционированного архива ALTER применяется ко всем партициям
+                db.execute(text(f"ALTER TABLE {table} ALTER COLUMN programs TYPE JSONB USING programs::jsonb"))
+                logger.info(f"{table}.programs: {column_type} -> jsonb")
+
+            db.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} USING GIN (programs)"))
+            logger.info(f"GIN индекс {index_name} готов")
+
+        # Сохраняем все изменения одной транзакцией
+        db.commit()
+
+        db.execute(text("ANALYZE queue_entries"))
+        db.commit()
+
+        logger.info("✅ Колонки programs переведены на JSONB")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("🚀 Начинаем перевод programs на JSONB...")
+    migrate_programs_to_jsonb()
+    print("✅ Миграция завершена!")
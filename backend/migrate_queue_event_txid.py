@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Скрипт для добавления queue_events.txid - номера транзакции, записавшей событие
+Смещение потребителей журнала становится (txid, id); уже записанные события
+получают txid = 0 (их транзакции давно завершены). Повторный запуск безопасен
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def migrate_queue_event_txid():
+    """Добавить txid с заполнением старых строк, значением по умолчанию и индексом"""
+    db = SessionLocal()
+
+    try:
+        # Сначала колонка без default: иначе все старые строки получат txid миграции
+        db.execute(text("ALTER TABLE queue_events ADD COLUMN IF NOT EXISTS txid BIGINT"))
+        updated = db.execute(text("UPDATE queue_events SET txid = 0 WHERE txid IS NULL")).rowcount
+        db.execute(text("""
+            ALTER TABLE queue_events
+            ALTER COLUMN txid SET DEFAULT (pg_current_xact_id()::text::bigint),
+            ALTER COLUMN txid SET NOT NULL
+        """))
+        db.execute(text("CREATE INDEX IF NOT EXISTS ix_queue_events_txid_id ON queue_events (txid, id)"))
+        db.commit()
+
+        logger.info(f"✅ queue_events.txid готова, заполнено старых событий: {updated}")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("🚀 Добавляем номер транзакции в журнал событий...")
+    migrate_queue_event_txid()
+    print("✅ Миграция завершена!")
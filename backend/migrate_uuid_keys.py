@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Скрипт для перевода строковых id (VARCHAR с UUID) на нативный тип uuid
+users, queue_entries, archived_queue_entries и queue_events.
+Запустить один раз при остановленном приложении; повторный запуск
+пропускает уже переведенные колонки
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# (таблица, колонка) в порядке перевода
+UUID_COLUMNS = [
+    ("users", "id"),
+    ("queue_entries", "id"),
+    ("queue_entries", "assigned_employee_id"),
+    ("archived_queue_entries", "id"),
+    ("archived_queue_entries", "original_id"),
+    ("queue_events", "entry_id"),
+]
+
+TABLES = ["users", "queue_entries", "archived_queue_entries", "queue_events"]
+
+# Чем создается колонка, если ее еще нет: молча пропускать нельзя -
+# колонка, добавленная позже как VARCHAR, не сошлась бы по типу с users.id
+PREREQUISITES = {
+    ("queue_entries", "assigned_employee_id"): "сначала запустите migrate_employee_ids.py",
+    ("queue_events", "entry_id"): "сначала запустите приложение один раз (создаст таблицу queue_events)",
+}
+
+EMPLOYEE_FK = "queue_entries_assigned_employee_id_fkey"
+
+def column_type(db, table: str, column: str):
+    return db.execute(text("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = :table AND column_name = :column
+    """), {"table": table, "column": column}).scalar()
+
+def indexes_size(db, table: str) -> int:
+    """Размер индексов таблицы вместе с партициями"""
+    return db.execute(text("""
+        SELECT COALESCE(SUM(pg_indexes_size(relid)), 0)
+        FROM pg_partition_tree(CAST(:table AS regclass))
+    """), {"table": table}).scalar()
+
+def report_sizes(db, title: str):
+    logger.info(title)
+    for table in TABLES:
+        size = indexes_size(db, table)
+        logger.info(f"   {table}: {size / 1024 / 1024:.1f} МБ индексов")
+
+def migrate_uuid_keys():
+    """Перевести id-колонки на uuid (USING id::uuid) с пересозданием внешнего ключа"""
+    db = SessionLocal()
+
+    try:
+        report_sizes(db, "📊 До миграции:")
+
+        types = {(t, c): column_type(db, t, c) for t, c in UUID_COLUMNS}
+        missing = [(t, c) for (t, c), data_type in types.items() if data_type is None]
+        if missing:
+            for table, column in missing:
+                hint = PREREQUISITES.get((table, column), "колонка должна существовать до миграции")
+                logger.error(f"❌ Нет колонки {table}.{column}: {hint}")
+            raise RuntimeError("Не все колонки существуют, миграция не выполнена")
+
+        pending = [(t, c) for (t, c), data_type in types.items() if data_type != "uuid"]
+        if not pending:
+            logger.info("✅ Все колонки уже имеют тип uuid")
+            return
+
+        # Внешний ключ мешает менять тип users.id - снимаем и создаем заново
+        db.execute(text(f"ALTER TABLE queue_entries DROP CONSTRAINT IF EXISTS {EMPLOYEE_FK}"))
+
+        for table, column in pending:
+            logger.info(f"🔄 {table}.{column} -> uuid")
+            db.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE uuid USING {column}::uuid"))
+
+        db.execute(text(f"""
+            ALTER TABLE queue_entries
+            ADD CONSTRAINT {EMPLOYEE_FK}
+            FOREIGN KEY (assigned_employee_id) REFERENCES users (id) ON DELETE SET NULL
+        """))
+
+        db.commit()
+
+        for table in TABLES:
+            db.execute(text(f"ANALYZE {table}"))
+        db.commit()
+
+        report_sizes(db, "📊 После миграции:")
+        logger.info("✅ Колонки переведены на uuid")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("🚀 Переводим id на нативный uuid...")
+    migrate_uuid_keys()
+    print("✅ Миграция завершена!")
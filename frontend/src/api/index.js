@@ -29,8 +29,10 @@ api.interceptors.response.use(
   }
 );
 
-export const createQueueEntry = async (data) => {
-  const response = await api.post('/public/queue', data);
+export const createQueueEntry = async (data, idempotencyKey = null) => {
+  // Повтор с тем же ключом вернет уже созданный талон, а не новую заявку
+  const config = idempotencyKey ? { headers: { 'Idempotency-Key': idempotencyKey } } : undefined;
+  const response = await api.post('/public/queue', data, config);
   return response.data;
 };
 
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { FaUser, FaPhoneAlt, FaGraduationCap, FaUserTie } from 'react-icons/fa';
 import { useRecaptcha } from '../../hooks/useRecaptcha';
 import { createQueueEntry, queueAPI, getEmployees } from '../../api';
@@ -8,6 +8,11 @@ import './PublicQueueForm.css';
 
 const RECAPTCHA_SITE_KEY = "6LfOR0orAAAAAN7I_8_LpEJ0Ymu4ZDwPk5XZALN1";
 
+const newIdempotencyKey = () =>
+  window.crypto && window.crypto.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 const BACHELOR_PROGRAMS = [
   'accounting',
   'appliedLinguistics',
@@ -45,6 +50,8 @@ const DOCTORATE_PROGRAMS = ['law', 'phdEconomics'];
 const PublicQueueForm = () => {
   const { t, i18n } = useTranslation();
   const { isReady, isLoading, executeRecaptcha } = useRecaptcha(RECAPTCHA_SITE_KEY);
+  // Один ключ на одну заявку: повторные отправки после сбоя сети его переиспользуют
+  const idempotencyKeyRef = useRef(null);
   
   // ВОЗВРАЩАЕМ assigned_employee_name в formData
   const [formData, setFormData] = useState({
@@ -214,7 +221,12 @@ const PublicQueueForm = () => {
 
       console.log('📤 Отправляем данные:', dataToSend);
       
-      const response = await createQueueEntry(dataToSend);
+      if (!idempotencyKeyRef.current) {
+        idempotencyKeyRef.current = newIdempotencyKey();
+      }
+      
+      const response = await createQueueEntry(dataToSend, idempotencyKeyRef.current);
+      idempotencyKeyRef.current = null;
       
       // Создаем базовый талон из ответа сервера
       const basicTicketData = {